@@ -5,9 +5,15 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import core as logic
 import hashlib
-import requests
+import time
+from contextlib import contextmanager
+import llm_client
+import prompt_builder
 from dotenv import load_dotenv
+from recommenders.retrieval import PropertyRetriever
 load_dotenv()
+# Embeddings DB + model load run once per server process, off the request path
+logic.start_embeddings_init()
 
 st.set_page_config(page_title="Gr8 Summer Stays", layout="wide")
 st.title("Gr8 Summer Stays")
@@ -15,6 +21,79 @@ st.title("Gr8 Summer Stays")
 if "user" not in st.session_state:
     st.session_state.user = None
 
+# --- Per-rerun timing panel ---
+_rerun_start = time.perf_counter()
+_timings = []
+
+@contextmanager
+def timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.append((name, time.perf_counter() - start))
+
+def timing_panel():
+    with st.sidebar.expander("Timings (this rerun)"):
+        total = time.perf_counter() - _rerun_start
+        rows = [{"stage": name, "ms": round(1000 * t, 2)} for name, t in _timings]
+        rows.append({"stage": "total rerun", "ms": round(1000 * total, 2)})
+        st.table(pd.DataFrame(rows))
+        if st.button("Reload datasets"):
+            invalidate_cached_resources()
+            st.rerun()
+
+# --- Process-wide cached resources (shared across reruns and sessions) ---
+# Cache keys carry the dataset versions, so edited datasets are picked up automatically
+# (max_entries keeps the current and previous version only);
+# invalidate_cached_resources() drops and rebuilds everything explicitly.
+@st.cache_resource(show_spinner="Loading property catalog...", max_entries=2)
+def cached_catalog(catalog_version):
+    return logic.load_properties()
+
+@st.cache_resource(show_spinner="Encoding property catalog...")
+def cached_recommender():
+    # The process-wide core recommender, so the CLI and the app rank (and fill the shared
+    # recommendation cache) with one configuration. Not keyed on the catalog version:
+    # catalog changes are rebuilt in the background and swapped in (see get_recommender).
+    return logic.get_recommender()
+
+@st.cache_resource(show_spinner=False)
+def cached_retriever():
+    # follows the recommender's current catalog state
+    return PropertyRetriever(cached_recommender())
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def cached_users(users_mtime_ns):
+    return logic.load_users()
+
+def invalidate_cached_resources():
+    cached_catalog.clear()
+    cached_catalog_by_id.clear()
+    cached_recommender.clear()
+    cached_retriever.clear()
+    cached_users.clear()
+    # the recommender is core's process-wide one: rebuild its state (and the co-save
+    # matrix) there, or clearing the wrappers above would hand back the same state
+    logic.reload_datasets()
+
+def get_catalog():
+    with timed_stage("catalog"):
+        return cached_catalog(logic.catalog_version())
+
+def get_recommender():
+    with timed_stage("recommender"):
+        cached_recommender()
+        # refreshes the co-save matrix and starts a background reload if the catalog moved on
+        return logic.get_recommender()
+
+def get_users():
+    with timed_stage("users"):
+        return cached_users(os.stat(logic.USERS_FILE).st_mtime_ns)
+
+def warm_recommendations():
+    logic.warm_recommendation_cache(top_k=20, recommender_factory=cached_recommender)
+
 # --- Login/Signup ---
 def login_form():
     st.subheader("Login")
@@ -24,6 +103,8 @@ def login_form():
         user = logic.authenticate(user_id, password)
         if user:
             st.session_state.user = user
+            # Precompute recommendations in the background while the dashboard loads
+            warm_recommendations()
             st.success(f"Welcome, {user['name']}!")
             st.rerun()
         else:
@@ -38,7 +119,7 @@ def signup_form():
     budget = st.number_input("Budget", min_value=1, key="signup_budget")
     password = st.text_input("Password", type="password", key="signup_pass")
     if st.button("Create Account"):
-        users = logic.load_users()
+        users = get_users()
         if any(u["user_id"] == user_id for u in users):
             st.error("User ID already exists.")
         else:
@@ -85,28 +166,66 @@ def dashboard():
         st.rerun()
 
 # --- Recommended Properties ---
+RESULTS_PER_PAGE = 5
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def cached_catalog_by_id(catalog_version):
+    return {p["property_id"]: p for p in cached_catalog(catalog_version)}
+
 def recommended_properties_page():
     st.header("Recommended Properties")
     n = st.slider("How many top properties do you want to see?", 1, 20, 5)
-    # For demo, just show top n properties (replace with your recommend logic)
-    properties = logic.load_properties()[:n]
-    df = pd.DataFrame(properties)
-    for i, prop in enumerate(properties):
-        with st.expander(f"{prop['type']} in {prop['location']} (ID: {prop['property_id']})"):
-            st.write(f"**Price per night:** ${prop['price_per_night']}")
-            st.write(f"**Features:** {', '.join(prop['features'])}")
-            st.write(f"**Tags:** {', '.join(prop['tags'])}")
-            st.write(f"**Booked Dates:** {', '.join(prop.get('booked_dates', []))}")
-            coords = pd.DataFrame([prop['coordinates']]).rename(columns={"lat": "latitude", "lng": "longitude"})
-            st.map(coords)
-            if st.button(f"Save Property {prop['property_id']}", key=f"save_{i}"):
-                logic.save_property_for_user(st.session_state.user['user_id'], prop['property_id'])
-                st.success("Property saved!")
+    # Budget-filtered, similarity-ranked results from SbertRecommender,
+    # served from the per-user recommendation cache (computed on a miss)
+    with timed_stage("recommend"):
+        results = logic.recommend_properties(
+            st.session_state.user, top_k=n, recommender=get_recommender()
+        )
+    if not results:
+        st.info("No properties within your budget yet. Try raising it on the Profile page.")
+        return
+
+    num_pages = (len(results) - 1) // RESULTS_PER_PAGE + 1
+    page = 1
+    if num_pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=num_pages, value=1, step=1)
+    first = (page - 1) * RESULTS_PER_PAGE
+    page_results = results[first:first + RESULTS_PER_PAGE]
+    st.caption(f"Showing {first + 1}-{first + len(page_results)} of {len(results)}")
+
+    catalog_by_id = cached_catalog_by_id(logic.catalog_version())
+    with timed_stage("render"):
+        # One combined map for the whole page instead of one map (and DataFrame) per listing
+        coords = [
+            catalog_by_id[r["property_id"]].get("coordinates")
+            for r in page_results
+            if r["property_id"] in catalog_by_id
+        ]
+        coords = [c for c in coords if c]
+        if coords:
+            st.map(pd.DataFrame(coords).rename(columns={"lat": "latitude", "lng": "longitude"}))
+
+        for rank, prop in enumerate(page_results, start=first + 1):
+            listing = catalog_by_id.get(prop["property_id"], {})
+            with st.expander(f"#{rank} {prop['type']} in {prop['location']} (ID: {prop['property_id']})"):
+                st.write(f"**Match score:** {prop['similarity']:.3f}")
+                st.write(f"**Price per night:** ${prop['price_per_night']}")
+                st.write(f"**Features:** {', '.join(prop['features'])}")
+                st.write(f"**Tags:** {', '.join(prop['tags'])}")
+                st.write(f"**Booked Dates:** {', '.join(listing.get('booked_dates', []))}")
+                if st.button(f"Save Property {prop['property_id']}", key=f"save_{prop['property_id']}"):
+                    logic.save_property_for_user(
+                        st.session_state.user['user_id'], prop['property_id'], recommender=get_recommender()
+                    )
+                    st.success("Property saved!")
 
 # --- Saved Properties ---
 def saved_properties_page():
     st.header("Your Saved Properties")
-    saved = logic.get_saved_properties(st.session_state.user['user_id'])
+    catalog = get_catalog()
+    saved = logic.get_saved_properties(
+        st.session_state.user['user_id'], users=get_users(), properties=catalog
+    )
     if not saved:
         st.info("No properties saved yet.")
     for i, prop in enumerate(saved):
@@ -117,8 +236,12 @@ def saved_properties_page():
             st.write(f"**Booked Dates:** {', '.join(prop.get('booked_dates', []))}")
             coords = pd.DataFrame([prop['coordinates']]).rename(columns={"lat": "latitude", "lng": "longitude"})
             st.map(coords)
+            similar = logic.get_similar_properties(prop['property_id'], top_k=3, properties=catalog)
+            if similar:
+                st.write("**More like this:** " + "; ".join(
+                    f"{p['type']} in {p['location']} (ID: {p['property_id']})" for p in similar
+                ))
 
-# --- Profile Page ---
 # --- Profile Page ---
 def profile_page():
     st.header("Profile")
@@ -134,7 +257,7 @@ def profile_page():
             user["group_size"] = group_size
             user["preferred_environment"] = [e.strip() for e in preferred_env.split(",") if e.strip()]
             user["budget"] = budget
-            # Update in users.json
+            # Update in users.json (fresh read: the cached list must not be mutated)
             users = logic.load_users()
             for u in users:
                 if u["user_id"] == user["user_id"]:
@@ -155,54 +278,52 @@ def ai_travel_agent_chat_page():
         st.chat_message(msg["role"]).write(msg["content"])
     user_input = st.chat_input("Type your message...")
     if user_input:
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
-        # Prepare last 3 exchanges for context
-        history = st.session_state.chat_history[-6:]  # 3 user+assistant pairs
-        context_str = "\n".join([
-            ("User: " + m["content"]) if m["role"] == "user" else ("AI: " + m["content"]) for m in history
-        ])
-        with st.spinner("AI is thinking..."):
-            ai_response = query_openrouter_deepseek_llm(
-                f"User profile: {user}.\nChat history:\n{context_str}\nUser: {user_input}"
+        # Recent turns verbatim + running summary of older ones, packed into a token budget
+        if "chat_memory" not in st.session_state:
+            st.session_state.chat_memory = prompt_builder.ConversationMemory.from_messages(
+                st.session_state.chat_history
             )
+        memory = st.session_state.chat_memory
+        retriever = cached_retriever()
+        st.session_state.chat_history.append({"role": "user", "content": user_input})
+        with st.chat_message("user"):
+            st.write(user_input)
+        # Price / features / availability / coordinates questions are answered from the catalog
+        answer, answered_props = retriever.answer_factual(
+            user_input, focus=st.session_state.get("chat_focus")
+        )
+        if answer:
+            st.session_state.chat_focus = answered_props[-1]
+            st.chat_message("assistant").write(answer)
+            st.session_state.chat_history.append({"role": "assistant", "content": answer})
+            memory.add_turn(user_input, answer)
+            return
+        # Otherwise only the listings retrieved for this turn go to the LLM
+        context = retriever.retrieve(user_input, top_k=prompt_builder.DEFAULT_MAX_PROPERTIES)
+        mentioned = retriever.mentioned_properties(user_input)
+        if mentioned:
+            st.session_state.chat_focus = mentioned[-1]
+        prompt = prompt_builder.PromptBuilder().build(
+            user, user_input, properties=context, memory=memory
+        )
+        # Stream tokens as they arrive; Streamlit stops the script (and closes the
+        # generator, cancelling the HTTP request) if the user interacts mid-answer.
+        with st.chat_message("assistant"):
+            try:
+                ai_response = st.write_stream(llm_client.stream_llm(prompt, max_tokens=1024))
+            except llm_client.LLMError as e:
+                ai_response = str(e)
+                st.error(ai_response)
         st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
-        st.chat_message("assistant").write(ai_response)
+        memory.add_turn(user_input, ai_response)
 
-# --- LLM Query Logic (copied from CLI) ---
+# --- LLM Query Logic (shared with the CLI) ---
 def query_openrouter_deepseek_llm(prompt):
-    API_URL = "https://openrouter.ai/api/v1/chat/completions"
-    API_KEY = os.environ.get("OPENROUTER_API_KEY")
-    if not API_KEY:
-        return "[ERROR] OpenRouter API key not set. Please set the OPENROUTER_API_KEY environment variable or add it to a .env file."
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://openrouter.ai/",
-        "X-Title": "Python-Colloquium-Project"
-    }
-    payload = {
-        "model": "mistralai/mistral-large",
-        "messages": [
-            {"role": "system", "content": "You are a helpful AI travel agent assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 1024
-    }
-    try:
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            if "choices" in data and data["choices"] and "message" in data["choices"][0]:
-                return data["choices"][0]["message"]["content"]
-            else:
-                return "[ERROR] No response from DeepSeek LLM."
-        else:
-            return f"[ERROR] LLM API error: {response.status_code} {response.text}"
-    except Exception as e:
-        return f"[ERROR] LLM API exception: {e}"
+    return llm_client.query_llm(prompt, max_tokens=1024)
 
 # --- Main App Logic ---
 if st.session_state.user is None:
     login_signup_page()
 else:
     dashboard()
+    timing_panel()
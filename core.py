@@ -1,20 +1,64 @@
 import json
 import os
 import hashlib
+import threading
 from datetime import datetime
 
+import instrumentation
+from property_descriptions import DescriptionCache, DescriptionGenerator
+from recommenders.co_save import CoSaveMatrix
+from recommenders.recommendation_cache import (
+    RecommendationCache,
+    ranking_options,
+    start_background_fill,
+    user_from_record,
+)
+from recommenders.recommender_snapshot import snapshot_file_for
+from recommenders.similar_properties import SimilarPropertiesIndex, index_file_for
+from recommenders.taste_vectors import TasteVectorStore
+from recommenders.vector_store import open_vector_store
+
 USERS_FILE = os.path.join('datasets', 'users.json')
 PROPERTIES_FILE = os.path.join('datasets', 'property_listings.json')
+EMBEDDINGS_DB_FILE = os.path.join('recommenders', 'property_vector_db.sqlite')
+# Property vectors; point at a *.gr8vec file to use the single-file columnar store.
+# Every other data file below is derived from it when used, so it can also be reassigned
+# (core.VECTOR_STORE_FILE = ...) as long as that happens before the first recommender,
+# cache or embeddings bootstrap of the process is created; those are built only once.
+VECTOR_STORE_FILE = EMBEDDINGS_DB_FILE
+
+def similar_index_file():
+    return index_file_for(VECTOR_STORE_FILE)
+
+def recommender_snapshot_file():
+    # Prepared recommender state, memory-mapped by new processes instead of rebuilt
+    return snapshot_file_for(VECTOR_STORE_FILE)
+
+def cache_db_file():
+    # SQLite file of the recommendation, taste-vector and description caches: the vector
+    # store itself when it is SQLite, a .sqlite file next to it otherwise
+    return os.path.splitext(VECTOR_STORE_FILE)[0] + '.sqlite'
+
+# (mtime, index) of the loaded similar-properties index
+_similar_index_cache = [None, None]
+# users.json mtime the co-save matrix reflects, and the matrix itself (see co_save_matrix)
+_co_save_state = {"mtime": None, "matrix": CoSaveMatrix()}
+_co_save_lock = threading.Lock()
 
 # --- User Management ---
+@instrumentation.timed("core.load_users")
 def load_users():
     with open(USERS_FILE, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+@instrumentation.timed("core.save_users")
 def save_users(users):
     with open(USERS_FILE, 'w', encoding='utf-8') as f:
         json.dump(users, f, indent=4, ensure_ascii=False)
+    # Profile edits (preferred_environment/budget) or deletions invalidate cached recommendations
+    recommendation_cache().invalidate_changed(users)
 
+@instrumentation.timed("core.load_properties")
 def load_properties():
     with open(PROPERTIES_FILE, 'r', encoding='utf-8') as f:
         return json.load(f)["properties"]
@@ -32,26 +76,243 @@ def add_user(user):
     users.append(user)
     save_users(users)
 
-def save_property_for_user(user_id, property_id):
+def save_property_for_user(user_id, property_id, recommender=None):
+    _update_saved_property(user_id, property_id, True, recommender)
+
+def remove_saved_property(user_id, property_id, recommender=None):
+    _update_saved_property(user_id, property_id, False, recommender)
+
+def _update_saved_property(user_id, property_id, saved, recommender=None):
+    # recommender: the one serving this process (default: the core recommender, if loaded)
     users = load_users()
+    changed = False
     for user in users:
         if user["user_id"] == user_id:
             if "saved_property" not in user:
                 user["saved_property"] = []
-            if property_id not in user["saved_property"]:
+            if saved and property_id not in user["saved_property"]:
                 user["saved_property"].append(property_id)
+                changed = True
+            elif not saved and property_id in user["saved_property"]:
+                user["saved_property"].remove(property_id)
+                changed = True
+    matrix = co_save_matrix()
     save_users(users)
+    # incremental updates instead of rebuilding the co-save matrix / taste vectors
+    with _co_save_lock:
+        if changed:
+            if saved:
+                matrix.add_save(user_id, property_id)
+            else:
+                matrix.remove_save(user_id, property_id)
+        _co_save_state["mtime"] = os.stat(USERS_FILE).st_mtime_ns
+    if changed:
+        # Without loaded listing vectors the next taste lookup sees the changed saves in the
+        # co-save matrix and recomputes only the saved sum (no re-encode)
+        recommender = recommender or _recommender_state["recommender"]
+        if recommender is not None:
+            if saved:
+                taste_vectors().add_saved(recommender, user_id, property_id)
+            else:
+                taste_vectors().remove_saved(recommender, user_id, property_id)
 
-def get_saved_properties(user_id):
-    users = load_users()
-    properties = load_properties()
+def get_saved_properties(user_id, users=None, properties=None):
+    users = users if users is not None else load_users()
+    properties = properties if properties is not None else load_properties()
     for user in users:
         if user["user_id"] == user_id:
             saved_ids = user.get("saved_property", [])
             return [p for p in properties if p["property_id"] in saved_ids]
     return []
 
-# --- Recommendation Logic (Stub: replace with your real logic) ---
-def recommend_properties(user, top_k=5):
-    # For demo: just return top_k properties
-    return load_properties()[:top_k]
+def co_save_matrix():
+    # Saved-together signal over every user's saved_property list; rebuilt only when
+    # users.json was changed by something other than save_property_for_user
+    with _co_save_lock:
+        mtime = os.stat(USERS_FILE).st_mtime_ns
+        if _co_save_state["mtime"] != mtime:
+            _co_save_state["matrix"].rebuild(load_users())
+            _co_save_state["mtime"] = mtime
+        return _co_save_state["matrix"]
+
+def co_save_version():
+    # users.json mtime the co-save matrix reflects; shared by every process using the file
+    co_save_matrix()
+    with _co_save_lock:
+        return _co_save_state["mtime"]
+
+# --- Similar Properties ("more like this") ---
+def _similar_index():
+    index_file = similar_index_file()
+    if not os.path.exists(index_file):
+        return None
+    mtime = os.path.getmtime(index_file)
+    if _similar_index_cache[0] != mtime:
+        _similar_index_cache[1] = SimilarPropertiesIndex.load(index_file)
+        _similar_index_cache[0] = mtime
+    return _similar_index_cache[1]
+
+def get_similar_properties(property_id, top_k=5, properties=None):
+    # Reads the precomputed neighbour index (recommenders/similar_properties.py);
+    # returns [] until the index has been built.
+    index = _similar_index()
+    if index is None or property_id not in index:
+        return []
+    properties = properties if properties is not None else load_properties()
+    by_id = {p["property_id"]: p for p in properties}
+    return [by_id[pid] for pid, _ in index.lookup(property_id, top_k) if pid in by_id]
+
+# --- Embedding Model and DB Bootstrap ---
+# The SBERT model is loaded once per process and shared by the bootstrap and every
+# recommender; the embeddings DB is initialized at most once per process, optionally
+# in a background thread started at launch.
+_model_lock = threading.Lock()
+_model_state = {"model": None}
+_embeddings_lock = threading.Lock()
+_embeddings_state = {"thread": None, "error": None}
+
+def get_shared_model():
+    from recommenders.sbert_recommender import load_model
+    with _model_lock:
+        if _model_state["model"] is None:
+            _model_state["model"] = load_model()
+        return _model_state["model"]
+
+def _init_embeddings():
+    from recommenders.sbert_recommender import embeddings_table_exists, init_embeddings_to_sqlite
+    try:
+        if not embeddings_table_exists(VECTOR_STORE_FILE):
+            init_embeddings_to_sqlite(model=get_shared_model(), db_file=VECTOR_STORE_FILE)
+        else:
+            # Nothing to build; still load the model so the first recommendation is fast
+            get_shared_model()
+        print("[LOG] Embeddings DB ready.")
+    except Exception as e:
+        _embeddings_state["error"] = e
+        print(f"[LOG] Embeddings DB initialization failed: {e}")
+
+def start_embeddings_init(background=True):
+    # Runs the bootstrap once per process; later calls return the same thread
+    with _embeddings_lock:
+        if _embeddings_state["thread"] is None:
+            thread = threading.Thread(target=_init_embeddings, name="embeddings-init", daemon=True)
+            _embeddings_state["thread"] = thread
+            thread.start()
+        thread = _embeddings_state["thread"]
+    if not background:
+        thread.join()
+    return thread
+
+def ensure_embeddings_db():
+    # Block until the (single) bootstrap has finished; instant after the first call
+    start_embeddings_init(background=False)
+    return _embeddings_state["error"] is None
+
+# --- Recommendation Logic ---
+_recommender_lock = threading.Lock()
+_recommender_state = {"recommender": None, "cache": None, "retriever": None, "taste": None}
+_description_state = {"generator": None}
+
+def recommendation_cache():
+    if _recommender_state["cache"] is None:
+        _recommender_state["cache"] = RecommendationCache(cache_db_file())
+    return _recommender_state["cache"]
+
+def taste_vectors():
+    # Persisted per-user query vectors (preferences + saved listings)
+    if _recommender_state["taste"] is None:
+        _recommender_state["taste"] = TasteVectorStore(cache_db_file())
+    return _recommender_state["taste"]
+
+def vector_store():
+    return open_vector_store(VECTOR_STORE_FILE)
+
+def catalog_version():
+    # Bumped by vector store writes (add_properties etc.) or by editing the listings JSON
+    return f"{vector_store().version}-{os.stat(PROPERTIES_FILE).st_mtime_ns}"
+
+def get_recommender():
+    # One SbertRecommender per process. When the catalog changes it rebuilds in the
+    # background and swaps the new state in; until then the previous catalog keeps answering.
+    from recommenders.sbert_recommender import SbertRecommender
+    if _recommender_state["recommender"] is None:
+        # build on the bootstrapped vector store instead of encoding the catalog a second
+        # time next to the embeddings-init thread (e.g. from the cache warm thread)
+        ensure_embeddings_db()
+    with _recommender_lock:
+        recommender = _recommender_state["recommender"]
+        if recommender is None:
+            recommender = _recommender_state["recommender"] = SbertRecommender(
+                load_properties(),
+                model=get_shared_model(),
+                store=vector_store(),
+                snapshot=recommender_snapshot_file(),
+                catalog_loader=load_properties,
+                version_fn=catalog_version,
+                co_saves=co_save_matrix(),
+                taste_vectors=taste_vectors(),
+            )
+    co_save_matrix()  # picks up users.json edits made elsewhere
+    recommender.reload_if_stale()
+    return recommender
+
+def reload_datasets():
+    # Explicit reload (the app's "Reload datasets" button): rebuild the co-save matrix,
+    # the similar index and the loaded recommender's catalog state even if no version moved
+    with _co_save_lock:
+        _co_save_state["mtime"] = None
+    _similar_index_cache[0] = None
+    recommender = _recommender_state["recommender"]
+    if recommender is not None:
+        recommender.reload(wait=True)
+    co_save_matrix()
+
+def get_property_retriever():
+    # Chat retrieval over the current recommender's property vectors
+    from recommenders.retrieval import PropertyRetriever
+    recommender = get_recommender()
+    with _recommender_lock:
+        retriever = _recommender_state["retriever"]
+        if retriever is None or retriever.recommender is not recommender:
+            retriever = _recommender_state["retriever"] = PropertyRetriever(recommender)
+        return retriever
+
+def recommend_properties(user, top_k=5, recommender=None):
+    # Served from the per-user cache; computed (and cached) on a miss.
+    # Front ends that keep their own recommender (e.g. Streamlit's cache_resource) can pass it in.
+    version = catalog_version()
+    # other users' saves change this user's co-save scores
+    co_saves = co_save_version()
+    cache = recommendation_cache()
+    results = cache.get(user, top_k, version, co_saves)
+    if results is None:
+        recommender = recommender or get_recommender()
+        results = recommender.recommend_logic(
+            user_from_record(user), top_n=top_k, **ranking_options(user)
+        )
+        # while a reload is in flight the old catalog answers; keep that out of the new version's cache
+        if recommender.version == version:
+            cache.put(user, top_k, results, version, co_saves)
+    return results
+
+def warm_recommendation_cache(top_k=10, users=None, recommender_factory=None):
+    # Background batch job: fill the cache for every user with a stale or missing entry
+    users = users if users is not None else load_users()
+    factory = recommender_factory or get_recommender
+    # versions are read in the fill thread, after get_recommender waited for the bootstrap
+    return start_background_fill(
+        recommendation_cache(), factory, users, catalog_version,
+        top_n=top_k, co_save_version=co_save_version,
+    )
+
+# --- Property Descriptions ---
+def description_generator():
+    if _description_state["generator"] is None:
+        _description_state["generator"] = DescriptionGenerator(
+            DescriptionCache(cache_db_file()), version_fn=catalog_version
+        )
+    return _description_state["generator"]
+
+def describe_properties(properties, timeout=None):
+    # {property_id: description}; LLM text cached per catalog version, template text on timeout
+    return description_generator().generate_many(properties, catalog_version(), timeout=timeout)
@@ -0,0 +1,302 @@
+# instrumentation.py
+# Lightweight timers/counters for the hot paths (recommender, SQLite, core JSON IO).
+#
+# Usage:
+#   import instrumentation
+#   instrumentation.enable(instrumentation.HistogramSink())
+#
+#   @instrumentation.timed("core.load_users")
+#   def load_users(): ...
+#
+#   with instrumentation.timer("recommender.similarity"):
+#       ...
+#
+# When no sink is enabled, `timed` wrappers and `timer` blocks reduce to a single
+# boolean check, so leaving the hooks in production code costs next to nothing.
+#
+# Sinks can also be selected with the GR8_METRICS environment variable:
+#   GR8_METRICS=memory
+#   GR8_METRICS=jsonl:metrics.jsonl
+#   GR8_METRICS=prometheus:metrics.prom
+
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_sinks = []
+_enabled = False
+
+
+################ SINKS ################
+
+
+class HistogramSink:
+    """
+    In-memory sink: keeps a fixed-bucket histogram per timer and a total per counter.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+
+    def record(self, kind, name, value):
+        with self._lock:
+            if kind == "counter":
+                self._counters[name] = self._counters.get(name, 0) + value
+                return
+            stats = self._timers.get(name)
+            if stats is None:
+                stats = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "max": 0.0,
+                    # one extra slot for the +Inf bucket
+                    "buckets": [0] * (len(self.buckets) + 1),
+                }
+                self._timers[name] = stats
+            stats["count"] += 1
+            stats["sum"] += value
+            stats["max"] = max(stats["max"], value)
+            stats["buckets"][bisect.bisect_left(self.buckets, value)] += 1
+
+    def percentile(self, name, q):
+        """
+        Approximate the q-th percentile (0-100) of a timer from its buckets.
+        Returns the upper bound of the bucket holding the percentile.
+        """
+        with self._lock:
+            stats = self._timers.get(name)
+            if not stats or not stats["count"]:
+                return None
+            target = stats["count"] * q / 100.0
+            seen = 0
+            for i, n in enumerate(stats["buckets"]):
+                seen += n
+                if seen >= target:
+                    return self.buckets[i] if i < len(self.buckets) else stats["max"]
+            return stats["max"]
+
+    def snapshot(self):
+        """
+        Return a plain dict copy of all timers and counters.
+        """
+        with self._lock:
+            timers = {
+                name: {
+                    "count": s["count"],
+                    "sum": s["sum"],
+                    "mean": s["sum"] / s["count"] if s["count"] else 0.0,
+                    "max": s["max"],
+                    "buckets": list(s["buckets"]),
+                }
+                for name, s in self._timers.items()
+            }
+            return {"timers": timers, "counters": dict(self._counters)}
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+
+class JsonLinesSink:
+    """
+    Append every measurement as one JSON object per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def record(self, kind, name, value):
+        line = json.dumps({"ts": time.time(), "kind": kind, "name": name, "value": value})
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusSink(HistogramSink):
+    """
+    Histogram sink that can render itself in the Prometheus text exposition format.
+    If a path is given, `write()` dumps the current state there (for node_exporter's
+    textfile collector, for example).
+    """
+
+    def __init__(self, path=None, buckets=DEFAULT_BUCKETS, prefix="gr8"):
+        super().__init__(buckets)
+        self.path = path
+        self.prefix = prefix
+
+    def _metric_name(self, name, suffix):
+        safe = "".join(ch if ch.isalnum() else "_" for ch in name)
+        return f"{self.prefix}_{safe}_{suffix}"
+
+    def render(self):
+        snap = self.snapshot()
+        lines = []
+        for name, s in sorted(snap["timers"].items()):
+            metric = self._metric_name(name, "seconds")
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(self.buckets, s["buckets"]):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {s["count"]}')
+            lines.append(f"{metric}_sum {s['sum']}")
+            lines.append(f"{metric}_count {s['count']}")
+        for name, total in sorted(snap["counters"].items()):
+            metric = self._metric_name(name, "total")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {total}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=None):
+        path = path or self.path
+        if not path:
+            raise ValueError("No output path configured for PrometheusSink.")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+################ PUBLIC FUNCTIONS ################
+
+
+def enable(*sinks):
+    """
+    Turn instrumentation on and register the given sinks (in addition to existing ones).
+    """
+    global _enabled
+    _sinks.extend(sinks)
+    _enabled = bool(_sinks)
+
+
+def disable():
+    """
+    Turn instrumentation off and drop all sinks.
+    """
+    global _enabled
+    _enabled = False
+    _sinks.clear()
+
+
+def is_enabled():
+    return _enabled
+
+
+def sinks():
+    return list(_sinks)
+
+
+def emit(kind, name, value):
+    for sink in _sinks:
+        sink.record(kind, name, value)
+
+
+def count(name, value=1):
+    """
+    Increment a counter.
+    """
+    if _enabled:
+        emit("counter", name, value)
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        emit("timer", self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def timer(name):
+    """
+    Context manager that records the wall time of its block under `name`.
+    """
+    if not _enabled:
+        return _NOOP_TIMER
+    return _Timer(name)
+
+
+def timed(name):
+    """
+    Decorator version of `timer`.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                emit("timer", name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def configure_from_env(var="GR8_METRICS"):
+    """
+    Enable a sink based on an environment variable (see module header).
+    """
+    spec = os.environ.get(var, "").strip()
+    if not spec:
+        return None
+    kind, _, path = spec.partition(":")
+    if kind == "memory":
+        sink = HistogramSink()
+    elif kind == "jsonl":
+        sink = JsonLinesSink(path or "metrics.jsonl")
+    elif kind == "prometheus":
+        sink = PrometheusSink(path or "metrics.prom")
+        atexit.register(sink.write)
+    else:
+        print(f"[LOG] Unknown {var} value '{spec}', instrumentation stays disabled.")
+        return None
+    enable(sink)
+    return sink
+
+
+configure_from_env()
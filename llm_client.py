@@ -0,0 +1,494 @@
+# llm_client.py
+# Shared OpenRouter chat-completions client used by the CLI and the Streamlit app.
+#
+# - one pooled keep-alive HTTP session per process (no new TCP/TLS handshake per call)
+# - retries with exponential backoff on 429/5xx and connection errors
+# - prompt -> response cache with TTL and size limit
+# - pluggable transport, so a local stub server (scripts/mock_llm_server.py) or an
+#   in-process fake can stand in for OpenRouter
+# - streaming completions (server-sent events) with cancellation
+# - AsyncLLMClient for asyncio callers
+#
+# Point the client at a stub with:
+#   OPENROUTER_API_URL=http://127.0.0.1:8766/v1/chat/completions
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import instrumentation
+
+API_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_MODEL = "mistralai/mistral-large"
+SYSTEM_PROMPT = "You are a helpful AI travel agent assistant."
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# how often a stream's watcher checks cancel_event while the reader waits for data
+CANCEL_POLL_SECONDS = 0.1
+MISSING_KEY_MESSAGE = (
+    "[ERROR] OpenRouter API key not set. Please set the OPENROUTER_API_KEY "
+    "environment variable or add it to a .env file."
+)
+
+
+class LLMError(Exception):
+    """
+    Raised by LLMClient.complete; str(e) is the user-facing "[ERROR] ..." message.
+    """
+
+
+################ TRANSPORT ################
+
+
+class RequestsTransport:
+    """
+    HTTP transport over a pooled requests.Session (keep-alive connection reuse).
+    Any object with the same post(url, headers, payload, timeout) -> (status, text)
+    and post_stream(...) -> (status, response) methods can be passed to LLMClient instead;
+    abort(response) is optional (response.close() is used without it).
+    """
+
+    def __init__(self, pool_size=8):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._exceptions = (requests.ConnectionError, requests.Timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def retryable_exceptions(self):
+        return self._exceptions
+
+    def post(self, url, headers, payload, timeout):
+        response = self.session.post(url, headers=headers, json=payload, timeout=timeout)
+        return response.status_code, response.text
+
+    def post_stream(self, url, headers, payload, timeout):
+        """
+        Start a streaming request. Returns (status, response) where response has
+        iter_lines(), .text and close().
+        """
+        response = self.session.post(
+            url, headers=headers, json=payload, timeout=timeout, stream=True
+        )
+        return response.status_code, response
+
+    def abort(self, response):
+        """
+        Stop a streaming response from another thread. Closing alone does not wake a
+        reader blocked on the socket, so shut the socket down first (urllib3 >= 2.3).
+        """
+        try:
+            response.raw.shutdown()
+        except (AttributeError, RuntimeError, ValueError, OSError):
+            pass  # older urllib3, or the connection is already gone
+        response.close()
+
+    def close(self):
+        self.session.close()
+
+
+################ CACHE ################
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+################ CLIENT ################
+
+
+class LLMClient:
+    def __init__(
+        self,
+        api_key=None,
+        api_url=None,
+        model=DEFAULT_MODEL,
+        transport=None,
+        timeout=30,
+        max_retries=3,
+        backoff_seconds=0.5,
+        cache=None,
+    ):
+        self.api_key = api_key
+        self.api_url = api_url or os.environ.get("OPENROUTER_API_URL", API_URL)
+        self.model = model
+        self.transport = transport or RequestsTransport()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.cache = cache if cache is not None else ResponseCache()
+
+    def _api_key(self):
+        return self.api_key or os.environ.get("OPENROUTER_API_KEY")
+
+    def _headers(self, api_key):
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://openrouter.ai/",
+            "X-Title": "Python-Colloquium-Project",
+        }
+
+    def build_payload(self, prompt, max_tokens, system_prompt=SYSTEM_PROMPT):
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": max_tokens,
+        }
+
+    def cache_key(self, payload):
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _sleep_before_retry(self, attempt):
+        # exponential backoff with jitter: 0.5s, 1s, 2s, ... (+0-25%)
+        delay = self.backoff_seconds * (2 ** attempt)
+        time.sleep(delay * (1 + random.random() / 4))
+
+    def _request(self, send):
+        """
+        Call send() -> (status, body) with retries on connection errors and 429/5xx.
+        Returns the body of the successful response; raises LLMError otherwise.
+        """
+        retryable = getattr(self.transport, "retryable_exceptions", (ConnectionError, TimeoutError))
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                status, body = send()
+            except retryable as e:
+                if last_attempt:
+                    raise LLMError(f"[ERROR] LLM API exception: {e}")
+                instrumentation.count("llm.retry")
+                self._sleep_before_retry(attempt)
+                continue
+            except Exception as e:
+                raise LLMError(f"[ERROR] LLM API exception: {e}")
+
+            if status == 200:
+                return body
+            text = _error_text(body)
+            if status in RETRY_STATUSES and not last_attempt:
+                instrumentation.count("llm.retry")
+                self._sleep_before_retry(attempt)
+                continue
+            raise LLMError(f"[ERROR] LLM API error: {status} {text}")
+
+    @instrumentation.timed("llm.complete")
+    def complete(self, prompt, max_tokens=1024, system_prompt=SYSTEM_PROMPT, use_cache=True):
+        """
+        Return the completion text for prompt. Raises LLMError on failure.
+        """
+        api_key = self._api_key()
+        if not api_key:
+            raise LLMError(MISSING_KEY_MESSAGE)
+
+        payload = self.build_payload(prompt, max_tokens, system_prompt)
+        key = self.cache_key(payload)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                instrumentation.count("llm.cache_hit")
+                return cached
+
+        text = self._request(
+            lambda: self.transport.post(self.api_url, self._headers(api_key), payload, self.timeout)
+        )
+        content = parse_completion(text)
+        if use_cache:
+            self.cache.put(key, content)
+        return content
+
+    def stream(self, prompt, max_tokens=1024, system_prompt=SYSTEM_PROMPT, cancel_event=None, use_cache=True):
+        """
+        Generator yielding the completion as text deltas (server-sent events).
+        Set cancel_event (a threading.Event) or close the generator to abort; a watcher
+        thread aborts the HTTP response (transport.abort) within CANCEL_POLL_SECONDS of
+        cancel_event being set, even while the reader is blocked waiting for data. Only fully received
+        answers are cached. Raises LLMError if the request fails or the connection breaks
+        mid-stream.
+        """
+        api_key = self._api_key()
+        if not api_key:
+            raise LLMError(MISSING_KEY_MESSAGE)
+
+        payload = self.build_payload(prompt, max_tokens, system_prompt)
+        key = self.cache_key(payload)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                instrumentation.count("llm.cache_hit")
+                yield cached
+                return
+
+        stream_payload = dict(payload, stream=True)
+        start = time.perf_counter()
+        response = self._request(
+            lambda: self.transport.post_stream(
+                self.api_url, self._headers(api_key), stream_payload, self.timeout
+            )
+        )
+        finished = threading.Event()
+        if cancel_event is not None:
+            threading.Thread(
+                target=_close_on_cancel,
+                args=(getattr(self.transport, "abort", None), response, cancel_event, finished),
+                daemon=True,
+            ).start()
+
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        parts = []
+        completed = False
+        deltas = iter_sse_deltas(response.iter_lines())
+        try:
+            while True:
+                try:
+                    delta = next(deltas)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    if cancelled():
+                        break  # the watcher closed the response under the reader
+                    raise LLMError(f"[ERROR] LLM API exception: {e}")
+                if cancelled():
+                    break
+                if not parts and instrumentation.is_enabled():
+                    instrumentation.emit("timer", "llm.first_token", time.perf_counter() - start)
+                parts.append(delta)
+                yield delta
+            if cancelled():
+                instrumentation.count("llm.stream_cancelled")
+                return
+            completed = True
+        finally:
+            finished.set()
+            response.close()
+            if completed and use_cache and parts:
+                self.cache.put(key, "".join(parts))
+
+    def query(self, prompt, max_tokens=1024, system_prompt=SYSTEM_PROMPT):
+        """
+        Like complete(), but returns the "[ERROR] ..." message instead of raising.
+        """
+        try:
+            return self.complete(prompt, max_tokens=max_tokens, system_prompt=system_prompt)
+        except LLMError as e:
+            return str(e)
+
+    def close(self):
+        self.transport.close()
+
+
+def _close_on_cancel(abort, response, cancel_event, finished):
+    # runs beside a stream: aborting the response wakes a reader blocked on the socket
+    while not finished.is_set():
+        if cancel_event.wait(CANCEL_POLL_SECONDS):
+            if finished.is_set():
+                return
+            if abort is not None:
+                abort(response)
+            else:
+                response.close()
+            return
+
+
+def _error_text(body):
+    if isinstance(body, str):
+        return body
+    # streaming response: read the error body and release the connection
+    try:
+        return body.text
+    finally:
+        body.close()
+
+
+def iter_sse_deltas(lines):
+    """
+    Yield content deltas from an OpenAI-style server-sent event stream.
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line or not line.startswith("data:"):
+            continue  # blank separators and ": keep-alive" comments
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        choices = chunk.get("choices") or []
+        if not choices:
+            continue
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
+
+
+def parse_completion(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        raise LLMError("[ERROR] No response from DeepSeek LLM.")
+    if "choices" in data and data["choices"] and "message" in data["choices"][0]:
+        return data["choices"][0]["message"]["content"]
+    raise LLMError("[ERROR] No response from DeepSeek LLM.")
+
+
+class AsyncLLMClient:
+    """
+    asyncio front end over a shared LLMClient: cache hits return without leaving the
+    event loop, misses run on a worker thread (reusing the pooled session), and a
+    semaphore bounds the number of requests in flight.
+    """
+
+    def __init__(self, client=None, max_concurrency=4):
+        self.client = client or get_client()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def complete(self, prompt, max_tokens=1024, system_prompt=SYSTEM_PROMPT, use_cache=True):
+        if use_cache:
+            payload = self.client.build_payload(prompt, max_tokens, system_prompt)
+            cached = self.client.cache.get(self.client.cache_key(payload))
+            if cached is not None:
+                instrumentation.count("llm.cache_hit")
+                return cached
+        async with self._semaphore:
+            return await asyncio.to_thread(
+                self.client.complete, prompt, max_tokens, system_prompt, use_cache
+            )
+
+    async def query(self, prompt, max_tokens=1024, system_prompt=SYSTEM_PROMPT):
+        try:
+            return await self.complete(prompt, max_tokens=max_tokens, system_prompt=system_prompt)
+        except LLMError as e:
+            return str(e)
+
+    async def stream(self, prompt, max_tokens=1024, system_prompt=SYSTEM_PROMPT):
+        """
+        Async generator over LLMClient.stream. The blocking reads happen on a worker
+        thread; closing this generator (or cancelling its task) aborts the request.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancel_event = threading.Event()
+        done = object()
+
+        def pump():
+            try:
+                for delta in self.client.stream(
+                    prompt, max_tokens, system_prompt, cancel_event=cancel_event
+                ):
+                    loop.call_soon_threadsafe(queue.put_nowait, delta)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        async with self._semaphore:
+            worker = loop.run_in_executor(None, pump)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is done:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                cancel_event.set()
+                await asyncio.shield(worker)
+
+
+################ SHARED INSTANCE ################
+
+_client_lock = threading.Lock()
+_client = None
+
+
+def get_client():
+    """
+    Process-wide client (and therefore connection pool and response cache).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            try:
+                from dotenv import load_dotenv
+
+                load_dotenv()
+            except ImportError:
+                pass  # If dotenv is not installed, skip silently
+            _client = LLMClient()
+        return _client
+
+
+def set_client(client):
+    """
+    Replace the shared client (e.g. with one using a stub transport).
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def stream_llm(prompt, max_tokens=1024, cancel_event=None):
+    """
+    Stream a single-turn prompt as text deltas; raises LLMError if the request fails.
+    """
+    return get_client().stream(prompt, max_tokens=max_tokens, cancel_event=cancel_event)
+
+
+def query_llm(prompt, max_tokens=1024):
+    """
+    Send a single-turn prompt to the travel agent model; errors come back as "[ERROR] ..." text.
+    """
+    return get_client().query(prompt, max_tokens=max_tokens)
@@ -1,40 +1,3 @@
-# --- Embedding DB Check and Creation ---
-def ensure_embeddings_db():
-    import os, sqlite3
-    db_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Vector embeddings', 'property_vector_db.sqlite'))
-    print(f"[LOG] Checking for embeddings DB at: {db_file}")
-    if not os.path.exists(db_file):
-        print("[LOG] Embeddings DB not found. Creating embeddings...")
-        run_create_embeddings()
-        return
-    # Check if table exists
-    conn = sqlite3.connect(db_file)
-    c = conn.cursor()
-    print("[LOG] Checking for property_embeddings table in DB...")
-    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='property_embeddings'")
-    exists = c.fetchone()
-    conn.close()
-    if not exists:
-        print("[LOG] Embeddings table not found. Creating embeddings...")
-        run_create_embeddings()
-    else:
-        print("[LOG] Embeddings DB and table found. Ready to use.")
-
-# --- Run create_embeddings.py as a subprocess ---
-def run_create_embeddings():
-    import subprocess, sys
-    script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Vector embeddings', 'create_embeddings.py'))
-    print(f"[LOG] Running embedding creation script: {script_path}")
-    result = subprocess.run([sys.executable, script_path], capture_output=True, text=True)
-    print("[LOG] Embedding script stdout:")
-    print(result.stdout)
-    if result.returncode != 0:
-        print("[LOG] Error creating embeddings:", result.stderr)
-        print("[LOG] Embedding creation script failed, but continuing to main logic.")
-    else:
-        print("[LOG] Embedding creation completed successfully or skipped (table exists). Continuing to main logic.")
-
-
 # main.py
 # Unified launcher for CLI and UI (Streamlit) modes, using shared core.py logic.
 
@@ -42,6 +5,8 @@ import os
 import sys
 import hashlib
 import core
+import llm_client
+import prompt_builder
 
 def cli_login():
     users = core.load_users()
@@ -50,6 +15,8 @@ def cli_login():
     user = core.authenticate(user_id, password)
     if user:
         print(f"✅ Login successful! Welcome {user['name']}.")
+        # Precompute recommendations in the background while the user browses the menu
+        core.warm_recommendation_cache()
         login_menu(user)
     else:
         print("❌ Invalid credentials.")
@@ -107,7 +74,8 @@ def login_menu(user):
 
 # --- Property Listings Menu ---
 def property_listings_menu(user):
-    ensure_embeddings_db()
+    # Waits for the startup bootstrap only on the first visit
+    core.ensure_embeddings_db()
     print("\n" + "-"*30)
     print("   PROPERTY LISTINGS")
     print("-"*30)
@@ -127,30 +95,18 @@ def property_listings_menu(user):
         print("Invalid choice.")
         property_listings_menu(user)
 
-# --- Vector Search Recommendation Logic (Deprecated)---
+# --- Vector Search Recommendation Logic ---
 def recommend_properties_by_preferences(user, top_k=3):
-    import sys, importlib.util, os
-    embeddings_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Vector embeddings', 'create_embeddings.py'))
-    spec = importlib.util.spec_from_file_location("create_embeddings", embeddings_path)
-    create_embeddings = importlib.util.module_from_spec(spec)
-    sys.modules["create_embeddings"] = create_embeddings
-    spec.loader.exec_module(create_embeddings)
-    # Compose a query from user preferences
-    if isinstance(user["preferred_environment"], list):
-        query = ' '.join(user["preferred_environment"])
-    else:
-        query = str(user["preferred_environment"])
-    query += f" {user['group_size']} {user['budget']}"
-    model = create_embeddings.get_embedding_model()
-    db_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Vector embeddings', 'property_vector_db.sqlite'))
-    results = create_embeddings.search_property(query, db_file, model, top_k=top_k)
-    return results
+    # Served from the per-user recommendation cache (see core.recommend_properties)
+    return core.recommend_properties(user, top_k=top_k)
 
 # --- Show Properties with Appealing Descriptions ---
 def show_properties_with_descriptions(properties, user):
     print("\nRecommended Properties:")
+    # All descriptions are requested concurrently, not one round trip per property
+    descriptions = core.describe_properties(properties)
     for prop in properties:
-        description = generate_property_description(prop, user)
+        description = descriptions[prop['property_id']]
         print(f"\nProperty ID: {prop['property_id']} | Similarity: {prop['similarity']:.4f}")
         print(f"  Location: {prop['location']}")
         print(f"  Type: {prop['type']}")
@@ -160,80 +116,40 @@ def show_properties_with_descriptions(properties, user):
 
 # --- OpenRouter DeepSeek LLM API ---
 def query_openrouter_deepseek_llm(prompt):
-    import requests, os
-    try:
-        from dotenv import load_dotenv
-        load_dotenv()
-    except ImportError:
-        pass  # If dotenv is not installed, skip silently
-    API_URL = "https://openrouter.ai/api/v1/chat/completions"
-    API_KEY = os.environ.get("OPENROUTER_API_KEY")
-    if not API_KEY:
-        return "[ERROR] OpenRouter API key not set. Please set the OPENROUTER_API_KEY environment variable or add it to a .env file."
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://openrouter.ai/",
-        "X-Title": "Python-Colloquium-Project"
-    }
-    payload = {
-        "model": "mistralai/mistral-large",
-        "messages": [
-            {"role": "system", "content": "You are a helpful AI travel agent assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 2048
-    }
-    try:
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            if "choices" in data and data["choices"] and "message" in data["choices"][0]:
-                return data["choices"][0]["message"]["content"]
-            else:
-                return "[ERROR] No response from DeepSeek LLM."
-        else:
-            return f"[ERROR] LLM API error: {response.status_code} {response.text}"
-    except Exception as e:
-        return f"[ERROR] LLM API exception: {e}"
+    # Shared pooled/cached client (llm_client.py); errors come back as "[ERROR] ..." text
+    return llm_client.query_llm(prompt, max_tokens=2048)
 
 # --- Generate Appealing Description using DeepSeek LLM ---
 def generate_property_description(property_data, user):
-    # Short, concise description (30-40 words max)
-    features = ', '.join(property_data['features'][:4])
-    tags = ', '.join(property_data['tags'][:3])
-    desc = (
-        f"A {property_data['type']} in {property_data['location']} with {features}. "
-        f"Great for {tags}. "
-        f"Enjoy comfort and adventure at ${property_data.get('price', 'your budget')} per night."
-    )
-    # Ensure description is about 30-40 words
-    words = desc.split()
-    if len(words) > 40:
-        desc = ' '.join(words[:40]) + '...'
-    return desc
-    
-    
+    # Short, concise description (30-40 words max); cached LLM text or the template fallback
+    return core.describe_properties([property_data])[property_data['property_id']]
+
+
 # --- AI Travel Agent Chat ---
-def travel_agent_chat(user, users, recommended_properties=None):
+def travel_agent_chat(user, recommended_properties=None):
     print("\n--- Welcome to the AI Travel Agent! ---")
     print("Type 'exit' to end the chat.")
-    chat_history = []
-    # Prepare context string for the LLM
-    if recommended_properties:
-        context_str = f"Here are {len(recommended_properties)} recommended properties for the user: "
-        for idx, prop in enumerate(recommended_properties, 1):
-            context_str += f"\nProperty #{idx}: ID: {prop['property_id']}, Location: {prop['location']}, Type: {prop['type']}, Features: {prop['features']}, Tags: {prop['tags']}"
-    else:
-        context_str = "No recommended properties yet."
+    # Recent turns verbatim + running summary of older ones, packed into a token budget
+    memory = prompt_builder.ConversationMemory()
+    builder = prompt_builder.PromptBuilder()
+    # Listings relevant to each turn are retrieved locally from the property vectors
+    retriever = core.get_property_retriever()
     property_id_map = {prop['property_id']: prop for prop in recommended_properties} if recommended_properties else {}
+    focus = None  # listing the conversation is currently about
     while True:
         user_input = input("\033[96mYou:\033[0m ")  # Cyan for user
         if user_input.lower() == 'exit':
             print("\033[92mAI: Have a great trip! Goodbye!\033[0m")  # Green for AI
-            login_menu(user, users)
             return
-        
+
+        # Price / features / availability / coordinates questions are answered from the catalog
+        answer, answered_props = retriever.answer_factual(user_input, focus=focus)
+        if answer:
+            print(f"\033[92mAI: {answer}\033[0m")
+            focus = answered_props[-1]
+            memory.add_turn(user_input, answer)
+            continue
+
         # [TODO: Have not check if the recommended logic works with the chat agent]
         # Check if user refers to a recommended property by ID
         found = False
@@ -242,7 +158,7 @@ def travel_agent_chat(user, users, recommended_properties=None):
             for pid, prop in property_id_map.items():
                 if pid.lower() in user_input.lower():
                     found = True
-                    matched_prop = prop
+                    matched_prop = focus = prop
                     print(f"\033[92mAI: Here are the details for property ID {pid}:\033[0m")
                     print(f"  Location   : {prop['location']}")
                     print(f"  Type       : {prop['type']}")
@@ -274,34 +190,40 @@ def travel_agent_chat(user, users, recommended_properties=None):
                 else:
                     weather = "Weather is generally pleasant, but check the forecast for details."
                 print(f"\033[92mAI: The weather at {matched_prop['location']} is: {weather}\033[0m")
-                chat_history.append((user_input, weather))
+                memory.add_turn(user_input, weather)
                 continue
         if found:
             continue
-        # Otherwise, use LLM for general questions
-        short_context = "Here are some recommended properties: "
-        if recommended_properties:
-            for idx, prop in enumerate(recommended_properties, 1):
-                short_context += f"\nProperty #{idx}: {prop['type']} in {prop['location']} (ID: {prop['property_id']})"
-        else:
-            short_context = "No recommended properties yet."
-        # Limit chat history to last 2 turns
-        limited_history = chat_history[-2:] if len(chat_history) > 2 else chat_history
-        history_str = '\n'.join([f"User: {u}\nAI: {a}" for u, a in limited_history])
-        prompt = (
-            f"You are an AI travel agent. The user profile is: {user}. "
-            f"{short_context}\n"
-            f"Chat history:\n{history_str}\n"
-            f"User: {user_input}\nAI:"
-        )
-        response = query_openrouter_deepseek_llm(prompt)
-        if not response or response.strip() == "":
-            print("\033[92mAI: [No response from LLM. Please try again or check API status.]\033[0m")
-        elif response.startswith("[ERROR]"):
-            print(f"\033[91mAI: {response}\033[0m")  # Red for errors
-        else:
-            print(f"\033[92mAI: {response.strip()}\033[0m")
-        chat_history.append((user_input, response.strip() if response else ""))
+        # Otherwise, use LLM for general questions, with only the retrieved listings as context
+        context = retriever.retrieve(user_input, top_k=prompt_builder.DEFAULT_MAX_PROPERTIES)
+        focus = (retriever.mentioned_properties(user_input) or [focus])[-1]
+        prompt = builder.build(user, user_input, properties=context, memory=memory)
+        response = stream_llm_reply(prompt)
+        memory.add_turn(user_input, response.strip() if response else "")
+
+# --- Stream an LLM reply to the terminal ---
+def stream_llm_reply(prompt, max_tokens=2048):
+    # Tokens are printed as they arrive; Ctrl+C cancels the answer (and the HTTP request)
+    parts = []
+    stream = llm_client.stream_llm(prompt, max_tokens=max_tokens)
+    try:
+        for delta in stream:
+            if not parts:
+                print("\033[92mAI: ", end="", flush=True)  # Green for AI
+            parts.append(delta)
+            print(delta, end="", flush=True)
+    except llm_client.LLMError as e:
+        print(f"\033[91mAI: {e}\033[0m")  # Red for errors
+        return ""
+    except KeyboardInterrupt:
+        stream.close()
+        print(" [cancelled]\033[0m" if parts else "\033[92mAI: [cancelled]\033[0m")
+        return "".join(parts)
+    if not parts:
+        print("\033[92mAI: [No response from LLM. Please try again or check API status.]\033[0m")
+        return ""
+    print("\033[0m")
+    return "".join(parts)
 
 # --- Extract Keywords using LLM (DeepSeek) ---
 def extract_keywords_with_llm(prompt):
@@ -311,16 +233,8 @@ def extract_keywords_with_llm(prompt):
 
 # --- Recommend Properties by Prompt ---
 def recommend_properties_by_prompt(prompt, top_k=3):
-    import sys, importlib.util, os
-    embeddings_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Vector embeddings', 'create_embeddings.py'))
-    spec = importlib.util.spec_from_file_location("create_embeddings", embeddings_path)
-    create_embeddings = importlib.util.module_from_spec(spec)
-    sys.modules["create_embeddings"] = create_embeddings
-    spec.loader.exec_module(create_embeddings)
-    model = create_embeddings.get_embedding_model()
-    db_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Vector embeddings', 'property_vector_db.sqlite'))
-    results = create_embeddings.search_property(prompt, db_file, model, top_k=top_k)
-    return results
+    # Free-text search over the property vectors with the shared in-process model
+    return core.get_property_retriever().retrieve(prompt, top_k=top_k)
 
 # --- Weather Suitability Check (Rule-based) ---
 def check_weather_suitability(properties):
@@ -365,6 +279,7 @@ def show_saved_properties(user):
     saved = core.get_saved_properties(user['user_id'])
     if not saved:
         print("No properties saved yet.")
+    catalog = core.load_properties() if saved else []
     for prop in saved:
         print(f"{prop['type']} in {prop['location']} (ID: {prop['property_id']})")
         print(f"  Price per night: ${prop['price_per_night']}")
@@ -372,6 +287,9 @@ def show_saved_properties(user):
         print(f"  Tags: {', '.join(prop['tags'])}")
         print(f"  Booked Dates: {', '.join(prop.get('booked_dates', []))}")
         print(f"  Coordinates: {prop['coordinates']}")
+        similar = core.get_similar_properties(prop['property_id'], top_k=3, properties=catalog)
+        if similar:
+            print(f"  More like this: {', '.join(p['property_id'] for p in similar)}")
         print()
 
 
@@ -462,6 +380,8 @@ def launcher():
     print("="*40)
     choice = input("Enter your choice: ")
     if choice == '1':
+        # Build the embeddings DB and load the model in the background while the user logs in
+        core.start_embeddings_init()
         main_menu()
     elif choice == '2':
         print("Launching Streamlit UI...")
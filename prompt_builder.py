@@ -0,0 +1,184 @@
+# prompt_builder.py
+# Token-budgeted prompt assembly for the AI travel agent (CLI and Streamlit).
+#
+# Only whitelisted profile fields are sent (never the password hash), properties are
+# reduced to the fields that matter for a travel answer, and the conversation is kept as
+# a few verbatim recent turns plus a running summary of older ones that is updated
+# incrementally as turns age out. Whatever does not fit the budget is dropped, oldest first.
+
+import math
+
+DEFAULT_TOKEN_BUDGET = 1200
+DEFAULT_MAX_PROPERTIES = 5
+DEFAULT_RECENT_TURNS = 4
+DEFAULT_SUMMARY_TOKENS = 150
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate (~4 characters per token for English BPE vocabularies).
+    Errs on the high side for short, word-heavy strings.
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 1.3))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cut text down to roughly max_tokens, on a word boundary.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    keep = max(1, int(max_tokens / 1.3))
+    return " ".join(words[:keep]) + " ..."
+
+
+def summarize_user(user):
+    """
+    One-line profile from a users.json dict (or a User model).
+    Only name, group size, preferences and budget are included; passwords and
+    saved lists never leave the app.
+    """
+    get = user.get if isinstance(user, dict) else lambda k, d=None: getattr(user, k, d)
+    env = get("preferred_environment") or []
+    if isinstance(env, str):
+        env = [env]
+    parts = []
+    if get("name"):
+        parts.append(f"name {get('name')}")
+    if get("group_size"):
+        parts.append(f"group of {get('group_size')}")
+    if env:
+        parts.append("likes " + ", ".join(env))
+    if get("budget"):
+        parts.append(f"budget ${get('budget')}/night")
+    return "; ".join(parts)
+
+
+def summarize_property(prop, max_features=4, max_tags=3):
+    """
+    Compact property line with the fields that matter for answering travel questions.
+    """
+    line = f"{prop['property_id']}: {prop.get('type', '')} in {prop.get('location', '')}"
+    if prop.get("price_per_night") is not None:
+        line += f", ${prop['price_per_night']}/night"
+    features = prop.get("features") or []
+    tags = prop.get("tags") or []
+    if features:
+        line += "; features: " + ", ".join(features[:max_features])
+    if tags:
+        line += "; good for: " + ", ".join(tags[:max_tags])
+    return line
+
+
+def _clip_words(text, n):
+    words = str(text).split()
+    return " ".join(words[:n]) + (" ..." if len(words) > n else "")
+
+
+class ConversationMemory:
+    """
+    Recent turns verbatim plus a running summary of older turns.
+    Each turn that ages out is compressed once into a summary line; the summary itself
+    is capped at summary_tokens by dropping its oldest lines.
+    """
+
+    def __init__(self, max_recent_turns=DEFAULT_RECENT_TURNS, summary_tokens=DEFAULT_SUMMARY_TOKENS):
+        self.max_recent_turns = max_recent_turns
+        self.summary_tokens = summary_tokens
+        self.turns = []
+        self.summary_lines = []
+
+    def add_turn(self, user_text, ai_text):
+        self.turns.append((user_text, ai_text))
+        while len(self.turns) > self.max_recent_turns:
+            self._fold(*self.turns.pop(0))
+
+    def _fold(self, user_text, ai_text):
+        self.summary_lines.append(
+            f"- user asked: {_clip_words(user_text, 12)} / agent said: {_clip_words(ai_text, 15)}"
+        )
+        while len(self.summary_lines) > 1 and estimate_tokens(self.summary) > self.summary_tokens:
+            self.summary_lines.pop(0)
+
+    @property
+    def summary(self):
+        return "\n".join(self.summary_lines)
+
+    @classmethod
+    def from_messages(cls, messages, **kwargs):
+        """
+        Build from Streamlit-style [{"role": "user"|"assistant", "content": ...}] history.
+        """
+        memory = cls(**kwargs)
+        pending_user = None
+        for m in messages:
+            if m["role"] == "user":
+                pending_user = m["content"]
+            elif pending_user is not None:
+                memory.add_turn(pending_user, m["content"])
+                pending_user = None
+        return memory
+
+
+class PromptBuilder:
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, max_properties=DEFAULT_MAX_PROPERTIES):
+        self.token_budget = token_budget
+        self.max_properties = max_properties
+        # token counts per section of the last built prompt
+        self.last_stats = {}
+
+    def build(self, user, user_input, properties=None, memory=None):
+        """
+        Assemble the prompt. Priority when the budget is tight:
+        profile + question > properties > recent turns (newest first) > older-turn summary.
+        """
+        header = f"You are an AI travel agent. The user profile is: {summarize_user(user)}."
+        question = f"User: {truncate_to_tokens(user_input, self.token_budget // 2)}\nAI:"
+        remaining = self.token_budget - estimate_tokens(header) - estimate_tokens(question)
+        stats = {"profile": estimate_tokens(header), "question": estimate_tokens(question)}
+
+        sections = []
+        property_lines = []
+        for prop in (properties or [])[: self.max_properties]:
+            line = summarize_property(prop)
+            cost = estimate_tokens(line)
+            if cost > remaining:
+                break
+            property_lines.append(line)
+            remaining -= cost
+        if property_lines:
+            sections.append("Relevant properties:\n" + "\n".join(property_lines))
+        stats["properties"] = sum(estimate_tokens(line) for line in property_lines)
+
+        history_lines = []
+        if memory is not None:
+            for user_text, ai_text in reversed(memory.turns):
+                turn = f"User: {user_text}\nAI: {ai_text}"
+                cost = estimate_tokens(turn)
+                if cost > remaining:
+                    # keep a clipped version of the newest turn rather than nothing
+                    if not history_lines and remaining > 20:
+                        turn = truncate_to_tokens(turn, remaining)
+                        history_lines.append(turn)
+                        remaining -= estimate_tokens(turn)
+                    break
+                history_lines.append(turn)
+                remaining -= cost
+            history_lines.reverse()
+        stats["history"] = sum(estimate_tokens(t) for t in history_lines)
+
+        summary = memory.summary if memory is not None else ""
+        if summary and estimate_tokens(summary) <= remaining:
+            sections.append("Earlier in the conversation:\n" + summary)
+            stats["summary"] = estimate_tokens(summary)
+            remaining -= stats["summary"]
+        if history_lines:
+            sections.append("Chat history:\n" + "\n".join(history_lines))
+
+        prompt = "\n".join([header] + sections + [question])
+        stats["total"] = estimate_tokens(prompt)
+        self.last_stats = stats
+        return prompt
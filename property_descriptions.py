@@ -0,0 +1,205 @@
+# property_descriptions.py
+# Short, appealing descriptions for recommended properties.
+#
+# Descriptions come from the LLM, generated concurrently (bounded by max_concurrency) and
+# cached per (property_id, catalog version) in SQLite. If the LLM does not answer within
+# the time limit, the template text is shown instead (late answers are still cached), so a
+# slow API never blocks the recommendations screen. Popular listings can be prewarmed offline with
+# scripts/prewarm_descriptions.py.
+
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import instrumentation
+import llm_client
+from prompt_builder import summarize_property
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_TIMEOUT_SECONDS = 8.0
+DESCRIPTION_MAX_TOKENS = 120
+
+
+def template_description(property_data):
+    """
+    Deterministic 30-40 word description built from the listing fields.
+    """
+    features = ', '.join(property_data['features'][:4])
+    tags = ', '.join(property_data['tags'][:3])
+    price = property_data.get('price_per_night', property_data.get('price', 'your budget'))
+    desc = (
+        f"A {property_data['type']} in {property_data['location']} with {features}. "
+        f"Great for {tags}. "
+        f"Enjoy comfort and adventure at ${price} per night."
+    )
+    # Ensure description is about 30-40 words
+    words = desc.split()
+    if len(words) > 40:
+        desc = ' '.join(words[:40]) + '...'
+    return desc
+
+
+def description_prompt(property_data):
+    return (
+        "Write an appealing description of this vacation rental in 30 to 40 words. "
+        "Reply with the description only.\n" + summarize_property(property_data)
+    )
+
+
+class DescriptionCache:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        conn = sqlite3.connect(db_file, timeout=30)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS property_descriptions (
+                property_id     TEXT,
+                catalog_version TEXT,
+                description     TEXT,
+                created_at      REAL,
+                PRIMARY KEY (property_id, catalog_version)
+            )
+        """
+        )
+        conn.commit()
+        conn.close()
+
+    def get_many(self, property_ids, catalog_version):
+        if not property_ids:
+            return {}
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        placeholders = ",".join("?" for _ in property_ids)
+        rows = conn.execute(
+            f"SELECT property_id, description FROM property_descriptions "
+            f"WHERE catalog_version = ? AND property_id IN ({placeholders})",
+            [str(catalog_version), *property_ids],
+        ).fetchall()
+        conn.close()
+        return dict(rows)
+
+    def put_many(self, descriptions, catalog_version):
+        if not descriptions:
+            return
+        now = time.time()
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.executemany(
+            "INSERT OR REPLACE INTO property_descriptions VALUES (?, ?, ?, ?)",
+            [(pid, str(catalog_version), desc, now) for pid, desc in descriptions.items()],
+        )
+        conn.commit()
+        conn.close()
+
+    def prune(self, current_version):
+        """
+        Drop descriptions of other catalog versions; they can never be served again.
+        Only call with the version that is current right now.
+        """
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        deleted = conn.execute(
+            "DELETE FROM property_descriptions WHERE catalog_version != ?",
+            (str(current_version),),
+        ).rowcount
+        conn.commit()
+        conn.close()
+        return deleted
+
+
+class DescriptionGenerator:
+    def __init__(
+        self,
+        cache,
+        client=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        timeout=DEFAULT_TIMEOUT_SECONDS,
+        version_fn=None,
+    ):
+        """
+        version_fn: returns the current catalog version. Descriptions of older versions are
+        pruned only while the version a generation started with is still current, and late
+        answers for a superseded version are dropped (no pruning without it).
+        """
+        self.cache = cache
+        self.version_fn = version_fn
+        self.client = client
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="describe"
+        )
+
+    def _describe(self, property_data):
+        client = self.client or llm_client.get_client()
+        text = client.complete(
+            description_prompt(property_data), max_tokens=DESCRIPTION_MAX_TOKENS
+        )
+        text = " ".join(text.split())
+        if not text:
+            raise llm_client.LLMError("[ERROR] Empty description.")
+        return text
+
+    @instrumentation.timed("descriptions.generate_many")
+    def generate_many(self, properties, catalog_version, timeout=None):
+        """
+        Return {property_id: description} for all properties.
+        Cached descriptions are used as-is; the rest are requested concurrently and
+        anything not back within `timeout` seconds falls back to the template.
+        Pass timeout=0 to skip the LLM entirely for uncached listings.
+        """
+        return self._generate(properties, catalog_version, self.timeout if timeout is None else timeout)
+
+    def _generate(self, properties, catalog_version, timeout):
+        # timeout=None waits for every answer (offline prewarm)
+        ids = [p["property_id"] for p in properties]
+        results = self.cache.get_many(ids, catalog_version)
+        instrumentation.count("descriptions.cache_hit", len(results))
+
+        missing = [p for p in properties if p["property_id"] not in results]
+        fresh = {}
+        if missing and (timeout is None or timeout > 0):
+            futures = {self.executor.submit(self._describe, p): p for p in missing}
+            done, not_done = wait(futures, timeout=timeout)
+            errors = []
+            for future in done:
+                pid = futures[future]["property_id"]
+                try:
+                    fresh[pid] = future.result()
+                except Exception as e:
+                    errors.append(str(e))
+            if errors:
+                print(f"[LOG] {len(errors)} description(s) fell back to the template: {errors[0]}")
+            # late answers are not waited for, but still cached for the next request
+            for future in not_done:
+                if not future.cancel():
+                    future.add_done_callback(self._cache_late(futures[future], catalog_version))
+            instrumentation.count("descriptions.timeout", len(not_done))
+        self.cache.put_many(fresh, catalog_version)
+        if fresh and self.is_current(catalog_version):
+            self.cache.prune(catalog_version)
+        results.update(fresh)
+
+        for p in missing:
+            results.setdefault(p["property_id"], template_description(p))
+        return results
+
+    def is_current(self, catalog_version):
+        return self.version_fn is not None and str(self.version_fn()) == str(catalog_version)
+
+    def _cache_late(self, property_data, catalog_version):
+        def store(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            if self.version_fn is not None and not self.is_current(catalog_version):
+                # the catalog changed while the LLM was answering; never servable
+                return
+            self.cache.put_many({property_data["property_id"]: future.result()}, catalog_version)
+
+        return store
+
+    def prewarm(self, properties, catalog_version):
+        """
+        Offline: generate and cache descriptions for every listing without a deadline.
+        Returns the number of listings that now have an LLM description.
+        """
+        cached = self.cache.get_many([p["property_id"] for p in properties], catalog_version)
+        todo = [p for p in properties if p["property_id"] not in cached]
+        self._generate(todo, catalog_version, None)
+        return len(self.cache.get_many([p["property_id"] for p in properties], catalog_version))
@@ -0,0 +1,387 @@
+# recommendation_server.py
+# Long-lived recommendation service: loads the SBERT model and property vectors once,
+# then serves recommendations over a small local HTTP/JSON API (asyncio, stdlib only).
+#
+# Run:
+#   python recommendation_server.py --port 8765
+#
+# Endpoints:
+#   POST /recommend          {"user": {...}, "top_n": 5, "field_weights": {"location": 2, "tags": 1}}
+#   POST /recommend/batch    {"users": [{...}, ...], "top_n": 5}
+#   Both also accept "rerank_weights": {"similarity": 3, "price": 1, "distance": 1, "capacity": 1}
+#   and "origin": {"lat": 51.2, "lng": -115.6} (see recommenders/reranking.py), and
+#   "regions": ["Banff, Canada"] to rank only listings there (recommenders/partitioned_index.py).
+#   GET  /similar/<property_id>?top_n=5
+#   GET  /health
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import core
+import instrumentation
+from models.users import User
+from recommenders.field_embeddings import normalize_weights
+from recommenders.partitioned_index import parse_regions
+from recommenders.reranking import normalize_rerank_weights, parse_origin
+from recommenders.similar_properties import SimilarPropertiesIndex, index_file_for
+
+MAX_BODY_BYTES = 1 << 20
+# user_id of requests without one; they have no saves or stored taste vector
+ANONYMOUS_USER_ID = "anonymous"
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def user_from_payload(data):
+    """
+    Build a User from a request payload. user_id is optional for anonymous queries.
+    """
+    if not isinstance(data, dict):
+        raise HTTPError(400, "user must be a JSON object")
+    if "budget" not in data:
+        raise HTTPError(400, "user.budget is required")
+    try:
+        return User.from_dict({**data, "user_id": str(data.get("user_id") or ANONYMOUS_USER_ID)})
+    except (TypeError, ValueError) as e:
+        raise HTTPError(400, f"invalid user: {e}")
+
+
+class RecommendationService:
+    """
+    Owns the recommender plus a bounded thread pool for NumPy ranking work.
+    Concurrent single-user requests are micro-batched by the recommender's
+    EncodeBatcher: texts arriving within max_wait_ms of each other (up to
+    max_batch_size) share one model.encode call.
+    """
+
+    def __init__(self, recommender, max_workers=2, max_batch_size=32, max_wait_ms=5, similar_index=None):
+        self.recommender = recommender
+        self.similar_index = similar_index
+        # catalog version and index file mtime the neighbour index was loaded for
+        self._similar_version = recommender.version
+        self._similar_mtime = similar_index_mtime(recommender)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="rank"
+        )
+        self.batcher = recommender.enable_batching(
+            max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+        )
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def encode(self, text):
+        """
+        Queue one text for encoding and wait for its vector.
+        """
+        return await asyncio.wrap_future(self.batcher.submit(text))
+
+    async def user_vectors(self, users):
+        """
+        Query vectors the same way core.recommend_properties gets them: persisted taste
+        vectors (recommender.user_vectors) for known users. Anonymous users have no saves,
+        so their encoded preference text is their taste; single ones go through the batcher.
+        """
+        core.co_save_matrix()  # picks up saves made by the CLI or the app
+        known = [i for i, u in enumerate(users) if u.user_id != ANONYMOUS_USER_ID]
+        anonymous = [i for i, u in enumerate(users) if u.user_id == ANONYMOUS_USER_ID]
+        vectors = [None] * len(users)
+        if known:
+            known_vectors = await self._run(self.recommender.user_vectors, [users[i] for i in known])
+            for i, v in zip(known, known_vectors):
+                vectors[i] = v
+        if len(anonymous) == 1:
+            i = anonymous[0]
+            vectors[i] = await self.encode(self.recommender.compose_user_text(users[i]))
+        elif anonymous:
+            texts = [self.recommender.compose_user_text(users[i]) for i in anonymous]
+            for i, v in zip(anonymous, await self._run(self.recommender.embed_to_vector, texts)):
+                vectors[i] = v
+        return vectors
+
+    async def recommend(self, user, top_n, options=None):
+        """
+        options: ranking keyword arguments for recommend_from_vector (parse_ranking_options).
+        """
+        vector = (await self.user_vectors([user]))[0]
+        return await self._run(
+            lambda: self.recommender.recommend_from_vector(user, vector, top_n, **(options or {}))
+        )
+
+    async def recommend_batch(self, users, top_n, options=None):
+        # The batch texts that need encoding are encoded together in one call.
+        vectors = await self.user_vectors(users)
+
+        def rank_all():
+            return [
+                self.recommender.recommend_from_vector(u, v, top_n, **(options or {}))
+                for u, v in zip(users, vectors)
+            ]
+
+        return await self._run(rank_all)
+
+    def current_similar_index(self):
+        """
+        The neighbour index if it matches the recommender's catalog, else None.
+        After a hot reload the index file is loaded again once it has been rewritten
+        (update_index_file); until then /similar falls back to exact most_similar.
+        """
+        version = self.recommender.version
+        if version != self._similar_version:
+            mtime = similar_index_mtime(self.recommender)
+            if mtime is None or mtime == self._similar_mtime:
+                return None
+            print("[LOG] Catalog changed; reloading similar-properties index.")
+            self.similar_index = SimilarPropertiesIndex.load(similar_index_file(self.recommender))
+            self._similar_version, self._similar_mtime = version, mtime
+        return self.similar_index
+
+    async def similar(self, property_id, top_n):
+        # Served from the precomputed neighbour index: a dict lookup, no similarity search.
+        index = await self._run(self.current_similar_index)
+        if index is None or property_id not in index or top_n > index.k:
+            try:
+                return await self._run(self.recommender.most_similar, property_id, top_n)
+            except KeyError:
+                raise HTTPError(404, f"unknown property_id {property_id}")
+        state = self.recommender.state
+        rows = state.property_index
+        return [
+            self.recommender.result_row(rows[nid], score, state)
+            for nid, score in index.lookup(property_id, top_n)
+            if nid in rows
+        ]
+
+    def close(self):
+        self.recommender.disable_batching()
+        self.executor.shutdown(wait=False)
+
+
+################ HTTP HANDLING ################
+
+
+def parse_top_n(value, default=5):
+    try:
+        top_n = int(value if value is not None else default)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "top_n must be an integer")
+    if top_n < 1:
+        raise HTTPError(400, "top_n must be positive")
+    return top_n
+
+
+def parse_ranking_options(payload):
+    """
+    Optional field_weights, rerank_weights, origin and regions from a request body, validated.
+    """
+    parsers = {
+        "field_weights": normalize_weights,
+        "rerank_weights": normalize_rerank_weights,
+        "origin": parse_origin,
+        "regions": parse_regions,
+    }
+    options = {}
+    for key, parse in parsers.items():
+        if payload.get(key) is None:
+            continue
+        try:
+            options[key] = parse(payload[key])
+        except ValueError as e:
+            raise HTTPError(400, f"invalid {key}: {e}")
+    return options
+
+
+async def route(service, method, target, body):
+    url = urlsplit(target)
+    path = url.path.rstrip("/") or "/"
+    query = parse_qs(url.query)
+
+    if path == "/health":
+        recommender = service.recommender
+        return {"status": "ok", "properties": len(recommender.properties), "catalog_version": recommender.version}
+
+    if path.startswith("/similar/"):
+        if method != "GET":
+            raise HTTPError(405, "use GET")
+        property_id = path[len("/similar/"):]
+        top_n = parse_top_n(query.get("top_n", [None])[0])
+        return {"property_id": property_id, "results": await service.similar(property_id, top_n)}
+
+    if path in ("/recommend", "/recommend/batch"):
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        top_n = parse_top_n(payload.get("top_n"))
+        options = parse_ranking_options(payload)
+        if path == "/recommend":
+            user = user_from_payload(payload.get("user"))
+            return {"results": await service.recommend(user, top_n, options)}
+        users = payload.get("users")
+        if not isinstance(users, list):
+            raise HTTPError(400, "users must be a list")
+        users = [user_from_payload(u) for u in users]
+        return {"results": await service.recommend_batch(users, top_n, options)}
+
+    raise HTTPError(404, f"no route for {path}")
+
+
+async def write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("ascii") + body)
+    await writer.drain()
+
+
+async def handle_connection(service, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                await write_response(writer, 400, {"error": "malformed request line"}, False)
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            try:
+                length = int(headers.get("content-length", 0) or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                await write_response(writer, 400, {"error": "invalid Content-Length"}, False)
+                break
+            if length > MAX_BODY_BYTES:
+                await write_response(writer, 413, {"error": "body too large"}, False)
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            with instrumentation.timer("server.request"):
+                try:
+                    status, payload = 200, await route(service, method.upper(), target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    print(f"[LOG] Error handling {method} {target}: {e}")
+                    status, payload = 500, {"error": "internal error"}
+
+            await write_response(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(
+        lambda r, w: handle_connection(service, r, w), host, port
+    )
+    print(f"[LOG] Recommendation server listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def similar_index_file(recommender):
+    # next to the recommender's vector store, where core and update_index_file keep it
+    return index_file_for(recommender.store.path)
+
+
+def similar_index_mtime(recommender):
+    index_file = similar_index_file(recommender)
+    return os.path.getmtime(index_file) if os.path.exists(index_file) else None
+
+
+def load_similar_index(recommender):
+    """
+    Load the precomputed neighbour index, or build it once from the in-memory vectors.
+    """
+    index_file = similar_index_file(recommender)
+    if os.path.exists(index_file):
+        print(f"[LOG] Loading similar-properties index from {index_file}")
+        return SimilarPropertiesIndex.load(index_file)
+    print("[LOG] No similar-properties index found; building it in memory...")
+    property_ids = [p["property_id"] for p in recommender.properties]
+    return SimilarPropertiesIndex.build(property_ids, recommender.property_vectors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local recommendation HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="ranking thread pool size")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument(
+        "--reload-interval", type=float, default=5.0,
+        help="seconds between catalog version checks (0 disables hot reload)",
+    )
+    args = parser.parse_args(argv)
+
+    # core uses paths relative to the project root
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    print("[LOG] Loading catalog and model...")
+    # the process-wide core recommender: same model, co-saves and taste vectors as the
+    # CLI and the app, so every front end ranks a user the same way
+    recommender = core.get_recommender()
+    if args.reload_interval > 0:
+        # catalog changes are rebuilt in the background and swapped in between requests
+        recommender.start_auto_reload(args.reload_interval)
+    service = RecommendationService(
+        recommender,
+        max_workers=args.workers,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        similar_index=load_similar_index(recommender),
+    )
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n[LOG] Shutting down.")
+    finally:
+        recommender.stop_auto_reload()
+        service.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# Aligned-block binary files, shared by the columnar vector store and recommender snapshots.
+#
+# Layout (all integers little-endian):
+#   8 bytes   magic
+#   8 bytes   manifest length (uint64)
+#   manifest  UTF-8 JSON; its "blocks" entry maps every block name to
+#             [offset, nbytes, dtype], offsets relative to the data section
+#   padding   up to a 64-byte boundary, then the data section
+#   blocks    raw array bytes, each padded to a 64-byte boundary
+#
+# Blocks can be read with one np.fromfile call or memory-mapped in place.
+
+import json
+import os
+
+import numpy as np
+
+BLOCK_ALIGNMENT = 64
+
+
+def align(n):
+    return -(-n // BLOCK_ALIGNMENT) * BLOCK_ALIGNMENT
+
+
+def encode_strings(values):
+    """
+    (int64 offsets (n + 1), uint8 UTF-8 bytes) for a sequence of strings.
+    """
+    data = [str(v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(d) for d in data], dtype=np.int64)
+    return offsets, np.frombuffer(b"".join(data), dtype=np.uint8)
+
+
+def decode_strings(offsets, blob):
+    raw = blob.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def write_block_file(path, magic, manifest, arrays):
+    """
+    Write arrays ((name, ndarray) pairs) after a header holding manifest plus the block
+    table. The file is replaced atomically (temp file + rename), so readers always see
+    either the old or the new contents.
+    """
+    arrays = [(name, np.ascontiguousarray(array)) for name, array in arrays]
+    blocks, offset = {}, 0
+    for name, array in arrays:
+        blocks[name] = [offset, int(array.nbytes), array.dtype.str]
+        offset = align(offset + array.nbytes)
+    encoded = json.dumps({**manifest, "blocks": blocks}).encode("utf-8")
+    header = magic + np.array([len(encoded)], dtype="<u8").tobytes() + encoded
+
+    # per-process temp name, so concurrent writers never interleave
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header + b"\0" * (align(len(header)) - len(header)))
+        for _, array in arrays:
+            data = array.tobytes()
+            f.write(data + b"\0" * (align(len(data)) - len(data)))
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path, magic):
+    """
+    return: (manifest dict, absolute offset of the data section)
+    Raises ValueError if the file does not start with magic.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{path} is not a {magic[:6].decode('ascii', 'replace')} file")
+        length = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+        manifest = json.loads(f.read(length).decode("utf-8"))
+    return manifest, align(len(magic) + 8 + length)
+
+
+def read_block(f, manifest, data_start, name):
+    """
+    One block as a NumPy array, read from an open file.
+    """
+    offset, nbytes, dtype = manifest["blocks"][name]
+    f.seek(data_start + offset)
+    return np.fromfile(f, dtype=np.dtype(dtype), count=nbytes // np.dtype(dtype).itemsize)
+
+
+def map_block(path, manifest, data_start, name):
+    """
+    One block as a read-only memory map (a plain empty array for empty blocks).
+    """
+    offset, nbytes, dtype = manifest["blocks"][name]
+    dtype = np.dtype(dtype)
+    if nbytes == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(
+        path, dtype=dtype, mode="r", offset=data_start + offset, shape=(nbytes // dtype.itemsize,)
+    )
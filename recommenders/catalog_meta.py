@@ -0,0 +1,51 @@
+# Catalog version bookkeeping for the embeddings DB.
+# Every write that changes listings bumps the version, so caches derived from the
+# catalog (recommendations, descriptions, indexes) can tell when they are stale.
+
+import sqlite3
+
+
+def ensure_meta_table(conn):
+    """
+    Ensure the catalog_meta key/value table exists.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """
+    )
+
+
+def read_catalog_version(conn):
+    row = conn.execute(
+        "SELECT value FROM catalog_meta WHERE key = 'catalog_version'"
+    ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def get_catalog_version(db_file):
+    """
+    Current catalog version of the DB (0 if it has never been written).
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        ensure_meta_table(conn)
+        return read_catalog_version(conn)
+    finally:
+        conn.close()
+
+
+def bump_catalog_version(conn):
+    """
+    Increment the catalog version inside the caller's transaction and return it.
+    """
+    ensure_meta_table(conn)
+    version = read_catalog_version(conn) + 1
+    conn.execute(
+        "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('catalog_version', ?)",
+        (str(version),),
+    )
+    return version
@@ -0,0 +1,243 @@
+# Collaborative "saved together" signal from users.json saved_property lists.
+# Saves form a sparse users x properties matrix kept in CSR form (indptr / indices); saves
+# made since the last compaction sit in small per-row lists and removed ones are marked -1,
+# and both are folded in once they make up a fair share of the matrix, so a save or removal
+# never rebuilds anything. Alongside it the item-item co-save counts (how many users saved
+# both listings) are kept as sparse rows and updated in O(saves of that user).
+#
+# A user's score for a listing j is the mean, over the listings i they saved, of the cosine
+# co-save similarity count(i, j) / sqrt(count(i) * count(j)), ignoring the user's own
+# co-saves; computing it touches only the user's row and the co-save rows of those listings.
+
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+
+# Pending saves and removals are folded into the CSR arrays once they exceed this share of stored saves
+COMPACT_FRACTION = 0.25
+MIN_PENDING_SAVES = 64
+
+
+def _user_key(user_id):
+    # same normalization as models.users.User
+    return str(user_id).lower().strip()
+
+
+class CoSaveMatrix:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.user_rows = {}  # user_id -> row
+        self.item_columns = {}  # property_id -> column
+        self.item_ids = []  # column -> property_id
+        # compacted CSR rows
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        # saves since the last compaction: row -> [column, ...]
+        self.pending = {}
+        self.pending_count = 0
+        # compacted entries removed since (marked -1 in indices)
+        self.removed_count = 0
+        # savers per column, and column -> {column: users who saved both}
+        self.item_counts = np.zeros(0, dtype=np.int64)
+        self.co_counts = []
+
+    @classmethod
+    @instrumentation.timed("co_save.build")
+    def from_users(cls, users):
+        """
+        Build from users.json records (their saved_property lists).
+        """
+        matrix = cls()
+        matrix.rebuild(users)
+        return matrix
+
+    def rebuild(self, users):
+        """
+        Replace the contents with the saves of the given users.json records, in place,
+        so recommenders holding this matrix see the new data.
+        """
+        with self.lock:
+            self.clear()
+            for user in users:
+                for property_id in user.get("saved_property") or []:
+                    self._add(user["user_id"], property_id)
+            self._compact()
+
+    def __len__(self):
+        return len(self.indices) - self.removed_count + self.pending_count
+
+    def _column(self, property_id):
+        column = self.item_columns.get(property_id)
+        if column is None:
+            column = self.item_columns[property_id] = len(self.item_ids)
+            self.item_ids.append(property_id)
+            self.co_counts.append({})
+            if column >= len(self.item_counts):
+                # amortized growth
+                grown = np.zeros(max(2 * len(self.item_counts), 64), dtype=np.int64)
+                grown[: len(self.item_counts)] = self.item_counts
+                self.item_counts = grown
+        return column
+
+    def _row_columns(self, row):
+        """
+        Columns saved in a row: its compacted slice plus pending saves.
+        """
+        if row + 1 < len(self.indptr):
+            stored = self.indices[self.indptr[row]:self.indptr[row + 1]]
+            if self.removed_count:
+                stored = stored[stored >= 0]
+        else:
+            stored = self.indices[:0]
+        pending = self.pending.get(row)
+        if pending:
+            return np.concatenate([stored, np.array(pending, dtype=np.int32)])
+        return stored
+
+    def add_save(self, user_id, property_id):
+        """
+        Record one save. return: False if the user had already saved the listing.
+        """
+        with self.lock:
+            added = self._add(user_id, property_id)
+            self._maybe_compact()
+        if added:
+            instrumentation.count("co_save.add")
+        return added
+
+    def remove_save(self, user_id, property_id):
+        """
+        Undo one save. return: False if the user had not saved the listing.
+        """
+        with self.lock:
+            row = self.user_rows.get(_user_key(user_id))
+            column = self.item_columns.get(property_id)
+            if row is None or column is None:
+                return False
+            saved = self._row_columns(row)
+            if not (saved == column).any():
+                return False
+            for other in saved[saved != column].tolist():
+                for a, b in ((column, other), (other, column)):
+                    counts = self.co_counts[a]
+                    counts[b] -= 1
+                    if not counts[b]:
+                        del counts[b]
+            self.item_counts[column] -= 1
+            pending = self.pending.get(row)
+            if pending and column in pending:
+                pending.remove(column)
+                self.pending_count -= 1
+            else:
+                start, end = self.indptr[row], self.indptr[row + 1]
+                position = start + int(np.flatnonzero(self.indices[start:end] == column)[0])
+                self.indices[position] = -1
+                self.removed_count += 1
+            self._maybe_compact()
+        instrumentation.count("co_save.remove")
+        return True
+
+    def _maybe_compact(self):
+        changed = self.pending_count + self.removed_count
+        if changed > max(MIN_PENDING_SAVES, COMPACT_FRACTION * len(self.indices)):
+            self._compact()
+
+    def _add(self, user_id, property_id):
+        key = _user_key(user_id)
+        row = self.user_rows.setdefault(key, len(self.user_rows))
+        column = self._column(property_id)
+        saved = self._row_columns(row)
+        if (saved == column).any():
+            return False
+        co_row = self.co_counts[column]
+        for other in saved.tolist():
+            co_row[other] = co_row.get(other, 0) + 1
+            self.co_counts[other][column] = self.co_counts[other].get(column, 0) + 1
+        self.item_counts[column] += 1
+        self.pending.setdefault(row, []).append(column)
+        self.pending_count += 1
+        return True
+
+    def _compact(self):
+        """
+        Merge pending saves into new CSR arrays and drop removed entries (rows keep
+        their save order).
+        """
+        if not self.pending and not self.removed_count:
+            return
+        num_rows = len(self.user_rows)
+        stored_rows = len(self.indptr) - 1
+        row_of = np.repeat(np.arange(stored_rows), np.diff(self.indptr))
+        kept = self.indices >= 0
+        row_of, stored = row_of[kept], self.indices[kept]
+        lengths = np.bincount(row_of, minlength=num_rows).astype(np.int64)
+        for row, columns in self.pending.items():
+            lengths[row] += len(columns)
+        indptr = np.zeros(num_rows + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(lengths)
+        indices = np.empty(int(indptr[-1]), dtype=np.int32)
+
+        # stored entries keep their order within their row
+        first = np.searchsorted(row_of, np.arange(stored_rows))
+        position = np.arange(len(stored)) - first[row_of]
+        indices[indptr[row_of] + position] = stored
+        for row, columns in self.pending.items():
+            end = indptr[row + 1]
+            indices[end - len(columns):end] = columns
+
+        self.indptr, self.indices = indptr, indices
+        self.pending, self.pending_count = {}, 0
+        self.removed_count = 0
+
+    def saved(self, user_id):
+        """
+        Property ids the user has saved, in save order.
+        """
+        with self.lock:
+            row = self.user_rows.get(_user_key(user_id))
+            if row is None:
+                return []
+            return [self.item_ids[c] for c in self._row_columns(row).tolist()]
+
+    @instrumentation.timed("co_save.user_scores")
+    def user_scores(self, user_id):
+        """
+        Collaborative scores for one user.
+        return: (property ids, float64 scores in [0, 1]); empty when the user has no saves
+        or nobody else saved the same listings.
+        """
+        with self.lock:
+            row = self.user_rows.get(_user_key(user_id))
+            if row is None:
+                return [], np.zeros(0)
+            saved = self._row_columns(row)
+            columns, weights = [], []
+            for i in saved.tolist():
+                co_row = self.co_counts[i]
+                if not co_row:
+                    continue
+                js = np.fromiter(co_row.keys(), dtype=np.int64, count=len(co_row))
+                counts = np.fromiter(co_row.values(), dtype=np.float64, count=len(co_row))
+                columns.append(js)
+                weights.append((counts, self.item_counts[i] * self.item_counts[js]))
+            if not columns:
+                return [], np.zeros(0)
+            js = np.concatenate(columns)
+            counts = np.concatenate([c for c, _ in weights])
+            # this user's own saves co-occur with each other; only other users count
+            counts[np.isin(js, saved)] -= 1
+            similarity = counts / np.sqrt(np.concatenate([n for _, n in weights]))
+            keep = similarity > 0
+            if not keep.any():
+                return [], np.zeros(0)
+            unique, inverse = np.unique(js[keep], return_inverse=True)
+            scores = np.bincount(inverse, weights=similarity[keep]) / len(saved)
+            return [self.item_ids[c] for c in unique.tolist()], scores
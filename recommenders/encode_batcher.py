@@ -0,0 +1,107 @@
+# Micro-batching queue in front of the SBERT encoder.
+# Concurrent callers each submit one text; a worker thread groups whatever arrives within
+# max_wait_ms (or until max_batch_size texts are queued) into a single model.encode call
+# and resolves each caller's future with its own row.
+
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+
+_STOP = object()
+
+
+class EncodeBatcher:
+    def __init__(self, encode_fn, max_batch_size=32, max_wait_ms=5.0):
+        """
+        encode_fn: callable taking a list of texts and returning an (n, d) array.
+        max_batch_size: flush as soon as this many texts are queued.
+        max_wait_ms: longest time the first text of a batch waits for company.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms cannot be negative.")
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._worker, name="encode-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, text):
+        """
+        Queue one text; returns a concurrent.futures.Future resolving to its vector.
+        """
+        if self._closed:
+            raise RuntimeError("EncodeBatcher is closed.")
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, texts):
+        """
+        Blocking helper: submit every text and stack the results in order.
+        texts must be non-empty (the batcher does not know the embedding size).
+        """
+        if not texts:
+            raise ValueError("EncodeBatcher.encode needs at least one text")
+        futures = [self.submit(text) for text in texts]
+        return np.stack([f.result() for f in futures])
+
+    def close(self):
+        """
+        Stop the worker after the texts already queued are encoded.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _worker(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # drain anything already queued even when the wait is over
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # drop callers that cancelled while waiting
+        batch = [(text, f) for text, f in batch if f.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        instrumentation.count("encode_batcher.batches")
+        instrumentation.count("encode_batcher.texts", len(batch))
+        try:
+            vectors = self.encode_fn([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
@@ -0,0 +1,161 @@
+# Per-field property embeddings with weighted late fusion.
+# location, type, features and tags are encoded separately (each distinct field text only
+# once) and kept as unit-normalized vectors in a sidecar .npz next to the vector store.
+# A query then scores as  sum_f w_f * (M_f @ u)  - a few matrix-vector products - so
+# ranking weights can change per request or per user without re-encoding anything.
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+from recommenders.similar_properties import normalize_rows
+
+FIELDS = ("location", "type", "features", "tags")
+
+
+def field_vectors_file_for(store_path):
+    """
+    The per-field matrices live next to the vector store they were built for.
+    """
+    return os.path.splitext(store_path)[0] + "_fields.npz"
+
+
+def compose_field_text(prop, field):
+    """
+    Text embedded for one field, in the same "field: value" form compose_property_text uses.
+    Empty fields give "".
+    """
+    value = prop.get(field)
+    if isinstance(value, list):
+        value = ", ".join(str(v) for v in value)
+    value = str(value or "").strip()
+    return f"{field}: {value}" if value else ""
+
+
+def normalize_weights(weights):
+    """
+    Validate {field: weight} and scale the weights to sum to 1, so fused scores stay on
+    the cosine scale. Raises ValueError for unknown fields or non-positive totals.
+    """
+    if not isinstance(weights, dict):
+        raise ValueError("field weights must be an object of {field: weight}")
+    unknown = set(weights) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"unknown field(s) {sorted(unknown)}; expected {list(FIELDS)}")
+    try:
+        values = {f: float(w) for f, w in weights.items()}
+    except (TypeError, ValueError):
+        raise ValueError("field weights must be numbers")
+    if any(w < 0 for w in values.values()) or sum(values.values()) <= 0:
+        raise ValueError("field weights must be non-negative with a positive sum")
+    total = sum(values.values())
+    return {f: w / total for f, w in values.items() if w > 0}
+
+
+class FieldEmbeddings:
+    """
+    Per field: the distinct field texts, their unit vectors (m_f, d) and a code per
+    property pointing at its text (m_f for an empty field, which scores 0). Fields like
+    location and type repeat a lot, so a query scores m_f << n vectors and gathers.
+    """
+
+    def __init__(self, property_ids, texts, vectors, codes, encoded=0, model_key=None):
+        self.property_ids = list(property_ids)
+        self.texts = texts  # field -> list of distinct texts
+        self.vectors = vectors  # field -> unit-normalized float32 (m_f, d)
+        self.codes = codes  # field -> int32 (n,), index into texts/vectors
+        self.encoded = encoded  # texts encoded by build()
+        self.model_key = model_key  # fingerprint of the model the vectors came from
+
+    @property
+    def dim(self):
+        """
+        Vector dimension, or None when every field is empty.
+        """
+        for field in FIELDS:
+            if len(self.texts.get(field) or []):
+                return self.vectors[field].shape[1]
+        return None
+
+    @classmethod
+    @instrumentation.timed("field_embeddings.build")
+    def build(cls, properties, encode, previous=None, model_key=None, dim=None):
+        """
+        encode: texts -> (len(texts), d) vectors (e.g. SbertRecommender.embed_to_vector).
+        previous: FieldEmbeddings to reuse vectors from; only field texts it has never
+        seen are encoded. It is ignored unless it was built with the same model_key and
+        dimension (dim), so vectors of another model are never mixed in.
+        """
+        if previous is not None and (
+            previous.model_key != model_key or (dim is not None and previous.dim not in (None, dim))
+        ):
+            print("[LOG] Field embeddings were built with another model; re-encoding them.")
+            previous = None
+        texts, vectors, codes = {}, {}, {}
+        encoded = 0
+        for field in FIELDS:
+            field_texts = [compose_field_text(p, field) for p in properties]
+            unique = sorted(set(field_texts) - {""})
+            known = {}
+            if previous is not None and field in previous.vectors:
+                known = dict(zip(previous.texts[field], previous.vectors[field]))
+            missing = [t for t in unique if t not in known]
+            if missing:
+                known.update(zip(missing, normalize_rows(encode(missing))))
+                encoded += len(missing)
+            position = {t: i for i, t in enumerate(unique)}
+            texts[field] = unique
+            vectors[field] = (
+                np.stack([known[t] for t in unique]).astype(np.float32)
+                if unique
+                else np.zeros((0, 0), dtype=np.float32)
+            )
+            codes[field] = np.array(
+                [position.get(t, len(unique)) for t in field_texts], dtype=np.int32
+            )
+        instrumentation.count("field_embeddings.texts_encoded", encoded)
+        return cls([p["property_id"] for p in properties], texts, vectors, codes, encoded, model_key)
+
+    def fused_scores(self, user_vector, rows, weights):
+        """
+        Weighted sum of per-field cosine similarities for the given rows.
+        weights: output of normalize_weights.
+        """
+        u = normalize_rows(np.asarray(user_vector, dtype=np.float32).reshape(1, -1))[0]
+        scores = np.zeros(len(rows), dtype=np.float32)
+        for field, weight in weights.items():
+            if not len(self.texts[field]):
+                continue
+            # one score per distinct text, plus 0 for properties with the field empty
+            per_text = np.append(self.vectors[field] @ u, np.float32(0.0))
+            scores += weight * per_text[self.codes[field][rows]]
+        return scores
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        arrays = {
+            "property_ids": np.array(self.property_ids, dtype=str),
+            "model_key": np.array(self.model_key or "", dtype=str),
+        }
+        for field in FIELDS:
+            arrays[f"{field}_texts"] = np.array(self.texts[field], dtype=str)
+            arrays[f"{field}_vectors"] = self.vectors[field]
+            arrays[f"{field}_codes"] = self.codes[field]
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            # files written before the model key was stored load with model_key None
+            model_key = str(data["model_key"]) if "model_key" in data.files else ""
+            return cls(
+                data["property_ids"].tolist(),
+                {f: data[f"{f}_texts"].tolist() for f in FIELDS},
+                {f: data[f"{f}_vectors"] for f in FIELDS},
+                {f: data[f"{f}_codes"] for f in FIELDS},
+                model_key=model_key or None,
+            )
@@ -0,0 +1,118 @@
+# Token-level inverted index over the location / type / features / tags fields.
+# Postings are stored CSR-style: for every term a slice of sorted int32 document ids and
+# the matching precomputed BM25 term weights, so scoring a query is a few array slices and
+# one scatter-add per query term. Used by SbertRecommender as a cheap first-stage
+# retriever and as the keyword half of its hybrid (BM25 + SBERT) score.
+
+import os
+import re
+import sys
+from collections import Counter
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+
+INDEXED_FIELDS = ("location", "type", "features", "tags")
+BM25_K1 = 1.2
+BM25_B = 0.75
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def property_tokens(prop):
+    """
+    Tokens of the indexed fields (the same fields compose_property_text embeds).
+    """
+    tokens = []
+    for field in INDEXED_FIELDS:
+        value = prop.get(field)
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        tokens += tokenize(value or "")
+    return tokens
+
+
+class InvertedIndex:
+    def __init__(self, vocabulary, offsets, doc_ids, weights, num_docs):
+        self.vocabulary = vocabulary  # term -> term id
+        self.offsets = offsets  # int64, term id -> postings slice
+        self.doc_ids = doc_ids  # int32, sorted within each term
+        self.weights = weights  # float32 BM25 weight of (term, doc)
+        self.num_docs = num_docs
+
+    @classmethod
+    @instrumentation.timed("inverted_index.build")
+    def build(cls, properties, k1=BM25_K1, b=BM25_B):
+        vocabulary = {}
+        term_ids, doc_ids, tfs, doc_len = [], [], [], []
+        for doc, prop in enumerate(properties):
+            counts = Counter(property_tokens(prop))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc)
+                tfs.append(tf)
+
+        num_docs = len(doc_len)
+        doc_len = np.array(doc_len, dtype=np.float32)
+        avg_len = float(doc_len.mean()) if num_docs else 0.0
+        term_ids = np.array(term_ids, dtype=np.int64)
+        # stable sort by term keeps each postings list in ascending doc order
+        order = np.argsort(term_ids, kind="stable")
+        doc_ids = np.array(doc_ids, dtype=np.int32)[order]
+        tfs = np.array(tfs, dtype=np.float32)[order]
+        term_ids = term_ids[order]
+
+        df = np.bincount(term_ids, minlength=len(vocabulary)).astype(np.float64)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(df, dtype=np.int64)
+        idf = np.log(1.0 + (num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * doc_len[doc_ids] / max(avg_len, 1e-9))
+        weights = (idf[term_ids] * tfs * (k1 + 1.0) / (tfs + norm)).astype(np.float32)
+        return cls(vocabulary, offsets, doc_ids, weights, num_docs)
+
+    def __len__(self):
+        return self.num_docs
+
+    def postings(self, term):
+        """
+        (doc_ids, weights) for a term; empty arrays for unknown terms.
+        """
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            return self.doc_ids[:0], self.weights[:0]
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.doc_ids[start:end], self.weights[start:end]
+
+    def scores(self, query_tokens):
+        """
+        BM25 score of every document for the query, as a dense float32 array.
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term, qtf in Counter(query_tokens).items():
+            docs, weights = self.postings(term)
+            # doc ids are unique within a postings list, so plain fancy-index add is safe
+            scores[docs] += qtf * weights
+        return scores
+
+    def top_candidates(self, query_tokens, k, allowed=None, scores=None):
+        """
+        Up to k document ids with a positive BM25 score, best first.
+        allowed: optional array of document ids to restrict to.
+        scores: the query's scores() if the caller already has them.
+        """
+        if scores is None:
+            scores = self.scores(query_tokens)
+        if allowed is not None:
+            candidates = np.asarray(allowed)[scores[allowed] > 0]
+        else:
+            candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            part = np.argpartition(-scores[candidates], k - 1)[:k]
+            candidates = candidates[part]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
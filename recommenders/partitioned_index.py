@@ -0,0 +1,389 @@
+# Region / price-band partitioned vector index.
+# Listings are grouped by region (the part of "location" before " - ", e.g. "Banff, Canada",
+# the same prefixes LOCATION_COORDS in add_coords_and_bookings.py is keyed on) and, inside
+# each region, by price band. Every partition keeps statistics for the query planner: row
+# count, price range, and the centroid and radius (lowest cosine to the centroid) of its
+# vectors. A query with a region and/or budget constraint only touches the partitions that
+# can match; a vector search then scans those in order of their best possible score and
+# stops once no remaining partition can beat the current top-k.
+#
+# Saved as an aligned-block file (block_file.py) with separate id / price / vector blocks
+# per partition, so a worker can memory-map just the partitions it serves:
+#   PartitionedIndex.load(path, regions=["Banff, Canada"])
+#
+# Build / rebuild from the embeddings DB:
+#   python recommenders/partitioned_index.py --bands 100,200,300,500,800
+
+import argparse
+import heapq
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, "..")))
+import instrumentation
+from recommenders.block_file import (
+    decode_strings,
+    encode_strings,
+    map_block,
+    read_manifest,
+    write_block_file,
+)
+from recommenders.similar_properties import normalize_rows
+
+PARTITION_MAGIC = b"GR8PRT\x00\x01"
+PARTITION_FORMAT = 1
+PARTITION_EXTENSION = ".gr8part"
+# Upper edges of the price bands; the last band is open-ended
+DEFAULT_PRICE_BANDS = (100.0, 200.0, 300.0, 500.0, 800.0)
+UNKNOWN_REGION = "Unknown"
+
+
+def index_file_for(store_path):
+    """
+    The partitioned index lives next to the vector store it was built from.
+    """
+    return os.path.splitext(store_path)[0] + "_partitions" + PARTITION_EXTENSION
+
+
+def region_of(prop):
+    """
+    Region of a listing: its location up to " - " ("Banff, Canada - Mountain, Cold" -> "Banff, Canada").
+    """
+    location = str(prop.get("location") or "")
+    return location.split(" - ")[0].strip() or UNKNOWN_REGION
+
+
+def region_key(region):
+    return str(region).lower().strip()
+
+
+def parse_regions(regions):
+    """
+    Sorted list of region names from a list (or a single name); None stays None.
+    Raises ValueError for anything else.
+    """
+    if regions is None:
+        return None
+    if isinstance(regions, str):
+        regions = [regions]
+    if (
+        not isinstance(regions, (list, tuple))
+        or not regions
+        or not all(isinstance(r, str) and r.strip() for r in regions)
+    ):
+        raise ValueError("regions must be a non-empty list of region names")
+    return sorted({r.strip() for r in regions})
+
+
+def parse_price_bands(text):
+    """
+    "100,200,300" -> (100.0, 200.0, 300.0). Raises ValueError unless strictly increasing.
+    """
+    edges = tuple(float(v) for v in str(text).split(",") if v.strip())
+    if not edges or any(b <= a for a, b in zip(edges, edges[1:])):
+        raise ValueError("price bands must be increasing numbers")
+    return edges
+
+
+class PartitionedIndex:
+    def __init__(self, regions, bands, edges, offsets, min_prices, max_prices,
+                 rows=None, centroids=None, radii=None):
+        """
+        Partition i covers region regions[i], price band bands[i] and, in catalog order
+        terms, rows[offsets[i]:offsets[i + 1]] (rows is None for a loaded index).
+        centroids / radii: unit mean vector per partition and the lowest cosine of a
+        member to it (None without vectors).
+        """
+        self.regions = list(regions)
+        self.bands = np.asarray(bands, dtype=np.int32)
+        self.edges = tuple(edges)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.min_prices = np.asarray(min_prices, dtype=np.float64)
+        self.max_prices = np.asarray(max_prices, dtype=np.float64)
+        self.rows = rows
+        self.centroids = centroids
+        self.radii = radii
+        # partition -> (property ids, prices, unit vectors); filled by load()
+        self.partitions = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self.regions)
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    @classmethod
+    @instrumentation.timed("partitioned_index.build")
+    def build(cls, regions, prices, vectors=None, edges=DEFAULT_PRICE_BANDS):
+        """
+        Partition catalog rows by region, then price band.
+        regions / prices: one entry per row; vectors (optional, aligned) add the centroid
+        statistics used to prune vector searches.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        names = sorted(set(regions), key=region_key)
+        code = {name: i for i, name in enumerate(names)}
+        region_codes = np.array([code[r] for r in regions], dtype=np.int64)
+        bands = np.searchsorted(np.asarray(edges, dtype=np.float64), prices, side="left")
+        # region, then band, then price
+        rows = np.lexsort((prices, bands, region_codes)).astype(np.int64)
+        keys = region_codes[rows] * (len(edges) + 1) + bands[rows]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(rows) else np.zeros(0, dtype=np.int64)
+        offsets = np.r_[starts, len(rows)].astype(np.int64)
+        sorted_prices = prices[rows]
+        index = cls(
+            [names[region_codes[rows[s]]] for s in starts],
+            bands[rows[starts]] if len(rows) else [],
+            edges,
+            offsets,
+            sorted_prices[starts] if len(rows) else [],
+            sorted_prices[offsets[1:] - 1] if len(rows) else [],
+            rows=rows,
+        )
+        if vectors is not None:
+            index.centroids, index.radii = partition_centroids(normalize_rows(vectors)[rows], offsets)
+        return index
+
+    def band_range(self, band):
+        """
+        (low, high] prices of a band; the first starts at 0, the last is open-ended.
+        """
+        low = self.edges[band - 1] if band > 0 else 0.0
+        high = self.edges[band] if band < len(self.edges) else float("inf")
+        return low, high
+
+    def plan(self, regions=None, budget=None):
+        """
+        Partitions a query can match: in one of the regions (any, if None) with at least
+        one listing within the budget (any, if None).
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if regions is not None:
+            wanted = {region_key(r) for r in regions}
+            selected &= np.array([region_key(r) in wanted for r in self.regions], dtype=bool)
+        if budget is not None:
+            selected &= self.min_prices <= budget
+        partitions = np.flatnonzero(selected)
+        instrumentation.count("partitioned_index.pruned", len(self) - len(partitions))
+        return partitions
+
+    def candidate_rows(self, prices, regions=None, budget=None):
+        """
+        Sorted catalog rows within the budget in the planned partitions.
+        prices: the catalog's price array (rows index into it). Only partitions that
+        straddle the budget are filtered row by row.
+        """
+        partitions = self.plan(regions, budget)
+        if not len(partitions):
+            return np.zeros(0, dtype=np.int64)
+        rows = np.concatenate([self.rows[self.offsets[p]:self.offsets[p + 1]] for p in partitions])
+        if budget is not None and (self.max_prices[partitions] > budget).any():
+            rows = rows[prices[rows] <= budget]
+        return np.sort(rows)
+
+    def upper_bounds(self, query, partitions):
+        """
+        Highest cosine any member of each partition can have with the unit query:
+        cos(max(0, angle(query, centroid) - angle radius)).
+        """
+        to_centroid = np.arccos(np.clip(self.centroids[partitions] @ query, -1.0, 1.0))
+        spread = np.arccos(np.clip(self.radii[partitions], -1.0, 1.0))
+        return np.cos(np.maximum(0.0, to_centroid - spread)) + 1e-6
+
+    @instrumentation.timed("partitioned_index.search")
+    def search(self, query, top_k, regions=None, budget=None):
+        """
+        Top-k (score, property_id, price) by cosine among the loaded partitions, best first.
+        Partitions are scanned by descending upper bound; the scan stops once the bound
+        cannot beat the k-th best score.
+        """
+        if self.centroids is None:
+            raise ValueError("search needs an index built with vectors")
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        partitions = np.array([p for p in self.plan(regions, budget) if p in self.partitions], dtype=np.int64)
+        if not len(partitions) or top_k <= 0:
+            return []
+        bounds = self.upper_bounds(query, partitions)
+        order = np.argsort(-bounds, kind="stable")
+        heap = []  # (score, property_id, price), smallest first
+        scanned = 0
+        for p, bound in zip(partitions[order], bounds[order]):
+            if len(heap) >= top_k and bound <= heap[0][0]:
+                break
+            scanned += 1
+            property_ids, prices, vectors = self.partitions[p]
+            scores = vectors @ query
+            if budget is not None and self.max_prices[p] > budget:
+                scores = np.where(prices <= budget, scores, -np.inf)
+            best = np.argsort(-scores, kind="stable")[:top_k]
+            for i in best:
+                if not np.isfinite(scores[i]):
+                    break
+                item = (float(scores[i]), property_ids[i], float(prices[i]))
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item[0] > heap[0][0]:
+                    heapq.heapreplace(heap, item)
+                else:
+                    break
+        instrumentation.count("partitioned_index.scanned", scanned)
+        return sorted(heap, key=lambda item: -item[0])
+
+    def stats(self):
+        """
+        One dict per partition, for the planner and for reports.
+        """
+        counts = self.counts
+        return [
+            {
+                "partition": i,
+                "region": self.regions[i],
+                "band": self.band_range(int(self.bands[i])),
+                "count": int(counts[i]),
+                "min_price": float(self.min_prices[i]),
+                "max_price": float(self.max_prices[i]),
+                "radius": float(self.radii[i]) if self.radii is not None else None,
+            }
+            for i in range(len(self))
+        ]
+
+    @instrumentation.timed("partitioned_index.save")
+    def save(self, path, property_ids, prices, vectors, version=None):
+        """
+        Write the index with each partition's ids, prices and unit vectors (catalog-aligned
+        inputs, the ones it was built on).
+        """
+        vectors = normalize_rows(vectors)
+        prices = np.asarray(prices, dtype=np.float64)
+        if self.centroids is None:
+            self.centroids, self.radii = partition_centroids(vectors[self.rows], self.offsets)
+        arrays = [("centroids", self.centroids.reshape(-1))]
+        for p in range(len(self)):
+            rows = self.rows[self.offsets[p]:self.offsets[p + 1]]
+            id_offsets, id_data = encode_strings(property_ids[r] for r in rows.tolist())
+            arrays += [
+                (f"p{p}.ids.offsets", id_offsets),
+                (f"p{p}.ids.data", id_data),
+                (f"p{p}.prices", prices[rows]),
+                (f"p{p}.vectors", vectors[rows].reshape(-1)),
+            ]
+        manifest = {
+            "format": PARTITION_FORMAT,
+            "version": version,
+            "dim": int(vectors.shape[1]),
+            "edges": list(self.edges),
+            "partitions": [
+                {
+                    "region": self.regions[p],
+                    "band": int(self.bands[p]),
+                    "count": int(self.counts[p]),
+                    "min_price": float(self.min_prices[p]),
+                    "max_price": float(self.max_prices[p]),
+                    "radius": float(self.radii[p]),
+                }
+                for p in range(len(self))
+            ],
+            "created_at": time.time(),
+        }
+        write_block_file(path, PARTITION_MAGIC, manifest, arrays)
+
+    @classmethod
+    @instrumentation.timed("partitioned_index.load")
+    def load(cls, path, regions=None, partitions=None):
+        """
+        Open a saved index, memory-mapping only the partitions in the given regions
+        and/or with the given partition numbers (all by default). The planner statistics
+        of every partition are always available.
+        """
+        manifest, data_start = read_manifest(path, PARTITION_MAGIC)
+        if manifest.get("format") != PARTITION_FORMAT:
+            raise ValueError(f"{path}: unsupported partition index format {manifest.get('format')}")
+        meta = manifest["partitions"]
+        counts = [m["count"] for m in meta]
+        index = cls(
+            [m["region"] for m in meta],
+            [m["band"] for m in meta],
+            manifest["edges"],
+            np.r_[0, np.cumsum(counts, dtype=np.int64)],
+            [m["min_price"] for m in meta],
+            [m["max_price"] for m in meta],
+            centroids=map_block(path, manifest, data_start, "centroids").reshape(len(meta), manifest["dim"]),
+            radii=np.array([m["radius"] for m in meta], dtype=np.float32),
+        )
+        index.version = manifest.get("version")
+
+        def block(name):
+            return map_block(path, manifest, data_start, name)
+
+        wanted = {region_key(r) for r in regions} if regions is not None else None
+        for p in range(len(meta)):
+            if wanted is not None and region_key(meta[p]["region"]) not in wanted:
+                continue
+            if partitions is not None and p not in partitions:
+                continue
+            index.partitions[p] = (
+                decode_strings(block(f"p{p}.ids.offsets"), block(f"p{p}.ids.data")),
+                block(f"p{p}.prices"),
+                block(f"p{p}.vectors").reshape(counts[p], manifest["dim"]),
+            )
+        return index
+
+
+def partition_centroids(vectors, offsets):
+    """
+    Unit centroid and lowest member cosine of every partition of row-normalized vectors
+    (laid out partition by partition, split at offsets).
+    """
+    num = len(offsets) - 1
+    centroids = np.zeros((num, vectors.shape[1]), dtype=np.float32)
+    radii = np.ones(num, dtype=np.float32)
+    if not len(vectors):
+        return centroids, radii
+    sums = np.add.reduceat(vectors, offsets[:-1], axis=0)
+    centroids = normalize_rows(sums)
+    member_of = np.repeat(np.arange(num), np.diff(offsets))
+    cosines = np.einsum("ij,ij->i", vectors, centroids[member_of])
+    radii = np.minimum.reduceat(cosines, offsets[:-1]).astype(np.float32)
+    return centroids, radii
+
+
+################## Build job ################
+def main(argv=None):
+    from recommenders.sbert_recommender import PROPERTIES_FILE, SQLITE_DB_FILE
+    from recommenders.vector_store import open_vector_store
+
+    parser = argparse.ArgumentParser(description="Build the region / price-band partitioned index")
+    parser.add_argument("--db-file", default=SQLITE_DB_FILE)
+    parser.add_argument("--bands", default=",".join(str(b) for b in DEFAULT_PRICE_BANDS),
+                        help="comma-separated upper edges of the price bands")
+    args = parser.parse_args(argv)
+
+    store = open_vector_store(args.db_file)
+    if not store.exists():
+        raise SystemExit(f"No vector store at {args.db_file}; build the embeddings first.")
+    property_ids, vectors = store.load_all()
+    with open(PROPERTIES_FILE, "r", encoding="utf-8") as f:
+        by_id = {p["property_id"]: p for p in json.load(f)["properties"]}
+    keep = [i for i, pid in enumerate(property_ids) if pid in by_id]
+    property_ids = [property_ids[i] for i in keep]
+    listings = [by_id[pid] for pid in property_ids]
+    prices = [float(p["price_per_night"]) for p in listings]
+
+    index = PartitionedIndex.build([region_of(p) for p in listings], prices, vectors[keep],
+                                   edges=parse_price_bands(args.bands))
+    index_file = index_file_for(args.db_file)
+    index.save(index_file, property_ids, prices, vectors[keep], version=store.version)
+    counts = index.counts
+    print(f"[LOG] Saved {len(index)} partitions ({len(set(index.regions))} regions, "
+          f"{counts.min()}-{counts.max()} listings each) for {len(property_ids)} listings to {index_file}.")
+
+
+if __name__ == "__main__":
+    main()
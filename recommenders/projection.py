@@ -0,0 +1,78 @@
+# Linear dimensionality reduction for stored property embeddings.
+# A projection is fitted on the catalog vectors (truncated SVD of the unit-normalized
+# vectors, i.e. PCA without centering) and kept inside the vector store next to the
+# vectors it produced. Without centering the projection is orthogonal, so dot products
+# of projected vectors approximate the original cosine similarities directly and the
+# ranking scores keep their scale.
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+from recommenders.similar_properties import normalize_rows
+
+
+class LinearProjection:
+    def __init__(self, components, explained=None):
+        """
+        components: float32 (output_dim, input_dim) with orthonormal rows.
+        explained: share of the catalog's squared norm kept by the components.
+        """
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.explained = explained
+
+    @property
+    def input_dim(self):
+        return int(self.components.shape[1])
+
+    @property
+    def output_dim(self):
+        return int(self.components.shape[0])
+
+    @classmethod
+    @instrumentation.timed("projection.fit")
+    def fit(cls, vectors, dim):
+        """
+        Fit a projection to dim dimensions on (n, d) vectors.
+        Raises ValueError if dim is not between 1 and d.
+        """
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        input_dim = vectors.shape[1]
+        if not 1 <= dim <= input_dim:
+            raise ValueError(f"Projection dimension must be between 1 and {input_dim}, got {dim}")
+        # eigen-decomposition of the d x d second-moment matrix; cheaper than an SVD of n x d
+        second_moment = vectors.T.astype(np.float64) @ vectors
+        eigenvalues, eigenvectors = np.linalg.eigh(second_moment)
+        order = np.argsort(eigenvalues)[::-1][:dim]
+        total = float(eigenvalues.sum())
+        explained = float(eigenvalues[order].sum() / total) if total > 0 else 1.0
+        return cls(eigenvectors[:, order].T, explained)
+
+    def transform(self, vectors):
+        """
+        Project (n, input_dim) vectors; rows are unit-normalized first, like cosine does.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.input_dim:
+            raise ValueError(
+                f"Expected vectors with {self.input_dim} dimensions, got shape {vectors.shape}"
+            )
+        return normalize_rows(vectors) @ self.components.T
+
+    def inverse_transform(self, vectors):
+        """
+        Map (n, output_dim) projected vectors back to the input space (the least-squares
+        reconstruction; exact for vectors inside the projected subspace).
+        """
+        return np.asarray(vectors, dtype=np.float32) @ self.components
+
+    def to_bytes(self):
+        return self.components.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, output_dim, input_dim, explained=None):
+        components = np.frombuffer(data, dtype=np.float32).reshape(output_dim, input_dim)
+        return cls(components.copy(), explained)
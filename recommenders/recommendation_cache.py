@@ -0,0 +1,239 @@
+# Per-user recommendation result cache.
+# Entries are keyed by user_id and only served while both the user's profile fingerprint
+# (preferred_environment + budget + saved listings + optional ranking options) and the catalog version still match, so a profile edit
+# or a catalog change makes the old entry invisible without any coordination.
+# Users who saved listings also get co-save scores, which depend on everyone's saves, so
+# their entries additionally carry the co-save version (see entry_version).
+# A background batch job fills the cache for all users with one encode call.
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+from models.users import User
+
+
+def normalize_environment(preferred_environment):
+    if not preferred_environment:
+        return []
+    if isinstance(preferred_environment, str):
+        return [preferred_environment]
+    return list(preferred_environment)
+
+
+def profile_fingerprint(user):
+    """
+    Hash of the profile fields that change recommendation output.
+    user: dict as stored in users.json (may carry ranking options, see ranking_options)
+    """
+    key = {
+        "preferred_environment": normalize_environment(user.get("preferred_environment")),
+        "budget": float(user.get("budget") or 0),
+    }
+    if user.get("saved_property"):
+        # saves feed the co-save part of the ranking
+        key["saved_property"] = sorted(user["saved_property"])
+    options = ranking_options(user)
+    if options:
+        key.update(options)
+        if "rerank_weights" in options:
+            # capacity fit depends on the group size
+            key["group_size"] = user.get("group_size")
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def entry_version(user, catalog_version, co_save_version=None):
+    """
+    Version a user's cache entry is valid for: the catalog version, plus the co-save
+    version for users with saved listings (only their ranking blends in co-save scores).
+    """
+    if co_save_version is None or not user.get("saved_property"):
+        return str(catalog_version)
+    return f"{catalog_version}|co-saves {co_save_version}"
+
+
+def ranking_options(user):
+    """
+    Optional per-user ranking settings stored in users.json, as keyword arguments for
+    SbertRecommender.recommend_logic / recommend_from_vector:
+    field_weights (field_embeddings.py), rerank_weights and origin (reranking.py),
+    regions (partitioned_index.py).
+    """
+    return {
+        key: user[key]
+        for key in ("field_weights", "rerank_weights", "origin", "regions")
+        if user.get(key) is not None
+    }
+
+
+def user_from_record(user):
+    """
+    Build a User model from a users.json record (which may lack some fields).
+    """
+    return User.from_dict(
+        {
+            **user,
+            "preferred_environment": normalize_environment(user.get("preferred_environment")),
+        }
+    )
+
+
+class RecommendationCache:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS recommendation_cache (
+                user_id         TEXT PRIMARY KEY,
+                fingerprint     TEXT,
+                catalog_version TEXT,
+                top_n           INTEGER,
+                results         TEXT,
+                created_at      REAL
+            )
+        """
+        )
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=30)
+
+    def get(self, user, top_n, catalog_version, co_save_version=None):
+        """
+        Return cached results for the user, or None if missing or stale.
+        co_save_version: version of the co-save matrix (e.g. the users.json mtime).
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT fingerprint, catalog_version, top_n, results FROM recommendation_cache WHERE user_id = ?",
+            (user["user_id"],),
+        ).fetchone()
+        conn.close()
+        if (
+            row is None
+            or row[0] != profile_fingerprint(user)
+            or row[1] != entry_version(user, catalog_version, co_save_version)
+            or row[2] < top_n
+        ):
+            instrumentation.count("recommendation_cache.miss")
+            return None
+        instrumentation.count("recommendation_cache.hit")
+        return json.loads(row[3])[:top_n]
+
+    def put_many(self, entries, catalog_version, co_save_version=None):
+        """
+        entries: iterable of (user dict, top_n, results)
+        """
+        rows = [
+            (
+                user["user_id"],
+                profile_fingerprint(user),
+                entry_version(user, catalog_version, co_save_version),
+                top_n,
+                json.dumps(results),
+                time.time(),
+            )
+            for user, top_n, results in entries
+        ]
+        with instrumentation.timer("sqlite.write"):
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO recommendation_cache VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+            conn.close()
+
+    def put(self, user, top_n, results, catalog_version, co_save_version=None):
+        self.put_many([(user, top_n, results)], catalog_version, co_save_version)
+
+    def invalidate(self, user_ids):
+        conn = self._connect()
+        conn.executemany(
+            "DELETE FROM recommendation_cache WHERE user_id = ?",
+            [(uid,) for uid in user_ids],
+        )
+        conn.commit()
+        conn.close()
+
+    def invalidate_changed(self, users):
+        """
+        Drop entries of users whose profile fingerprint changed or who no longer exist.
+        Called whenever users.json is rewritten.
+        """
+        current = {u["user_id"]: profile_fingerprint(u) for u in users}
+        conn = self._connect()
+        rows = conn.execute("SELECT user_id, fingerprint FROM recommendation_cache").fetchall()
+        stale = [(uid,) for uid, fp in rows if current.get(uid) != fp]
+        if stale:
+            conn.executemany("DELETE FROM recommendation_cache WHERE user_id = ?", stale)
+            conn.commit()
+        conn.close()
+        return len(stale)
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM recommendation_cache")
+        conn.commit()
+        conn.close()
+
+
+@instrumentation.timed("recommendation_cache.fill")
+def fill_cache(cache, recommender, users, catalog_version, top_n=10, co_save_version=None):
+    """
+    Recompute and store recommendations for every user whose entry is missing or stale.
+    All stale users are encoded in a single batch (see SbertRecommender.user_vectors).
+    """
+    stale = [u for u in users if cache.get(u, top_n, catalog_version, co_save_version) is None]
+    if not stale:
+        return 0
+    if recommender.version != catalog_version:
+        # a reload is due or in flight: rank against the catalog the entries are cached under
+        recommender.reload_if_stale(wait=True)
+        if recommender.version != catalog_version:
+            print("[LOG] Catalog changed again; skipping the recommendation cache fill.")
+            return 0
+    models = [user_from_record(u) for u in stale]
+    vectors = recommender.user_vectors(models)
+    entries = [
+        (u, top_n, recommender.recommend_from_vector(m, v, top_n=top_n, **ranking_options(u)))
+        for u, m, v in zip(stale, models, vectors)
+    ]
+    cache.put_many(entries, catalog_version, co_save_version)
+    print(f"[LOG] Recommendation cache filled for {len(entries)} user(s).")
+    return len(entries)
+
+
+def start_background_fill(cache, recommender_factory, users, catalog_version, top_n=10, co_save_version=None):
+    """
+    Run fill_cache in a daemon thread. recommender_factory is called inside the
+    thread so the model load does not block the caller either. catalog_version and
+    co_save_version may be callables; they are then read after the recommender is built
+    (which may first have to bootstrap the vector store and so change the version).
+    """
+
+    def run():
+        try:
+            recommender = recommender_factory()
+            fill_cache(
+                cache,
+                recommender,
+                users,
+                catalog_version() if callable(catalog_version) else catalog_version,
+                top_n=top_n,
+                co_save_version=co_save_version() if callable(co_save_version) else co_save_version,
+            )
+        except Exception as e:
+            print(f"[LOG] Background recommendation cache fill failed: {e}")
+
+    thread = threading.Thread(target=run, name="recommendation-cache-fill", daemon=True)
+    thread.start()
+    return thread
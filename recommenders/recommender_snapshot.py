@@ -0,0 +1,141 @@
+# Recommender snapshots for fast warm starts.
+# Everything SbertRecommender derives from the catalog (ids, composed texts, column arrays,
+# the BM25 index and the property vectors) is written once to an aligned-block file (see
+# block_file.py). Later processes memory-map it instead of composing, indexing and encoding
+# again; the snapshot is only used while its dataset, model and catalog version fingerprints
+# all match, and is otherwise rebuilt and rewritten.
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+from recommenders.block_file import (
+    decode_strings,
+    encode_strings,
+    map_block,
+    read_manifest,
+    write_block_file,
+)
+
+SNAPSHOT_MAGIC = b"GR8SNP\x00\x01"
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_EXTENSION = ".gr8snap"
+MODEL_PROBE_TEXT = "location: Banff, Canada ; type: Mountain Cabin ; tags: hiking"
+# Float columns kept as (name, dtype)
+COLUMN_ARRAYS = (
+    ("property_prices", np.float64),
+    ("property_capacities", np.float64),
+    ("property_lat", np.float64),
+    ("property_lng", np.float64),
+)
+
+
+def snapshot_file_for(store_path):
+    """
+    The snapshot of a recommender built over a vector store lives next to the store.
+    """
+    return os.path.splitext(store_path)[0] + "_recommender" + SNAPSHOT_EXTENSION
+
+
+def dataset_fingerprint(properties):
+    """
+    Hash of the listings exactly as the recommender receives them.
+    """
+    encoded = json.dumps(properties, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def model_fingerprint(model):
+    """
+    Hash of the model's (rounded) embedding of a fixed probe text, so a different or
+    retrained model invalidates snapshots even when it has the same dimension.
+    """
+    probe = np.asarray(model.encode([MODEL_PROBE_TEXT], convert_to_numpy=True), dtype=np.float32)
+    rounded = np.round(probe, 4).astype(np.float32)
+    return f"{probe.shape[1]}:" + hashlib.sha256(rounded.tobytes()).hexdigest()[:32]
+
+
+@instrumentation.timed("recommender_snapshot.write")
+def write_snapshot(path, state, key):
+    """
+    Write a CatalogState (see SbertRecommender.build_state).
+    key: {"dataset", "model", "catalog_version"} fingerprints it was built from.
+    """
+    index = state.keyword_index
+    terms = sorted(index.vocabulary, key=index.vocabulary.get)
+    vectors = np.asarray(state.property_vectors, dtype=np.float32)
+    id_offsets, id_data = encode_strings(p["property_id"] for p in state.properties)
+    text_offsets, text_data = encode_strings(state.property_texts)
+    term_offsets, term_data = encode_strings(terms)
+    arrays = [
+        ("property_vectors", vectors.reshape(-1)),
+        ("property_id.offsets", id_offsets),
+        ("property_id.data", id_data),
+        ("property_texts.offsets", text_offsets),
+        ("property_texts.data", text_data),
+        ("keyword.terms.offsets", term_offsets),
+        ("keyword.terms.data", term_data),
+        ("keyword.offsets", index.offsets),
+        ("keyword.doc_ids", index.doc_ids),
+        ("keyword.weights", index.weights),
+    ]
+    arrays += [(name, np.asarray(getattr(state, name), dtype=dtype)) for name, dtype in COLUMN_ARRAYS]
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        **key,
+        "count": len(state.properties),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "keyword_docs": index.num_docs,
+        "created_at": time.time(),
+    }
+    write_block_file(path, SNAPSHOT_MAGIC, manifest, arrays)
+
+
+@instrumentation.timed("recommender_snapshot.load")
+def load_snapshot(path, key):
+    """
+    Memory-map a snapshot. Returns a dict of the saved state, or None (with a log line)
+    when the file is missing, unreadable or was built for other data, model or catalog.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        manifest, data_start = read_manifest(path, SNAPSHOT_MAGIC)
+    except (OSError, ValueError) as e:
+        print(f"[LOG] Ignoring unreadable recommender snapshot {path}: {e}")
+        return None
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        print(f"[LOG] Ignoring recommender snapshot {path}: format {manifest.get('format')}.")
+        return None
+    stale = [name for name, value in key.items() if manifest.get(name) != value]
+    if stale:
+        print(f"[LOG] Recommender snapshot is stale ({', '.join(stale)} changed); rebuilding.")
+        return None
+
+    def block(name):
+        return map_block(path, manifest, data_start, name)
+
+    def strings(name):
+        return decode_strings(block(f"{name}.offsets"), block(f"{name}.data"))
+
+    count, dim = manifest["count"], manifest["dim"]
+    state = {name: block(name) for name, _ in COLUMN_ARRAYS}
+    state.update(
+        {
+            "property_ids": strings("property_id"),
+            "property_texts": strings("property_texts"),
+            "property_vectors": block("property_vectors").reshape(count, dim),
+            "keyword_terms": strings("keyword.terms"),
+            "keyword_offsets": block("keyword.offsets"),
+            "keyword_doc_ids": block("keyword.doc_ids"),
+            "keyword_weights": block("keyword.weights"),
+            "keyword_docs": manifest["keyword_docs"],
+        }
+    )
+    return state
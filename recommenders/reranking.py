@@ -0,0 +1,153 @@
+# Multi-objective re-ranking of recommendation candidates.
+# The first stage (SBERT similarity, optionally blended with BM25) picks the best
+# candidates under the budget; this stage re-scores them as a weighted sum of
+#   similarity - the first-stage score, min-max scaled over the candidates
+#   price      - headroom left in the budget, (budget - price) / budget
+#   distance   - closeness to an origin point (haversine), min-max scaled
+#   capacity   - how well the listing fits the group, min(1, capacity / group_size)
+# Every objective lies in [0, 1] and is computed for all candidates at once with NumPy.
+
+import numpy as np
+
+OBJECTIVES = ("similarity", "price", "distance", "capacity")
+EARTH_RADIUS_KM = 6371.0088
+# Candidates re-ranked per returned result (at least MIN_RERANK_DEPTH)
+RERANK_DEPTH_FACTOR = 10
+MIN_RERANK_DEPTH = 50
+
+# Typical guest capacity per listing type, used when a listing has no "capacity" field
+TYPE_CAPACITY = {
+    "Mountain Cabin": 6,
+    "Beach Villa": 10,
+    "Urban Apartment": 4,
+    "Countryside Cottage": 6,
+    "Ski Lodge": 12,
+    "Eco Bungalow": 4,
+    "Luxury Hotel": 4,
+    "Hostel": 2,
+    "Glamping Tent": 3,
+    "Houseboat": 6,
+    "Treehouse": 4,
+    "Bed and Breakfast": 2,
+}
+DEFAULT_CAPACITY = 4
+# Most generated listings carry placeholder coordinates around (0, 0); treated as unknown
+PLACEHOLDER_COORDINATE_DEGREES = 0.1
+
+
+def property_capacity(prop):
+    """
+    Guests a listing sleeps: its own "capacity" if present, else the typical value for its type.
+    """
+    if prop.get("capacity"):
+        return int(prop["capacity"])
+    return TYPE_CAPACITY.get(prop.get("type"), DEFAULT_CAPACITY)
+
+
+def property_coordinates(prop):
+    """
+    (lat, lng) of a listing, or (nan, nan) when missing or a placeholder near (0, 0).
+    """
+    coordinates = prop.get("coordinates") or {}
+    try:
+        lat, lng = float(coordinates["lat"]), float(coordinates["lng"])
+    except (KeyError, TypeError, ValueError):
+        return np.nan, np.nan
+    if abs(lat) < PLACEHOLDER_COORDINATE_DEGREES and abs(lng) < PLACEHOLDER_COORDINATE_DEGREES:
+        return np.nan, np.nan
+    return lat, lng
+
+
+def normalize_rerank_weights(weights):
+    """
+    Validate {objective: weight} and scale the weights to sum to 1.
+    Raises ValueError for unknown objectives or non-positive totals.
+    """
+    if not isinstance(weights, dict):
+        raise ValueError("rerank weights must be an object of {objective: weight}")
+    unknown = set(weights) - set(OBJECTIVES)
+    if unknown:
+        raise ValueError(f"unknown objective(s) {sorted(unknown)}; expected {list(OBJECTIVES)}")
+    try:
+        values = {k: float(w) for k, w in weights.items()}
+    except (TypeError, ValueError):
+        raise ValueError("rerank weights must be numbers")
+    if any(w < 0 for w in values.values()) or sum(values.values()) <= 0:
+        raise ValueError("rerank weights must be non-negative with a positive sum")
+    total = sum(values.values())
+    return {k: w / total for k, w in values.items() if w > 0}
+
+
+def parse_origin(origin):
+    """
+    (lat, lng) floats from {"lat": .., "lng": ..} or a [lat, lng] pair; None stays None.
+    Raises ValueError for anything else.
+    """
+    if origin is None:
+        return None
+    try:
+        if isinstance(origin, dict):
+            lat, lng = float(origin["lat"]), float(origin["lng"])
+        else:
+            lat, lng = (float(v) for v in origin)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("origin must be {\"lat\": .., \"lng\": ..} or [lat, lng]")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("origin is out of range")
+    return lat, lng
+
+
+def haversine_km(lat, lng, origin):
+    """
+    Great-circle distance in km from origin (lat, lng) to arrays of coordinates in degrees.
+    """
+    lat1, lng1 = np.radians(origin[0]), np.radians(origin[1])
+    lat2, lng2 = np.radians(lat), np.radians(lng)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _min_max(values):
+    low, high = float(values.min()), float(values.max())
+    if high - low <= 1e-12:
+        return np.ones_like(values)
+    return (values - low) / (high - low)
+
+
+def rerank_depth(top_n):
+    return max(top_n * RERANK_DEPTH_FACTOR, MIN_RERANK_DEPTH)
+
+
+def objective_scores(similarity, prices, budget, capacities, group_size, lat, lng, origin):
+    """
+    {objective: float array in [0, 1]} for the candidates (all arrays aligned).
+    "distance" is left out without an origin; listings without coordinates (NaN) score 0.
+    """
+    scores = {
+        "similarity": _min_max(np.asarray(similarity, dtype=np.float64)),
+        "price": np.clip((budget - prices) / budget, 0.0, 1.0) if budget > 0 else np.zeros(len(prices)),
+        "capacity": np.minimum(1.0, capacities / max(int(group_size or 1), 1)),
+    }
+    if origin is not None:
+        distances = haversine_km(lat, lng, origin)
+        known = ~np.isnan(distances)
+        closeness = np.zeros(len(distances))
+        if known.any():
+            closeness[known] = _min_max(-distances[known])
+        scores["distance"] = closeness
+    return scores
+
+
+def combined_score(scores, weights):
+    """
+    Weighted sum of the objectives; objectives that could not be computed (distance
+    without an origin) are dropped and the remaining weights rescaled.
+    """
+    usable = {k: w for k, w in weights.items() if k in scores}
+    total = sum(usable.values())
+    if total <= 0:
+        return scores["similarity"]
+    return sum((w / total) * scores[k] for k, w in usable.items())
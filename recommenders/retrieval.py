@@ -0,0 +1,167 @@
+# Local retrieval for the AI travel agent chat.
+# Each chat turn is embedded with the recommender's model and matched against the
+# property vectors, so the listings relevant to the question are found locally.
+# Factual questions about a specific listing (price, features, availability, coordinates)
+# are answered straight from the catalog; everything else goes to the LLM with only the
+# retrieved top-k listings as context.
+
+import os
+import re
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+from recommenders.similar_properties import normalize_rows
+
+PROPERTY_ID_PATTERN = re.compile(r"\bP\d{5}\b", re.IGNORECASE)
+DATE_PATTERN = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+
+# question kind -> words that signal it. Kept to phrasings about one listing's own facts:
+# generic words ("how much", "cheap", "offer") also appear in questions about anything else.
+FACT_PATTERNS = {
+    "price": re.compile(
+        r"\b(price|cost|costs|per night|nightly rate"
+        r"|how much (is|does|for) (it|this|that|the (place|property|listing)|P\d{5}))\b",
+        re.IGNORECASE,
+    ),
+    "features": re.compile(r"\b(features?|amenit(y|ies)|facilit(y|ies)|equipped)\b", re.IGNORECASE),
+    "availability": re.compile(r"\b(availab(le|ility)|booked|vacan(t|cy))\b", re.IGNORECASE),
+    "coordinates": re.compile(r"\b(coordinates?|latitude|longitude|gps|exact location)\b", re.IGNORECASE),
+}
+
+# words that point back at the listing the conversation is about
+FOCUS_REFERENCE_PATTERN = re.compile(
+    r"\b(it|its|it's|this|that|the (place|property|listing|house|home|apartment|stay))\b",
+    re.IGNORECASE,
+)
+
+
+def detect_fact_kinds(text):
+    """
+    Return the factual question kinds asked in text, in FACT_PATTERNS order.
+    """
+    return [kind for kind, pattern in FACT_PATTERNS.items() if pattern.search(text)]
+
+
+def mentioned_property_ids(text):
+    return [m.upper() for m in PROPERTY_ID_PATTERN.findall(text)]
+
+
+def format_fact(prop, kind, text=""):
+    """
+    One-line catalog answer for a property and question kind.
+    """
+    pid = prop["property_id"]
+    if kind == "price":
+        return f"{pid} costs ${prop['price_per_night']} per night."
+    if kind == "features":
+        return f"{pid} features: {', '.join(prop.get('features') or []) or 'none listed'}."
+    if kind == "availability":
+        booked = set(prop.get("booked_dates") or [])
+        asked = DATE_PATTERN.findall(text)
+        if asked:
+            parts = [f"{d} is {'booked' if d in booked else 'available'}" for d in asked]
+            return f"{pid}: " + "; ".join(parts) + "."
+        if not booked:
+            return f"{pid} has no booked dates."
+        return f"{pid} is booked on {', '.join(sorted(booked))} and available on all other dates."
+    if kind == "coordinates":
+        coords = prop.get("coordinates") or {}
+        return f"{pid} is at latitude {coords.get('lat')}, longitude {coords.get('lng')} ({prop['location']})."
+    raise ValueError(f"Unknown fact kind: {kind}")
+
+
+class PropertyRetriever:
+    def __init__(self, recommender):
+        """
+        recommender: a SbertRecommender; its model, catalog and property vectors are reused,
+        following the recommender's current catalog state across reloads.
+        """
+        self.recommender = recommender
+        # (catalog state, its unit-normalized property vectors)
+        self._unit_vectors = (None, None)
+
+    @property
+    def properties(self):
+        return self.recommender.state.properties
+
+    @property
+    def property_index(self):
+        return self.recommender.state.property_index
+
+    def unit_vectors(self):
+        """
+        (state, unit vectors) for the recommender's current state, normalized once per state.
+        """
+        state = self.recommender.state
+        cached_state, vectors = self._unit_vectors
+        if cached_state is not state:
+            vectors = normalize_rows(np.asarray(state.property_vectors, dtype=np.float32))
+            self._unit_vectors = (state, vectors)
+        return state, vectors
+
+    def mentioned_properties(self, text):
+        """
+        Catalog property dicts named by id in text, in order of mention.
+        """
+        return [
+            self.properties[self.property_index[pid]]
+            for pid in dict.fromkeys(mentioned_property_ids(text))
+            if pid in self.property_index
+        ]
+
+    @instrumentation.timed("retrieval.retrieve")
+    def retrieve(self, text, top_k=5):
+        """
+        Return up to top_k catalog property dicts relevant to text.
+        Listings mentioned by id come first, then the nearest listings by embedding.
+        """
+        results = self.mentioned_properties(text)[:top_k]
+        state, unit_vectors = self.unit_vectors()
+        if len(results) >= top_k or len(state.properties) == 0:
+            return results
+
+        query = normalize_rows(
+            self.recommender.project(self.recommender.embed_to_vector([text]), state)
+        )[0]
+        with instrumentation.timer("recommender.similarity"):
+            similarities = unit_vectors @ query
+        with instrumentation.timer("recommender.top_k"):
+            k = min(top_k + len(results), len(similarities))
+            candidates = np.argpartition(-similarities, k - 1)[:k]
+            candidates = candidates[np.argsort(-similarities[candidates])]
+        seen = {p["property_id"] for p in results}
+        for i in candidates:
+            if len(results) >= top_k:
+                break
+            prop = state.properties[i]
+            if prop["property_id"] not in seen:
+                results.append(prop)
+        return results
+
+    def answer_factual(self, text, focus=None):
+        """
+        Answer price/features/availability/coordinates questions from the catalog.
+        The listing must be named by id in the question, or the question must refer back
+        ("this place", "it") to the focus (the listing the conversation is currently about).
+        Returns (answer, properties) or (None, []) when the LLM is needed.
+        """
+        kinds = detect_fact_kinds(text)
+        if not kinds:
+            return None, []
+        props = self.mentioned_properties(text)
+        state = self.recommender.state
+        if (
+            not props
+            and focus is not None
+            and FOCUS_REFERENCE_PATTERN.search(text)
+            and focus.get("property_id") in state.property_index
+        ):
+            props = [state.properties[state.property_index[focus["property_id"]]]]
+        if not props:
+            return None, []
+        instrumentation.count("retrieval.local_answer")
+        lines = [format_fact(prop, kind, text) for prop in props for kind in kinds]
+        return "\n".join(lines), props
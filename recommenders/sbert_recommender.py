@@ -4,10 +4,39 @@ from sentence_transformers import SentenceTransformer, util
 import numpy as np
 
 import json
-import sqlite3
 import os
+import sys
+import threading
 
 BASE_DIR = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, "..")))
+import instrumentation
+from recommenders.encode_batcher import EncodeBatcher
+from recommenders.field_embeddings import (
+    FieldEmbeddings,
+    field_vectors_file_for,
+    normalize_weights,
+)
+from recommenders.inverted_index import InvertedIndex, tokenize
+from recommenders.partitioned_index import PartitionedIndex, parse_regions, region_of
+from recommenders import similar_properties
+from recommenders.recommender_snapshot import (
+    COLUMN_ARRAYS as SNAPSHOT_COLUMN_ARRAYS,
+    dataset_fingerprint,
+    load_snapshot,
+    model_fingerprint,
+    write_snapshot,
+)
+from recommenders.reranking import (
+    combined_score,
+    normalize_rerank_weights,
+    objective_scores,
+    parse_origin,
+    property_capacity,
+    property_coordinates,
+    rerank_depth,
+)
+from recommenders.vector_store import VectorStore, open_vector_store
 # Path to the property listings JSON file (robust to script location)
 PROPERTIES_FILE = os.path.abspath(
     os.path.join(BASE_DIR, "..", "datasets", "property_listings.json")
@@ -18,22 +47,23 @@ SQLITE_DB_FILE = os.path.abspath(os.path.join(BASE_DIR, "property_vector_db.sqli
 
 MODEL_DIR = os.path.join(os.path.join(BASE_DIR, "sbert_models"), "saved_model")
 
+# Share of the ranking score taken by BM25 keyword matches (0 = pure SBERT)
+DEFAULT_KEYWORD_WEIGHT = 0.2
+# Above this many in-budget listings, only the best BM25 matches are scored densely
+DEFAULT_MAX_DENSE_CANDIDATES = 20000
+# Share of the ranking score taken by the co-save signal, for users who saved listings
+DEFAULT_CO_SAVE_WEIGHT = 0.15
+
 
 ################ PUBLIC FUNCTIONS ################
 
 
-# Check if the embeddings table already exists; if so, exit early
+# Check if the embeddings store already holds vectors; if so, exit early
 def embeddings_table_exists(db_file):
-    conn = sqlite3.connect(db_file)
-    c = conn.cursor()
-    c.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='property_embeddings'"
-    )
-    exists = c.fetchone()
-    conn.close()
-    return bool(exists)
+    return open_vector_store(db_file).exists()
 
 
+@instrumentation.timed("recommender.load_model")
 def load_model(MODEL_NAME="all-MiniLM-L6-v2"):
     """
     Load the SBERT model from local cache or download it from Hugging Face Hub.
@@ -54,8 +84,8 @@ def load_model(MODEL_NAME="all-MiniLM-L6-v2"):
 
 def init_embeddings_to_sqlite(model=None, db_file=SQLITE_DB_FILE):
     """
-    Initialize the SQLite database with property embeddings.
-    If the embeddings table already exists, exit early.
+    Initialize the vector store (the SQLite database by default) with property embeddings.
+    If the store already holds embeddings, exit early.
     """
     if embeddings_table_exists(db_file):
         print(f"[LOG] Embeddings table already exists in {db_file}.")
@@ -77,31 +107,11 @@ def init_embeddings_to_sqlite(model=None, db_file=SQLITE_DB_FILE):
     add_properties(properties, model, db_file)
 
 
-def ensure_table(conn):
-    """
-    Ensure the property_embeddings table exists in the SQLite database.
-    Otherwise, create it.
-    """
-    c = conn.cursor()
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS property_embeddings (
-            property_id TEXT PRIMARY KEY,
-            embedding   BLOB,
-            location    TEXT,
-            type        TEXT,
-            features    TEXT,
-            tags        TEXT
-        )
-    """
-    )
-    conn.commit()
-
-
 def add_properties(new_props, model, db_file=SQLITE_DB_FILE):
     """
-    Generic function to add new properties (or single property) to the SQLite database.
+    Generic function to add new properties (or single property) to the vector store.
     new_prop: dict, e.g. {"property_id": "P100", "location": "Toronto", "type": "Apartment", ...}
+    db_file: path of the store (see vector_store.open_vector_store) or a VectorStore
     return: number of records added
     """
     # 1. Generalize new_props to a list of dicts
@@ -114,42 +124,56 @@ def add_properties(new_props, model, db_file=SQLITE_DB_FILE):
         print("[LOG] No properties to add.")
         return 0
 
+    store = db_file if isinstance(db_file, VectorStore) else open_vector_store(db_file)
+
     # 2. Batch create embeddings
     texts = [compose_property_text(p) for p in new_props]
 
-    # use convert_to_numpy=True to get numpy array directly, convert to float32 for SQLite BLOB storage
+    # use convert_to_numpy=True to get numpy array directly, convert to float32 for storage
     # otherwise it will be torch.Tensor (which is not serializable)
     embs = model.encode(texts, convert_to_numpy=True).astype(np.float32)
 
-    # 3. Create rows_data
-    rows_data = [
-        (
-            p["property_id"],
-            emb.tobytes(),
-            p.get("location", ""),
-            p.get("type", ""),
-            ",".join(p.get("features", []) or []),
-            ",".join(p.get("tags", []) or []),
+    # A store fitted with a projection holds reduced vectors only
+    projection = store.load_projection()
+    if projection is not None:
+        embs = projection.transform(embs)
+
+    # 3. Batch upsert (bumps the store version, so catalog-keyed caches become stale)
+    written = store.upsert(new_props, embs)
+
+    # 4. Keep the precomputed similar-properties index in step with the upsert
+    index_file = similar_properties.index_file_for(store.path)
+    if os.path.exists(index_file):
+        property_ids, vectors = store.load_all()
+        similar_properties.update_index_file(
+            index_file, property_ids, vectors, [p["property_id"] for p in new_props]
         )
-        for p, emb in zip(new_props, embs)
-    ]
-
-    # 4. Batch insert into database
-    conn = sqlite3.connect(db_file)
-    ensure_table(conn)
-    conn.executemany(
-        """
-        INSERT OR REPLACE INTO property_embeddings
-        (property_id, embedding, location, type, features, tags)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """,
-        rows_data,
-    )
-    conn.commit()
-    conn.close()
 
-    print(f"[LOG] Upserted {len(rows_data)} record(s) into {db_file}.")
-    return len(rows_data)
+    print(f"[LOG] Upserted {written} record(s) into {store.path}.")
+    return written
+
+
+def delete_properties(property_ids, db_file=SQLITE_DB_FILE):
+    """
+    Remove properties from the vector store (and the similar-properties index).
+    return: number of records removed
+    """
+    store = db_file if isinstance(db_file, VectorStore) else open_vector_store(db_file)
+    removed = store.delete(property_ids)
+    index_file = similar_properties.index_file_for(store.path)
+    if removed and os.path.exists(index_file):
+        remaining_ids, vectors = store.load_all()
+        similar_properties.update_index_file(index_file, remaining_ids, vectors, [])
+    print(f"[LOG] Deleted {removed} record(s) from {store.path}.")
+    return removed
+
+
+def load_embeddings(db_file=SQLITE_DB_FILE):
+    """
+    Read all stored embeddings.
+    return: (list of property_ids, float32 matrix of shape (n, d)) in store order
+    """
+    return open_vector_store(db_file).load_all()
 
 
 def compose_property_text(property):
@@ -177,6 +201,35 @@ def compose_property_text(property):
     return " ; ".join(string)
 
 
+################ CATALOG STATE ################
+class CatalogState:
+    """
+    Everything derived from one version of the catalog: the listings, their ids, texts,
+    column arrays, keyword index, region / price-band partitions, vectors, projection and
+    (lazily) per-field embeddings.
+    A recommender swaps in a whole new state on reload and never mutates a published one,
+    so a query that picked up a state keeps a consistent view until it finishes.
+    """
+
+    def __init__(self, properties, version=None):
+        self.version = version
+        # Load properties (from dict)
+        self.properties = properties
+        # property_id -> row index in property_vectors
+        self.property_index = {
+            property["property_id"]: i for i, property in enumerate(properties)
+        }
+        self.projection = None
+        # Per-field embeddings, built (or loaded) on first use of field weights
+        self.field_embeddings = None
+        self.field_lock = threading.Lock()
+
+
+def _state_attribute(name):
+    # read-through to the current catalog state, for callers outside the query path
+    return property(lambda self: getattr(self.state, name))
+
+
 ################# SBERT RECOMMENDER CLASS ################
 class SbertRecommender:
     """
@@ -184,80 +237,609 @@ class SbertRecommender:
     Video Reference: https://www.youtube.com/watch?app=desktop&v=nZ5j289WN8g
     """
 
-    def __init__(self, properties):
+    properties = _state_attribute("properties")
+    property_index = _state_attribute("property_index")
+    property_texts = _state_attribute("property_texts")
+    property_prices = _state_attribute("property_prices")
+    property_vectors = _state_attribute("property_vectors")
+    keyword_index = _state_attribute("keyword_index")
+    projection = _state_attribute("projection")
+
+    def __init__(
+        self,
+        properties,
+        model=None,
+        store=None,
+        keyword_weight=DEFAULT_KEYWORD_WEIGHT,
+        max_dense_candidates=DEFAULT_MAX_DENSE_CANDIDATES,
+        field_weights=None,
+        rerank_weights=None,
+        snapshot=None,
+        catalog_loader=None,
+        version_fn=None,
+        co_saves=None,
+        co_save_weight=DEFAULT_CO_SAVE_WEIGHT,
+        taste_vectors=None,
+    ):
         """
         Initialize the SBERT model, and load properties.
+        An already loaded model can be passed in to share it between recommenders.
+        With a vector store, stored vectors are reused and only new or edited listings are encoded.
+        keyword_weight / max_dense_candidates tune the hybrid BM25 + SBERT ranking.
+        field_weights: default {field: weight} for per-field late fusion (None = whole-text vector).
+        rerank_weights: default {objective: weight} for re-ranking the best candidates by
+        similarity / price / distance / capacity (None = first-stage order, see reranking.py).
+        If the store holds a projection, property vectors and queries are scored in its
+        reduced dimension (see projection.py).
+        snapshot: path of a recommender snapshot to start from (and to write when missing
+        or stale), see recommender_snapshot.py.
+        catalog_loader / version_fn: callables returning the current listings and catalog
+        version, used by reload_if_stale (default: same listings, the store's version).
+        co_saves: CoSaveMatrix of users' saved listings (co_save.py); its scores are blended
+        into the ranking with co_save_weight for users who saved something.
+        taste_vectors: TasteVectorStore (taste_vectors.py); recommend_logic then ranks by
+        the user's persisted taste vector instead of encoding their preferences.
         """
 
         # Load a pretrained Sentence Transformer model
-        self.model = load_model(MODEL_NAME="all-MiniLM-L6-v2")
+        self.model = model or load_model(MODEL_NAME="all-MiniLM-L6-v2")
+
+        # Optional micro-batching queue for concurrent single-text encodes
+        self.batcher = None
+
+        # Ranking options
+        self.keyword_weight = keyword_weight
+        self.max_dense_candidates = max_dense_candidates
+        self.rerank_weights = normalize_rerank_weights(rerank_weights) if rerank_weights else None
+        self.field_weights = normalize_weights(field_weights) if field_weights else None
+        self.co_saves = co_saves
+        self.co_save_weight = co_save_weight
+        self.taste_vectors = taste_vectors
+        self._model_key = None
+
+        self.store = store
+        self.snapshot = snapshot
+        self.catalog_loader = catalog_loader
+        self.version_fn = version_fn or (lambda: store.version if store is not None else None)
+
+        # Reload bookkeeping: at most one rebuild at a time, never blocking queries
+        self._reload_guard = threading.Lock()
+        self._reload_thread = None
+        self._watcher_stop = None
+
+        # The published catalog state; replaced as a whole by reload()
+        self.state = self.build_state(properties, self.version_fn())
+
+    @property
+    def version(self):
+        """
+        Catalog version the current state was built from.
+        """
+        return self.state.version
 
-        # Load properties (from dict)
-        self.properties = properties
+    @instrumentation.timed("recommender.build_state")
+    def build_state(self, properties, version):
+        """
+        A new CatalogState for the listings: mapped from a matching snapshot, otherwise
+        built here (and snapshotted for the next process).
+        """
+        state = CatalogState(properties, version)
+        state.projection = self.store.load_projection() if self.store is not None else None
+        key = self.snapshot_key(properties) if self.snapshot is not None else None
+        if key is None or not self.load_snapshot(state, self.snapshot, key):
+            self.build_catalog_state(state)
+            if key is not None:
+                self.save_snapshot(state, self.snapshot, key)
+        # region / price-band partitions prune the candidate scan (one lexsort, not snapshotted)
+        state.partitions = PartitionedIndex.build(
+            [region_of(property) for property in properties], state.property_prices
+        )
+        return state
+
+    def build_catalog_state(self, state):
+        """
+        Derive everything the ranking needs from state.properties.
+        """
+        properties = state.properties
 
         # Compose the property texts to encode
-        self.property_texts = [
+        state.property_texts = [
             compose_property_text(property) for property in properties
         ]
 
-        # Calculate embeddings for properties
-        self.property_vectors = self.embed_to_vector(self.property_texts)
+        # Prices as an array, so the budget filter is one comparison
+        state.property_prices = np.array(
+            [float(property.get("price_per_night")) for property in properties],
+            dtype=np.float64,
+        )
+
+        # Re-ranking inputs: guest capacity and coordinates (NaN when unknown)
+        state.property_capacities = np.array(
+            [property_capacity(property) for property in properties], dtype=np.float64
+        )
+        coordinates = np.array(
+            [property_coordinates(property) for property in properties], dtype=np.float64
+        ).reshape(-1, 2)
+        state.property_lat, state.property_lng = coordinates[:, 0], coordinates[:, 1]
+
+        # BM25 keyword index over location/type/features/tags (first stage + hybrid score)
+        state.keyword_index = InvertedIndex.build(properties)
+
+        # Calculate embeddings for properties (or load them from the vector store)
+        state.property_vectors = self.load_property_vectors(state)
+
+    def snapshot_key(self, properties):
+        """
+        What a snapshot must have been built from to be reused for these listings.
+        """
+        return {
+            "dataset": dataset_fingerprint(properties),
+            "model": self.model_key(),
+            "catalog_version": self.store.version if self.store is not None else None,
+        }
+
+    def model_key(self):
+        """
+        Fingerprint of the model (one probe encode, then cached).
+        """
+        if self._model_key is None:
+            self._model_key = model_fingerprint(self.model)
+        return self._model_key
+
+    def load_snapshot(self, state, path, key):
+        """
+        Fill state from a snapshot file (memory-mapped, read-only arrays).
+        Returns False, changing nothing, if the snapshot is missing or does not match.
+        """
+        saved = load_snapshot(path, key)
+        if saved is None:
+            return False
+        if saved["property_ids"] != [p["property_id"] for p in state.properties]:
+            print("[LOG] Recommender snapshot rows do not match the catalog; rebuilding.")
+            return False
+        state.property_texts = saved["property_texts"]
+        for name, _ in SNAPSHOT_COLUMN_ARRAYS:
+            setattr(state, name, saved[name])
+        state.keyword_index = InvertedIndex(
+            {term: i for i, term in enumerate(saved["keyword_terms"])},
+            saved["keyword_offsets"],
+            saved["keyword_doc_ids"],
+            saved["keyword_weights"],
+            saved["keyword_docs"],
+        )
+        state.property_vectors = saved["property_vectors"]
+        if state.projection is not None and state.property_vectors.shape[1] != state.projection.output_dim:
+            # built while the projection was ignored (fitted for another model)
+            state.projection = None
+        print(f"[LOG] Loaded recommender state from snapshot {path}.")
+        return True
+
+    def save_snapshot(self, state, path, key):
+        """
+        Write the catalog state for later warm starts; failures only cost the next start.
+        """
+        try:
+            write_snapshot(path, state, key)
+        except OSError as e:
+            print(f"[LOG] Could not write recommender snapshot {path}: {e}")
+
+    @instrumentation.timed("recommender.load_property_vectors")
+    def load_property_vectors(self, state):
+        """
+        Vectors for state.properties in order. Stored vectors are used when the stored
+        listing text still matches; everything else is encoded.
+        """
+        if self.store is None or not self.store.exists():
+            return self.project(self.embed_to_vector(state.property_texts), state)
+
+        stored_ids, stored_vectors = self.store.load_all()
+        stored_row = {pid: i for i, pid in enumerate(stored_ids)}
+        stored_text = {
+            r["property_id"]: compose_property_text(r) for r in self.store.load_records()
+        }
+        dim = self.model.get_sentence_embedding_dimension()
+        if state.projection is not None:
+            if state.projection.input_dim != dim:
+                # projection fitted for a different model: score at full dimension
+                print("[LOG] Stored projection does not match the model; ignoring it.")
+                state.projection = None
+            else:
+                dim = state.projection.output_dim
+        if stored_vectors.shape[1] != dim:
+            # store built with a different model
+            return self.project(self.embed_to_vector(state.property_texts), state)
+
+        vectors = np.empty((len(state.properties), dim), dtype=np.float32)
+        stale = []
+        for i, (prop, text) in enumerate(zip(state.properties, state.property_texts)):
+            pid = prop["property_id"]
+            if pid in stored_row and stored_text.get(pid) == text:
+                vectors[i] = stored_vectors[stored_row[pid]]
+            else:
+                stale.append(i)
+        if stale:
+            print(f"[LOG] Encoding {len(stale)} listing(s) missing from or changed since the vector store.")
+            vectors[stale] = self.project(
+                self.embed_to_vector([state.property_texts[i] for i in stale]), state
+            )
+        return vectors
+
+    ################ HOT RELOAD ################
+    def reload_if_stale(self, wait=False):
+        """
+        Rebuild the catalog state in the background if version_fn() moved on.
+        Returns the reload thread, or None when the state is current.
+        """
+        if self.version_fn() == self.state.version:
+            return None
+        return self.reload(wait=wait)
+
+    def reload(self, wait=False):
+        """
+        Build a new catalog state in a background thread, then swap it in with a single
+        assignment. Queries never wait: they keep the state they started with, and until
+        the swap new queries use the old one. A reload already running is reused.
+        """
+        if not self._reload_guard.acquire(blocking=False):
+            thread = self._reload_thread
+        else:
+            thread = threading.Thread(target=self._reload, name="recommender-reload", daemon=True)
+            self._reload_thread = thread
+            thread.start()
+        if wait and thread is not None:
+            thread.join()
+        return thread
+
+    def _reload(self):
+        try:
+            # version first: a change during the rebuild triggers another reload later
+            version = self.version_fn()
+            properties = self.catalog_loader() if self.catalog_loader else self.state.properties
+            state = self.build_state(properties, version)
+            old, self.state = self.state, state
+            instrumentation.count("recommender.reloads")
+            print(f"[LOG] Recommender reloaded: catalog version {old.version} -> {state.version}.")
+        except Exception as e:
+            print(f"[LOG] Recommender reload failed, still serving version {self.state.version}: {e}")
+        finally:
+            self._reload_guard.release()
+
+    def start_auto_reload(self, interval=2.0):
+        """
+        Poll version_fn() every interval seconds from a daemon thread and reload on change.
+        """
+        self.stop_auto_reload()
+        stop = self._watcher_stop = threading.Event()
+
+        def watch():
+            while not stop.wait(interval):
+                try:
+                    self.reload_if_stale()
+                except Exception as e:
+                    print(f"[LOG] Catalog version check failed: {e}")
+
+        threading.Thread(target=watch, name="recommender-watch", daemon=True).start()
+
+    def stop_auto_reload(self):
+        stop, self._watcher_stop = self._watcher_stop, None
+        if stop is not None:
+            stop.set()
+
+    def project(self, vectors, state=None):
+        """
+        Map encoder output into the space of the property vectors (a no-op without a
+        projection). Dot products of projected vectors approximate cosine similarity.
+        """
+        projection = (state or self.state).projection
+        if projection is None:
+            return vectors
+        return projection.transform(vectors)
+
+    def model_space_vectors(self, property_ids, state=None):
+        """
+        Unit vectors of the given listings in the model's output space (mapped back from
+        the projection if there is one); unknown ids are skipped.
+        """
+        state = state or self.state
+        rows = [state.property_index[pid] for pid in property_ids if pid in state.property_index]
+        vectors = np.asarray(state.property_vectors[rows], dtype=np.float32)
+        if state.projection is not None:
+            vectors = state.projection.inverse_transform(vectors)
+        return similar_properties.normalize_rows(vectors) if len(rows) else vectors
+
+    def field_embeddings(self, state=None):
+        """
+        Per-field embeddings for the state's listings. Persisted next to the vector store,
+        so only field texts that were never encoded before are encoded.
+        """
+        state = state or self.state
+        with state.field_lock:
+            if state.field_embeddings is None:
+                path = field_vectors_file_for(self.store.path) if self.store is not None else None
+                previous = FieldEmbeddings.load(path) if path and os.path.exists(path) else None
+                embeddings = FieldEmbeddings.build(
+                    state.properties,
+                    self.embed_to_vector,
+                    previous,
+                    model_key=self.model_key(),
+                    dim=self.model.get_sentence_embedding_dimension(),
+                )
+                if path and (previous is None or embeddings.encoded or
+                             previous.model_key != embeddings.model_key or
+                             previous.property_ids != embeddings.property_ids):
+                    embeddings.save(path)
+                state.field_embeddings = embeddings
+            return state.field_embeddings
 
     def compose_user_text(self, user):
         """
         Compose user preferred environment to a structured text for embedding (vectorization)
         """
         preferred_env = user.preferred_environment or []
+        if isinstance(preferred_env, str):
+            # some stored users have a single string instead of a list
+            preferred_env = [preferred_env]
         return "preferred_environment: " + ", ".join(preferred_env)
 
+    @instrumentation.timed("recommender.embed_to_vector")
     def embed_to_vector(self, texts):
         """
-        Calculate embeddings for texts
+        Calculate embeddings for texts.
+        With batching enabled, small requests go through the shared encoding queue so
+        concurrent callers are encoded together; large lists are already a batch, and
+        empty ones need no model call.
         """
+        batcher = self.batcher
+        if batcher is not None and 0 < len(texts) < batcher.max_batch_size:
+            return batcher.encode(texts)
+        return self._encode(texts)
+
+    def _encode(self, texts):
+        if len(texts) == 0:
+            dim = self.model.get_sentence_embedding_dimension()
+            return np.zeros((0, dim), dtype=np.float32)
+        instrumentation.count("recommender.texts_encoded", len(texts))
         return self.model.encode(texts, convert_to_numpy=True).astype(np.float32)
 
-    def recommend_logic(self, user, top_n=5):
+    def enable_batching(self, max_batch_size=32, max_wait_ms=5.0):
         """
-        Based on the similarity between user_
+        Route concurrent embed_to_vector calls through a micro-batching queue.
+        Returns the EncodeBatcher (its submit() gives a Future per text).
         """
-        user_text = self.compose_user_text(user)
+        self.disable_batching()
+        self.batcher = EncodeBatcher(
+            self._encode, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+        )
+        return self.batcher
 
-        user_budget = float(user.budget)
+    def disable_batching(self):
+        batcher, self.batcher = self.batcher, None
+        if batcher is not None:
+            batcher.close()
 
-        # Filter all properties that is under the budget
-        mask_i = []
-        for i, prop in enumerate(self.properties):
-            if float(prop.get("price_per_night")) <= user_budget:
-                mask_i.append(i)
+    @instrumentation.timed("recommender.recommend_logic")
+    def recommend_logic(
+        self, user, top_n=5, field_weights=None, rerank_weights=None, origin=None, regions=None
+    ):
+        """
+        Based on the similarity between user_
+        field_weights / rerank_weights / origin / regions: optional per-request ranking
+        options (see recommend_from_vector).
+        """
+        user_vector = self.user_vectors([user])[0]
+        return self.recommend_from_vector(
+            user,
+            user_vector,
+            top_n=top_n,
+            field_weights=field_weights,
+            rerank_weights=rerank_weights,
+            origin=origin,
+            regions=regions,
+        )
 
-        user_vector = self.embed_to_vector([user_text])[0]
+    def user_vectors(self, users):
+        """
+        Query vectors for User models: persisted taste vectors when enabled (no model call
+        for returning users), otherwise their encoded preference text, in one batch.
+        """
+        if self.taste_vectors is not None:
+            return self.taste_vectors.vectors(self, users)
+        return self.embed_to_vector([self.compose_user_text(u) for u in users])
 
-        filtered_property_vector = self.property_vectors[mask_i]
+    def compose_user_tokens(self, user):
+        """
+        Keyword query for the inverted index: the user's preferred environment tokens.
+        """
+        preferred_env = user.preferred_environment or []
+        if isinstance(preferred_env, str):
+            preferred_env = [preferred_env]
+        return tokenize(" ".join(preferred_env))
+
+    def recommend_from_vector(
+        self,
+        user,
+        user_vector,
+        top_n=5,
+        field_weights=None,
+        rerank_weights=None,
+        origin=None,
+        regions=None,
+    ):
+        """
+        Rank the properties under the user's budget against an already encoded user vector.
+        Split out of recommend_logic so callers can encode many users in one batch.
+        Ranking blends SBERT cosine similarity with normalized BM25 keyword scores; on very
+        large catalogs BM25 also shortlists which listings are scored densely.
+        field_weights: {field: weight} over location/type/features/tags; the similarity is
+        then the weighted sum of per-field similarities (defaults to self.field_weights).
+        rerank_weights: {objective: weight}; the best candidates are then re-ranked by
+        similarity, price headroom, distance to origin ((lat, lng) or {"lat", "lng"}) and
+        fit for user.group_size (defaults to self.rerank_weights).
+        regions: only rank listings in these regions (location prefixes, see
+        partitioned_index.py); the region / price-band partitions that cannot match the
+        regions and budget are never scanned.
+        """
+        # one catalog state for the whole query, even if a reload swaps in a new one
+        state = self.state
+        user_budget = float(user.budget)
+        weights = normalize_weights(field_weights) if field_weights else self.field_weights
+        objectives = (
+            normalize_rerank_weights(rerank_weights) if rerank_weights else self.rerank_weights
+        )
+        origin = parse_origin(origin)
+        regions = parse_regions(regions)
 
-        similarities = util.cos_sim(user_vector, filtered_property_vector)[0]
+        # Filter all properties that is under the budget (and in the regions), partition-pruned
+        with instrumentation.timer("recommender.budget_filter"):
+            mask_i = state.partitions.candidate_rows(
+                state.property_prices, regions=regions, budget=user_budget
+            )
 
-        num_properties = len(filtered_property_vector)
+        if not len(mask_i):
+            return []
+
+        keyword_scores = None
+        query_tokens = self.compose_user_tokens(user)
+        shortlist_needed = len(mask_i) > self.max_dense_candidates
+        if query_tokens and (self.keyword_weight > 0 or shortlist_needed):
+            with instrumentation.timer("recommender.keyword"):
+                keyword_scores = state.keyword_index.scores(query_tokens)
+                if shortlist_needed:
+                    shortlist = state.keyword_index.top_candidates(
+                        query_tokens, self.max_dense_candidates, allowed=mask_i, scores=keyword_scores
+                    )
+                    # too few keyword hits: fall back to scoring everything in budget
+                    if len(shortlist) >= top_n:
+                        mask_i = np.sort(shortlist)
+            instrumentation.count("recommender.dense_candidates", len(mask_i))
+
+        with instrumentation.timer("recommender.similarity"):
+            if weights:
+                # late fusion of per-field similarities; no re-encoding for new weights
+                similarities = self.field_embeddings(state).fused_scores(user_vector, mask_i, weights)
+            elif state.projection is not None:
+                # reduced vectors: the dot product already approximates the cosine
+                query = self.project(np.asarray(user_vector, dtype=np.float32).reshape(1, -1), state)[0]
+                similarities = state.property_vectors[mask_i] @ query
+            else:
+                similarities = np.asarray(
+                    util.cos_sim(user_vector, state.property_vectors[mask_i])[0], dtype=np.float32
+                )
+            ranking = similarities
+            if keyword_scores is not None and self.keyword_weight > 0:
+                candidate_keywords = keyword_scores[mask_i]
+                best = float(candidate_keywords.max())
+                if best > 0:
+                    ranking = (1.0 - self.keyword_weight) * similarities + (
+                        self.keyword_weight * candidate_keywords / best
+                    )
+            if self.co_saves is not None and self.co_save_weight > 0:
+                ranking = self.blend_co_saves(state, user, mask_i, ranking)
+
+        num_properties = len(mask_i)
         top_n = min(top_n, num_properties)
 
-        order_on_mask_i = np.argsort(-similarities)[:top_n]
+        if objectives:
+            order_on_mask_i, final = self.rerank(
+                state, user, user_budget, mask_i, ranking, top_n, objectives, origin
+            )
+            results = []
+            for i, score in zip(order_on_mask_i, final):
+                row = self.result_row(int(mask_i[i]), float(similarities[i]), state)
+                row["rerank_score"] = float(score)
+                results.append(row)
+            return results
+
+        with instrumentation.timer("recommender.top_k"):
+            order_on_mask_i = np.argsort(-ranking, kind="stable")[:top_n]
         # example output: [2, 3, 1, 0], which shows the rank order based on the filtered vector (mask)
 
         results = []
         for i in order_on_mask_i:
-            idx = mask_i[i]  # true index of property
-            results.append(
-                {
-                    "property_id": self.properties[idx]["property_id"],
-                    "similarity": float(similarities[i]),
-                    "price_per_night": self.properties[idx]["price_per_night"],
-                    "location": self.properties[idx]["location"],
-                    "type": self.properties[idx]["type"],
-                    "features": self.properties[idx]["features"],
-                    "tags": self.properties[idx]["tags"],   
-                }
-            )
+            idx = int(mask_i[i])  # true index of property
+            results.append(self.result_row(idx, float(similarities[i]), state))
         return results
 
+    def blend_co_saves(self, state, user, mask_i, ranking):
+        """
+        Mix the user's co-save scores (scaled to a best of 1) into the first-stage ranking.
+        Only the listings with a co-save score are looked up; users without saves keep
+        the ranking unchanged.
+        """
+        property_ids, scores = self.co_saves.user_scores(user.user_id)
+        if not len(scores):
+            return ranking
+        rows = np.array([state.property_index.get(pid, -1) for pid in property_ids], dtype=np.int64)
+        # positions of those listings among the (sorted) candidates
+        positions = np.searchsorted(mask_i, rows)
+        found = (rows >= 0) & (positions < len(mask_i))
+        found[found] = mask_i[positions[found]] == rows[found]
+        if not found.any():
+            return ranking
+        co_scores = np.zeros(len(mask_i), dtype=np.float64)
+        co_scores[positions[found]] = scores[found] / scores[found].max()
+        return (1.0 - self.co_save_weight) * ranking + self.co_save_weight * co_scores
+
+    @instrumentation.timed("recommender.rerank")
+    def rerank(self, state, user, user_budget, mask_i, ranking, top_n, objectives, origin):
+        """
+        Re-score the best first-stage candidates by the weighted objectives, all at once.
+        return: (positions in mask_i of the top_n, their combined scores)
+        """
+        depth = min(rerank_depth(top_n), len(mask_i))
+        candidates = np.argpartition(-ranking, depth - 1)[:depth]
+        # first-stage order, so equal combined scores keep it
+        candidates = candidates[np.argsort(-ranking[candidates], kind="stable")]
+        rows = mask_i[candidates]
+        scores = objective_scores(
+            ranking[candidates],
+            state.property_prices[rows],
+            user_budget,
+            state.property_capacities[rows],
+            user.group_size,
+            state.property_lat[rows],
+            state.property_lng[rows],
+            origin,
+        )
+        final = combined_score(scores, objectives)
+        order = np.argsort(-final, kind="stable")[:top_n]
+        return candidates[order], final[order]
+
+    def most_similar(self, property_id, top_n=5):
+        """
+        Return the top_n listings closest to the given property (excluding itself).
+        Raises KeyError for unknown property ids.
+        """
+        state = self.state
+        idx = state.property_index[property_id]
+        with instrumentation.timer("recommender.similarity"):
+            similarities = util.cos_sim(
+                state.property_vectors[idx], state.property_vectors
+            )[0]
+            similarities = np.asarray(similarities, dtype=np.float32)
+            similarities[idx] = -np.inf
+
+        top_n = min(top_n, len(state.properties) - 1)
+        with instrumentation.timer("recommender.top_k"):
+            order = np.argsort(-similarities)[:top_n]
+        return [self.result_row(i, float(similarities[i]), state) for i in order]
+
+    def result_row(self, idx, similarity, state=None):
+        """
+        Build the result dict returned for the property at row idx (of state, by default
+        the current one).
+        """
+        prop = (state or self.state).properties[idx]
+        return {
+            "property_id": prop["property_id"],
+            "similarity": similarity,
+            "price_per_night": prop["price_per_night"],
+            "location": prop["location"],
+            "type": prop["type"],
+            "features": prop["features"],
+            "tags": prop["tags"],
+        }
+
 
 ################## Examples ################
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+# Sharded scatter-gather vector search over local worker processes.
+# The partitioned index file (partitioned_index.py) is split into N shards by whole
+# regions, balanced by listing count. Each shard is served by its own worker process that
+# memory-maps only its partitions, so no process holds every property vector. The
+# coordinator keeps just the planner statistics: a query is sent only to the shards that
+# own partitions matching its region / budget constraints, each returns its exact top-k,
+# and the sorted per-shard lists are merged with a heap.
+#
+# Shards that do not answer within the timeout (stalled or dead) are reported as missing;
+# the query then returns the merged results of the others, or raises TimeoutError when
+# partial results are not allowed. Dead workers are restarted on the next query, and late
+# answers from stalled ones are discarded.
+#
+#   with ShardedSearch(index_file_for(store_path), num_shards=4, timeout=2.0) as search:
+#       results, missing = search.search(query_vector, top_k=10, budget=300)
+
+import heapq
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import wait
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+from recommenders.partitioned_index import PartitionedIndex, region_key
+
+DEFAULT_NUM_SHARDS = 4
+DEFAULT_TIMEOUT_SECONDS = 2.0
+WORKER_START_TIMEOUT_SECONDS = 60.0
+
+
+def assign_shards(index, num_shards):
+    """
+    Split the index's partitions into num_shards lists, keeping each region on one shard.
+    Regions are placed largest first on the least loaded shard.
+    """
+    counts = index.counts
+    region_partitions = {}
+    for p, region in enumerate(index.regions):
+        region_partitions.setdefault(region_key(region), []).append(p)
+    load = [(0, shard) for shard in range(num_shards)]
+    shards = [[] for _ in range(num_shards)]
+    by_size = sorted(region_partitions.values(), key=lambda ps: (-int(counts[ps].sum()), ps[0]))
+    for partitions in by_size:
+        total, shard = heapq.heappop(load)
+        shards[shard] += partitions
+        heapq.heappush(load, (total + int(counts[partitions].sum()), shard))
+    return [sorted(partitions) for partitions in shards]
+
+
+def shard_worker(conn, index_path, partitions):
+    """
+    Worker process: serve searches over one shard's partitions until the pipe closes.
+    Messages in: (request_id, query, top_k, regions, budget) or None to stop.
+    Messages out: (request_id, results, error).
+    """
+    try:
+        index = PartitionedIndex.load(index_path, partitions=set(partitions))
+        conn.send(("ready", int(index.counts[list(index.partitions)].sum()), None))
+    except Exception as e:
+        conn.send(("ready", None, repr(e)))
+        return
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        request_id, query, top_k, regions, budget = message
+        try:
+            conn.send((request_id, index.search(query, top_k, regions=regions, budget=budget), None))
+        except Exception as e:
+            conn.send((request_id, None, repr(e)))
+
+
+class ShardedSearch:
+    def __init__(
+        self,
+        index_path,
+        num_shards=DEFAULT_NUM_SHARDS,
+        timeout=DEFAULT_TIMEOUT_SECONDS,
+        allow_partial=True,
+    ):
+        """
+        index_path: a saved partitioned index (python recommenders/partitioned_index.py).
+        timeout: seconds a query waits for the shards; allow_partial: return what arrived
+        instead of raising TimeoutError when some shards miss it.
+        """
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        self.index_path = index_path
+        self.timeout = timeout
+        self.allow_partial = allow_partial
+        # statistics of every partition, no vectors
+        self.planner = PartitionedIndex.load(index_path, partitions=())
+        self.shards = assign_shards(self.planner, min(num_shards, max(len(self.planner), 1)))
+        self.owner = np.zeros(len(self.planner), dtype=np.int64)
+        for shard, partitions in enumerate(self.shards):
+            self.owner[partitions] = shard
+        self.workers = [None] * len(self.shards)  # (process, connection)
+        self._context = multiprocessing.get_context("spawn")
+        self._request_ids = itertools.count(1)
+        # one query at a time: the pipes carry one conversation each
+        self._lock = threading.Lock()
+
+    @property
+    def num_shards(self):
+        return len(self.shards)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """
+        Start every worker and wait until all have mapped their partitions.
+        """
+        for shard in range(self.num_shards):
+            self._spawn(shard)
+        for shard in range(self.num_shards):
+            self._await_ready(shard)
+        print(f"[LOG] Sharded search ready: {self.num_shards} worker(s) over {len(self.planner)} partitions.")
+
+    def _spawn(self, shard):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=shard_worker,
+            args=(child, self.index_path, self.shards[shard]),
+            name=f"shard-{shard}",
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        self.workers[shard] = (process, parent)
+
+    def _await_ready(self, shard):
+        process, conn = self.workers[shard]
+        if not conn.poll(WORKER_START_TIMEOUT_SECONDS):
+            raise TimeoutError(f"shard {shard} did not start within {WORKER_START_TIMEOUT_SECONDS}s")
+        _, rows, error = conn.recv()
+        if error is not None:
+            raise RuntimeError(f"shard {shard} failed to load its partitions: {error}")
+        return rows
+
+    def _ensure_worker(self, shard):
+        process, conn = self.workers[shard]
+        if process.is_alive():
+            return True
+        print(f"[LOG] Shard {shard} worker exited (code {process.exitcode}); restarting.")
+        conn.close()
+        self._spawn(shard)
+        try:
+            self._await_ready(shard)
+            return True
+        except (TimeoutError, RuntimeError, EOFError) as e:
+            print(f"[LOG] Shard {shard} restart failed: {e}")
+            return False
+
+    def close(self):
+        for worker in self.workers:
+            if worker is None:
+                continue
+            process, conn = worker
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            conn.close()
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        self.workers = [None] * self.num_shards
+
+    def target_shards(self, regions=None, budget=None):
+        """
+        Shards owning at least one partition the query can match.
+        """
+        return sorted(set(self.owner[self.planner.plan(regions, budget)].tolist()))
+
+    @instrumentation.timed("sharded_search.search")
+    def search(self, query, top_k=10, regions=None, budget=None, timeout=None, allow_partial=None):
+        """
+        Scatter a query to the matching shards and merge their top-k.
+        query: vector in the index's space. return: (results, missing shards) with results
+        [(score, property_id, price), ...] best first. Raises TimeoutError if shards are
+        missing and partial results are not allowed.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        allow_partial = self.allow_partial if allow_partial is None else allow_partial
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        with self._lock:
+            request_id = next(self._request_ids)
+            pending, missing = {}, []
+            for shard in self.target_shards(regions, budget):
+                try:
+                    if self._ensure_worker(shard):
+                        conn = self.workers[shard][1]
+                        conn.send((request_id, query, top_k, regions, budget))
+                        pending[conn] = shard
+                        continue
+                except (BrokenPipeError, OSError):
+                    pass
+                missing.append(shard)
+
+            # gather until every shard answered or the deadline passed
+            gathered = []
+            deadline = time.monotonic() + timeout
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for conn in wait(list(pending), timeout=remaining):
+                    shard = pending[conn]
+                    try:
+                        reply_id, results, error = conn.recv()
+                    except (EOFError, OSError):
+                        del pending[conn]
+                        missing.append(shard)
+                        continue
+                    if reply_id != request_id:
+                        continue  # late answer to a query that already timed out
+                    del pending[conn]
+                    if error is not None:
+                        print(f"[LOG] Shard {shard} search failed: {error}")
+                        missing.append(shard)
+                    else:
+                        gathered.append(results)
+            missing += list(pending.values())
+
+        if missing:
+            instrumentation.count("sharded_search.missing_shards", len(missing))
+            if not allow_partial:
+                raise TimeoutError(f"shard(s) {sorted(missing)} did not answer within {timeout}s")
+        # each shard's list is sorted best first; merge them lazily and keep the top_k
+        merged = heapq.merge(*gathered, key=lambda item: -item[0])
+        return list(itertools.islice(merged, top_k)), sorted(missing)
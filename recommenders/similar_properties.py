@@ -0,0 +1,227 @@
+# Precomputed "more like this" neighbours for every property.
+# The top-K nearest listings are computed once with blocked matrix multiplication (so only
+# block_size x n similarities live in memory at a time) and saved to a compact .npz file.
+# Lookups are a dict access plus a row slice; listing page views never run a similarity search.
+#
+# Build / rebuild the index from the embeddings DB:
+#   python recommenders/similar_properties.py --k 10 --block-size 1024
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, "..")))
+import instrumentation
+
+DEFAULT_K = 10
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def index_file_for(db_file):
+    """
+    The neighbour index lives next to the embeddings DB it was built from.
+    """
+    return os.path.splitext(db_file)[0] + "_neighbors.npz"
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k_rows(sims, k):
+    """
+    Row-wise top-k of a similarity block, sorted by descending score.
+    """
+    k = min(k, sims.shape[1])
+    if k == 0:
+        return (
+            np.zeros((sims.shape[0], 0), dtype=np.int32),
+            np.zeros((sims.shape[0], 0), dtype=np.float32),
+        )
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(sims, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(part, order, axis=1).astype(np.int32),
+        np.take_along_axis(part_scores, order, axis=1).astype(np.float32),
+    )
+
+
+def blocked_top_k(normed, rows, k, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Top-k neighbours (excluding self) for the given row indices of a row-normalized matrix.
+    Returns (neighbors, scores), each of shape (len(rows), k).
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    k = min(k, max(len(normed) - 1, 0))
+    neighbors = np.empty((len(rows), k), dtype=np.int32)
+    scores = np.empty((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        with instrumentation.timer("similar.block_matmul"):
+            sims = normed[block_rows] @ normed.T
+        sims[np.arange(len(block_rows)), block_rows] = -np.inf
+        neighbors[start:start + len(block_rows)], scores[start:start + len(block_rows)] = _top_k_rows(sims, k)
+    return neighbors, scores
+
+
+class SimilarPropertiesIndex:
+    def __init__(self, property_ids, neighbors, scores):
+        self.property_ids = list(property_ids)
+        self.neighbors = neighbors
+        self.scores = scores
+        self._row = {pid: i for i, pid in enumerate(self.property_ids)}
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    def __len__(self):
+        return len(self.property_ids)
+
+    def __contains__(self, property_id):
+        return property_id in self._row
+
+    @classmethod
+    def build(cls, property_ids, vectors, k=DEFAULT_K, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Compute the top-k neighbours of every property.
+        """
+        normed = normalize_rows(vectors)
+        with instrumentation.timer("similar.build"):
+            neighbors, scores = blocked_top_k(normed, np.arange(len(normed)), k, block_size)
+        return cls(property_ids, neighbors, scores)
+
+    def lookup(self, property_id, top_n=None):
+        """
+        Return [(neighbor_property_id, score), ...] for a property, best first.
+        Raises KeyError for unknown property ids.
+        """
+        row = self._row[property_id]
+        top_n = self.k if top_n is None else min(top_n, self.k)
+        return [
+            (self.property_ids[j], float(s))
+            for j, s in zip(self.neighbors[row, :top_n], self.scores[row, :top_n])
+        ]
+
+    def update(self, property_ids, vectors, changed_ids, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Incrementally refresh the index after listings were upserted.
+        property_ids/vectors: the full catalog after the upsert (aligned).
+        changed_ids: ids whose vectors were inserted or replaced.
+        Rows that pointed at a changed listing are recomputed; every other row only has
+        to consider the changed listings as new candidates.
+        """
+        k = self.k or DEFAULT_K
+        new_row = {pid: i for i, pid in enumerate(property_ids)}
+        normed = normalize_rows(vectors)
+        n = len(property_ids)
+        k = min(k, max(n - 1, 0))
+
+        changed = {pid for pid in changed_ids if pid in new_row}
+        changed_rows = np.array(sorted(new_row[pid] for pid in changed), dtype=np.int64)
+
+        neighbors = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float32)
+        recompute = set(changed_rows.tolist())
+        keep_rows = []
+        for pid, i in new_row.items():
+            if i in recompute:
+                continue
+            old = self._row.get(pid)
+            if old is None or self.k < k:
+                recompute.add(i)
+                continue
+            old_ids = [self.property_ids[j] for j in self.neighbors[old, :k]]
+            if any(nid in changed or nid not in new_row for nid in old_ids):
+                # one of its neighbours moved; its old score is no longer valid
+                recompute.add(i)
+                continue
+            neighbors[i] = [new_row[nid] for nid in old_ids]
+            scores[i] = self.scores[old, :k]
+            keep_rows.append(i)
+
+        if recompute:
+            rows = np.array(sorted(recompute), dtype=np.int64)
+            neighbors[rows], scores[rows] = blocked_top_k(normed, rows, k, block_size)
+
+        if keep_rows and len(changed_rows):
+            # merge the changed listings into the untouched rows' candidate lists
+            keep_rows = np.array(keep_rows, dtype=np.int64)
+            changed_normed = normed[changed_rows]
+            for start in range(0, len(keep_rows), block_size):
+                rows = keep_rows[start:start + block_size]
+                cand_scores = normed[rows] @ changed_normed.T
+                cand_ids = np.broadcast_to(changed_rows.astype(np.int32), cand_scores.shape)
+                all_scores = np.concatenate([scores[rows], cand_scores], axis=1)
+                all_ids = np.concatenate([neighbors[rows], cand_ids], axis=1)
+                top_ids, top_scores = _top_k_rows(all_scores, k)
+                neighbors[rows] = np.take_along_axis(all_ids, top_ids, axis=1)
+                scores[rows] = top_scores
+
+        self.property_ids = list(property_ids)
+        self.neighbors = neighbors
+        self.scores = scores
+        self._row = new_row
+        instrumentation.count("similar.rows_recomputed", len(recompute))
+        return len(recompute)
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            property_ids=np.array(self.property_ids, dtype=str),
+            neighbors=self.neighbors,
+            scores=self.scores,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["property_ids"].tolist(), data["neighbors"], data["scores"])
+
+
+def update_index_file(index_file, property_ids, vectors, changed_ids):
+    """
+    Apply an upsert to a saved neighbour index, if one has been built.
+    Returns the number of recomputed rows, or None when there is no index yet.
+    """
+    if not os.path.exists(index_file):
+        return None
+    index = SimilarPropertiesIndex.load(index_file)
+    recomputed = index.update(property_ids, vectors, changed_ids)
+    index.save(index_file)
+    print(f"[LOG] Similar-properties index updated ({recomputed} row(s) recomputed).")
+    return recomputed
+
+
+################## Build job ################
+def main(argv=None):
+    from recommenders.sbert_recommender import (
+        SQLITE_DB_FILE,
+        init_embeddings_to_sqlite,
+        load_embeddings,
+    )
+
+    parser = argparse.ArgumentParser(description="Precompute similar properties")
+    parser.add_argument("--db-file", default=SQLITE_DB_FILE)
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    args = parser.parse_args(argv)
+
+    init_embeddings_to_sqlite(db_file=args.db_file)
+    property_ids, vectors = load_embeddings(args.db_file)
+    index = SimilarPropertiesIndex.build(property_ids, vectors, k=args.k, block_size=args.block_size)
+    index_file = index_file_for(args.db_file)
+    index.save(index_file)
+    print(f"[LOG] Saved top-{index.k} neighbours for {len(index)} properties to {index_file}.")
+
+
+if __name__ == "__main__":
+    main()
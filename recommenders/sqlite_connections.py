@@ -0,0 +1,172 @@
+# Shared SQLite connections for the embeddings DB.
+#
+# One connection per (database, thread, process) is opened on first use and reused, with
+# WAL journaling and tuned pragmas applied once. Bulk-load mode runs a large write as a
+# single transaction with relaxed durability and inserts in chunks. read_vector_column fetches a BLOB column
+# of float32 vectors straight into one preallocated NumPy array.
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+BUSY_TIMEOUT_SECONDS = 30
+CACHE_SIZE_KIB = 64 * 1024  # page cache per connection
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 1000
+
+# Applied to every new connection
+CONNECTION_PRAGMAS = (
+    # vectors are ~1.5 KB BLOBs; larger pages mean fewer B-tree splits on bulk inserts
+    # (only takes effect when the database file is created)
+    "PRAGMA page_size=16384",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",  # safe with WAL; fsync only at checkpoints
+    f"PRAGMA cache_size=-{CACHE_SIZE_KIB}",
+    f"PRAGMA mmap_size={MMAP_SIZE_BYTES}",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _execute_when_unlocked(conn, sql, timeout=BUSY_TIMEOUT_SECONDS):
+    # journal_mode=WAL does not wait on the busy timeout: while another connection is
+    # creating the database file it fails with "database is locked" at once, so retry
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return conn.execute(sql)
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+class SQLiteConnectionManager:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._local = threading.local()
+        # setup(conn) callbacks that create tables; run once per new connection
+        self._schema = []
+
+    def register_schema(self, setup):
+        if setup not in self._schema:
+            self._schema.append(setup)
+            # connections opened before the registration still need it
+            conn = getattr(self._local, "conn", None)
+            if conn is not None:
+                setup(conn)
+                conn.commit()
+
+    def connection(self):
+        """
+        This thread's connection, opened (and tuned) on first use.
+        A connection inherited across fork() is never reused.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT_SECONDS)
+            for pragma in CONNECTION_PRAGMAS:
+                _execute_when_unlocked(conn, pragma)
+            for setup in self._schema:
+                setup(conn)
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Commit on success, roll back on error.
+        """
+        conn = self.connection()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        One transaction for a large write, with synchronous=OFF for its duration.
+        """
+        conn = self.connection()
+        conn.execute("PRAGMA synchronous=OFF")
+        try:
+            with self.transaction() as conn:
+                conn.execute("BEGIN")
+                yield conn
+        finally:
+            conn.execute("PRAGMA synchronous=NORMAL")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_file):
+    """
+    The process-wide manager for a database file.
+    """
+    key = os.path.abspath(db_file)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = SQLiteConnectionManager(db_file)
+        return _managers[key]
+
+
+def executemany_chunked(conn, sql, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    executemany in fixed-size chunks, so huge row lists are never materialized twice.
+    Returns the number of rows submitted.
+    """
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            conn.executemany(sql, chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        conn.executemany(sql, chunk)
+        total += len(chunk)
+    return total
+
+
+def read_vector_column(conn, sql, count, dim, dtype=np.float32):
+    """
+    Run a query selecting (key, blob) rows and copy every blob into one preallocated
+    (count, dim) array. Returns (keys, array); both cover the rows actually returned.
+    """
+    vectors = np.empty((count, dim), dtype=dtype)
+    flat = vectors.reshape(-1).view(np.uint8)
+    row_bytes = dim * np.dtype(dtype).itemsize
+    keys = []
+    cursor = conn.execute(sql)
+    cursor.arraysize = DEFAULT_CHUNK_SIZE
+    i = 0
+    while i < count:
+        rows = cursor.fetchmany()[: count - i]
+        if not rows:
+            break
+        # one copy per chunk instead of one NumPy call per row
+        data = b"".join(blob for _, blob in rows)
+        if len(data) != len(rows) * row_bytes:
+            bad = next(key for key, blob in rows if len(blob) != row_bytes)
+            raise ValueError(f"Vector for {bad} does not have {row_bytes} bytes")
+        flat[i * row_bytes:(i + len(rows)) * row_bytes] = np.frombuffer(data, dtype=np.uint8)
+        keys.extend(key for key, _ in rows)
+        i += len(rows)
+    return keys, vectors[:i]
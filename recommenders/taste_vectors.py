@@ -0,0 +1,197 @@
+# Persisted per-user taste vectors.
+# A user's query vector is a blend of their encoded preference text and the mean of the
+# vectors of the listings they saved:
+#   taste = normalize((1 - w) * text_vector + w * saved_sum / saved_count)
+# Both parts are stored in the embeddings DB. Saving or removing a listing adds or
+# subtracts one vector from saved_sum (O(d), no model call), and the text is only encoded
+# again when the preferences (or the model) change, so returning users are ranked
+# without any transformer inference.
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+from recommenders.sqlite_connections import get_manager
+
+# Share of the taste vector taken by the saved listings (for users who saved any)
+DEFAULT_SAVED_WEIGHT = 0.3
+
+
+def _blob(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def _vector_version(recommender):
+    # saved sums depend on both the listing vectors and the model space they live in
+    return f"{recommender.version}|{recommender.model_key()}"
+
+
+def _create_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_taste (
+            user_id         TEXT PRIMARY KEY,
+            text_key        TEXT,
+            catalog_version TEXT,  -- catalog version + model the saved sum was built on
+            saved_ids       TEXT,
+            text_vector     BLOB,
+            saved_sum       BLOB,
+            updated_at      REAL
+        )
+        """
+    )
+
+
+class TasteVectorStore:
+    def __init__(self, db_file, saved_weight=DEFAULT_SAVED_WEIGHT):
+        self.db_file = db_file
+        self.saved_weight = saved_weight
+        self.manager = get_manager(db_file)
+        self.manager.register_schema(_create_table)
+
+    def _get(self, conn, user_id):
+        row = conn.execute(
+            "SELECT text_key, catalog_version, saved_ids, text_vector, saved_sum "
+            "FROM user_taste WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "text_key": row[0],
+            "catalog_version": row[1],
+            "saved_ids": json.loads(row[2]),
+            "text_vector": np.frombuffer(row[3], dtype=np.float32),
+            "saved_sum": np.frombuffer(row[4], dtype=np.float32).copy(),
+        }
+
+    def _put(self, conn, user_id, entry):
+        conn.execute(
+            "INSERT OR REPLACE INTO user_taste VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                user_id,
+                entry["text_key"],
+                str(entry["catalog_version"]),
+                json.dumps(entry["saved_ids"]),
+                _blob(entry["text_vector"]),
+                _blob(entry["saved_sum"]),
+                time.time(),
+            ),
+        )
+
+    def blend(self, entry):
+        """
+        The taste vector of a stored entry.
+        """
+        count = len(entry["saved_ids"])
+        if not count or self.saved_weight <= 0:
+            return entry["text_vector"]
+        mean_saved = entry["saved_sum"] / count
+        return _unit((1.0 - self.saved_weight) * entry["text_vector"] + self.saved_weight * mean_saved)
+
+    def text_key(self, recommender, text):
+        return hashlib.sha256(f"{recommender.model_key()}\n{text}".encode("utf-8")).hexdigest()
+
+    @instrumentation.timed("taste_vectors.vectors")
+    def vectors(self, recommender, users):
+        """
+        Taste vectors (model space, unit length) for User models, one row per user.
+        Users seen for the first time or whose preferences changed are encoded together
+        in one batch; saved sums computed on an older catalog are recomputed from the
+        current listing vectors. The saved listings are checked against recommender.co_saves
+        (when set), which also tracks saves made elsewhere.
+        """
+        version = _vector_version(recommender)
+        conn = self.manager.connection()
+        texts = [recommender.compose_user_text(u) for u in users]
+        keys = [self.text_key(recommender, t) for t in texts]
+        entries = [self._get(conn, u.user_id) for u in users]
+
+        stale = [i for i, e in enumerate(entries) if e is None or e["text_key"] != keys[i]]
+        if stale:
+            instrumentation.count("taste_vectors.encoded", len(stale))
+            encoded = recommender.embed_to_vector([texts[i] for i in stale])
+        changed = []
+        for n, i in enumerate(stale):
+            if entries[i] is None:
+                entries[i] = {"saved_ids": [], "catalog_version": None}
+            entries[i]["text_key"] = keys[i]
+            entries[i]["text_vector"] = _unit(encoded[n])
+            changed.append(i)
+        co_saves = recommender.co_saves
+        for i, entry in enumerate(entries):
+            if co_saves is not None:
+                # saves made by other processes (users.json edits) reach co_saves first
+                saved_ids = co_saves.saved(users[i].user_id)
+                if set(saved_ids) != set(entry["saved_ids"]):
+                    entry["saved_ids"], entry["catalog_version"] = saved_ids, None
+            if entry["catalog_version"] != version:
+                # listing vectors may have changed: one pass over the user's saves
+                saved = recommender.model_space_vectors(entry["saved_ids"])
+                entry["saved_sum"] = saved.sum(axis=0) if len(saved) else np.zeros_like(entry["text_vector"])
+                entry["catalog_version"] = version
+                if i not in changed:
+                    changed.append(i)
+        if changed:
+            with self.manager.transaction() as conn:
+                for i in changed:
+                    self._put(conn, users[i].user_id, entries[i])
+        return np.stack([self.blend(e) for e in entries]) if entries else np.zeros((0, 0), dtype=np.float32)
+
+    def vector(self, recommender, user):
+        return self.vectors(recommender, [user])[0]
+
+    def _update_saved(self, recommender, user_id, property_id, sign):
+        with self.manager.transaction() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            entry = self._get(conn, user_id)
+            if entry is None:
+                # built (with every save) on the user's next recommendation
+                return False
+            if (property_id in entry["saved_ids"]) == (sign > 0):
+                return False
+            if entry["catalog_version"] == _vector_version(recommender):
+                vector = recommender.model_space_vectors([property_id])
+                if len(vector):
+                    entry["saved_sum"] += sign * vector[0]
+            # else: the whole sum is recomputed on next use anyway
+            if sign > 0:
+                entry["saved_ids"].append(property_id)
+            else:
+                entry["saved_ids"].remove(property_id)
+            self._put(conn, user_id, entry)
+        return True
+
+    def add_saved(self, recommender, user_id, property_id):
+        """
+        Fold a newly saved listing into the user's taste in O(d).
+        return: False if nothing was stored for the user yet or it was already counted.
+        """
+        return self._update_saved(recommender, str(user_id).lower().strip(), property_id, 1)
+
+    def remove_saved(self, recommender, user_id, property_id):
+        """
+        Take an unsaved listing out of the user's taste in O(d).
+        """
+        return self._update_saved(recommender, str(user_id).lower().strip(), property_id, -1)
+
+    def invalidate(self, user_ids):
+        """
+        Forget users' taste vectors; they are rebuilt (one encode) on next use.
+        """
+        with self.manager.transaction() as conn:
+            conn.executemany(
+                "DELETE FROM user_taste WHERE user_id = ?",
+                [(str(uid).lower().strip(),) for uid in user_ids],
+            )
@@ -0,0 +1,541 @@
+# Property vector storage behind one interface.
+#
+# VectorStore        - what the recommender code relies on: bulk load of every vector in
+#                      one read, batch upsert/delete, a version that is bumped on every
+#                      change, snapshot/restore, and an optional fitted projection
+#                      (projection.py) that the stored vectors were reduced with.
+# SQLiteVectorStore  - the property_embeddings table in the embeddings DB (default).
+# ColumnarVectorStore - a single file: a JSON manifest header followed by the vectors as
+#                      one contiguous float32 block and the metadata as typed columns.
+#
+# open_vector_store(path) picks the backend from the file extension.
+
+import os
+import shutil
+import sqlite3
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+from recommenders.block_file import (
+    decode_strings,
+    encode_strings,
+    read_block,
+    read_manifest,
+    write_block_file,
+)
+from recommenders.catalog_meta import (
+    bump_catalog_version,
+    ensure_meta_table,
+    read_catalog_version,
+)
+from recommenders.sqlite_connections import (
+    executemany_chunked,
+    get_manager,
+    read_vector_column,
+)
+from recommenders.projection import LinearProjection
+
+COLUMNAR_EXTENSION = ".gr8vec"
+METADATA_FIELDS = ("location", "type", "features", "tags")
+
+
+def property_record(prop):
+    """
+    The metadata stored next to a property's vector.
+    """
+    return {
+        "property_id": prop["property_id"],
+        "location": str(prop.get("location", "") or ""),
+        "type": str(prop.get("type", "") or ""),
+        "features": list(prop.get("features", []) or []),
+        "tags": list(prop.get("tags", []) or []),
+    }
+
+
+def open_vector_store(path):
+    """
+    ColumnarVectorStore for *.gr8vec files, SQLiteVectorStore otherwise.
+    """
+    if str(path).endswith(COLUMNAR_EXTENSION):
+        return ColumnarVectorStore(path)
+    return SQLiteVectorStore(path)
+
+
+def _as_matrix(vectors, count):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != count:
+        raise ValueError(f"Expected {count} vectors as a 2-D array, got shape {vectors.shape}")
+    return vectors
+
+
+class VectorStore:
+    """
+    Interface shared by the storage backends.
+    """
+
+    path = None
+
+    def exists(self):
+        """
+        True once the store holds at least one vector.
+        """
+        raise NotImplementedError
+
+    @property
+    def version(self):
+        """
+        Incremented by every upsert, delete and restore (0 for a new store).
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def load_all(self):
+        """
+        return: (list of property_ids, float32 matrix of shape (n, d)), aligned
+        """
+        raise NotImplementedError
+
+    def load_records(self):
+        """
+        return: list of metadata dicts (property_id, location, type, features, tags)
+        """
+        raise NotImplementedError
+
+    def upsert(self, properties, vectors):
+        """
+        Insert or replace properties (dicts) with their vectors; returns the count written.
+        """
+        raise NotImplementedError
+
+    def delete(self, property_ids):
+        """
+        Remove properties by id; returns the count removed.
+        """
+        raise NotImplementedError
+
+    def snapshot(self, path):
+        """
+        Write a consistent copy of the store to path.
+        """
+        raise NotImplementedError
+
+    def restore(self, path):
+        """
+        Replace the store's contents with a snapshot. The version still moves forward,
+        so caches built from the pre-restore contents are never mistaken as current.
+        """
+        raise NotImplementedError
+
+    def load_projection(self):
+        """
+        return: the LinearProjection the stored vectors were reduced with, or None
+        """
+        raise NotImplementedError
+
+    def set_projection(self, projection, property_ids, vectors):
+        """
+        Replace the projection (None = full-dimension vectors) together with every stored
+        vector, as one change, so vectors and projection never disagree.
+        property_ids / vectors must cover every property in the store.
+        """
+        raise NotImplementedError
+
+
+def _check_covers(store_ids, property_ids, vectors):
+    vectors = _as_matrix(vectors, len(property_ids))
+    if set(property_ids) != set(store_ids) or len(set(property_ids)) != len(property_ids):
+        raise ValueError("set_projection needs exactly one vector per stored property")
+    return vectors
+
+
+################ SQLITE BACKEND ################
+# Upserts of at least this many rows use bulk-load mode
+BULK_LOAD_THRESHOLD = 500
+UPSERT_SQL = """
+    INSERT OR REPLACE INTO property_embeddings
+    (property_id, embedding, location, type, features, tags)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def ensure_table(conn):
+    """
+    Ensure the property_embeddings table exists in the SQLite database.
+    Otherwise, create it.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS property_embeddings (
+            property_id TEXT PRIMARY KEY,
+            embedding   BLOB,
+            location    TEXT,
+            type        TEXT,
+            features    TEXT,
+            tags        TEXT
+        )
+    """
+    )
+    # no query filters on type; older stores had an index on it that only slowed writes
+    conn.execute("DROP INDEX IF EXISTS idx_property_embeddings_type")
+    # at most one row: the projection the stored embeddings were reduced with
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS vector_projection (
+            id          INTEGER PRIMARY KEY CHECK (id = 1),
+            input_dim   INTEGER,
+            output_dim  INTEGER,
+            explained   REAL,
+            components  BLOB
+        )
+    """
+    )
+    ensure_meta_table(conn)
+
+
+def _split(text):
+    return [item for item in (text or "").split(",") if item]
+
+
+class SQLiteVectorStore(VectorStore):
+    def __init__(self, db_file):
+        self.path = db_file
+        # reused, tuned per-thread connections (see sqlite_connections.py)
+        self.manager = get_manager(db_file)
+        self.manager.register_schema(ensure_table)
+
+    def exists(self):
+        conn = self.manager.connection()
+        return conn.execute("SELECT 1 FROM property_embeddings LIMIT 1").fetchone() is not None
+
+    @property
+    def version(self):
+        return read_catalog_version(self.manager.connection())
+
+    def __len__(self):
+        conn = self.manager.connection()
+        return conn.execute("SELECT COUNT(*) FROM property_embeddings").fetchone()[0]
+
+    @instrumentation.timed("vector_store.load_all")
+    def load_all(self):
+        # one read transaction, so the row count and the rows come from the same snapshot
+        with self.manager.transaction() as conn:
+            conn.execute("BEGIN")
+            count, dim_bytes = conn.execute(
+                "SELECT COUNT(*), MAX(LENGTH(embedding)) FROM property_embeddings"
+            ).fetchone()
+            if not count:
+                return [], np.zeros((0, 0), dtype=np.float32)
+            return read_vector_column(
+                conn,
+                "SELECT property_id, embedding FROM property_embeddings ORDER BY rowid",
+                count,
+                dim_bytes // np.dtype(np.float32).itemsize,
+            )
+
+    def load_records(self):
+        rows = self.manager.connection().execute(
+            "SELECT property_id, location, type, features, tags FROM property_embeddings ORDER BY rowid"
+        ).fetchall()
+        return [
+            {
+                "property_id": pid,
+                "location": location or "",
+                "type": type_ or "",
+                "features": _split(features),
+                "tags": _split(tags),
+            }
+            for pid, location, type_, features, tags in rows
+        ]
+
+    def upsert(self, properties, vectors, bulk=None):
+        """
+        bulk: force bulk-load mode on/off; by default it is used for large batches.
+        """
+        vectors = _as_matrix(vectors, len(properties))
+        # same fields as property_record, built straight into row tuples
+        rows_data = (
+            (
+                p["property_id"],
+                vec.tobytes(),
+                str(p.get("location", "") or ""),
+                str(p.get("type", "") or ""),
+                ",".join(p.get("features", []) or []),
+                ",".join(p.get("tags", []) or []),
+            )
+            for p, vec in zip(properties, vectors)
+        )
+        if bulk is None:
+            bulk = len(properties) >= BULK_LOAD_THRESHOLD
+        with instrumentation.timer("sqlite.write"):
+            if bulk:
+                context = self.manager.bulk_load()
+            else:
+                context = self.manager.transaction()
+            with context as conn:
+                written = executemany_chunked(conn, UPSERT_SQL, rows_data)
+                # listings changed: caches keyed on the catalog version become stale
+                bump_catalog_version(conn)
+        instrumentation.count("sqlite.rows_written", written)
+        return written
+
+    def delete(self, property_ids):
+        with self.manager.transaction() as conn:
+            cursor = conn.executemany(
+                "DELETE FROM property_embeddings WHERE property_id = ?",
+                [(pid,) for pid in property_ids],
+            )
+            removed = cursor.rowcount
+            if removed:
+                bump_catalog_version(conn)
+        return removed
+
+    def snapshot(self, path):
+        target = sqlite3.connect(path)
+        try:
+            self.manager.connection().backup(target)
+        finally:
+            target.close()
+
+    def restore(self, path):
+        current = self.version
+        source, target = sqlite3.connect(path), self.manager.connection()
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+        with self.manager.transaction() as conn:
+            ensure_table(conn)
+            restored = read_catalog_version(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('catalog_version', ?)",
+                (str(max(current, restored) + 1),),
+            )
+
+    def load_projection(self):
+        row = self.manager.connection().execute(
+            "SELECT output_dim, input_dim, explained, components FROM vector_projection WHERE id = 1"
+        ).fetchone()
+        if row is None:
+            return None
+        output_dim, input_dim, explained, components = row
+        return LinearProjection.from_bytes(components, output_dim, input_dim, explained)
+
+    def set_projection(self, projection, property_ids, vectors):
+        vectors = _check_covers(self.load_all()[0], property_ids, vectors)
+        with self.manager.bulk_load() as conn:
+            executemany_chunked(
+                conn,
+                "UPDATE property_embeddings SET embedding = ? WHERE property_id = ?",
+                ((vec.tobytes(), pid) for pid, vec in zip(property_ids, vectors)),
+            )
+            conn.execute("DELETE FROM vector_projection")
+            if projection is not None:
+                conn.execute(
+                    "INSERT INTO vector_projection VALUES (1, ?, ?, ?, ?)",
+                    (
+                        projection.input_dim,
+                        projection.output_dim,
+                        projection.explained,
+                        projection.to_bytes(),
+                    ),
+                )
+            bump_catalog_version(conn)
+
+
+################ COLUMNAR BACKEND ################
+# An aligned-block file (see block_file.py) whose manifest holds format, version, count,
+# dim and projection. Blocks: "vectors" (count x dim float32), then per string column an
+# int64 offsets block (count + 1) and a UTF-8 bytes block; list columns add an int64 block
+# of item offsets (count + 1) into their flattened item strings. A store with a projection
+# adds a "projection" block (output_dim x input_dim float32), described by the manifest's
+# "projection" entry.
+COLUMNAR_MAGIC = b"GR8VEC\x00\x01"
+COLUMNAR_FORMAT = 1
+STRING_COLUMNS = ("property_id", "location", "type")
+LIST_COLUMNS = ("features", "tags")
+
+
+class ColumnarVectorStore(VectorStore):
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path) and self._read_manifest()[0]["count"] > 0
+
+    @property
+    def version(self):
+        if not os.path.exists(self.path):
+            return 0
+        return self._read_manifest()[0]["version"]
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        return self._read_manifest()[0]["count"]
+
+    def _read_manifest(self):
+        """
+        return: (manifest dict, absolute offset of the data section)
+        """
+        manifest, data_start = read_manifest(self.path, COLUMNAR_MAGIC)
+        if manifest.get("format") != COLUMNAR_FORMAT:
+            raise ValueError(f"Unsupported columnar store format: {manifest.get('format')}")
+        return manifest, data_start
+
+    def _read(self, names):
+        if not os.path.exists(self.path):
+            return {"version": 0, "count": 0, "dim": 0}, {}
+        manifest, data_start = self._read_manifest()
+        with open(self.path, "rb") as f:
+            blocks = {name: read_block(f, manifest, data_start, name) for name in names}
+        return manifest, blocks
+
+    @instrumentation.timed("vector_store.load_all")
+    def load_all(self):
+        manifest, blocks = self._read(
+            ["vectors", "property_id.offsets", "property_id.data"]
+        )
+        if not blocks:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        # one read for the whole vector block
+        vectors = blocks["vectors"].reshape(manifest["count"], manifest["dim"])
+        property_ids = decode_strings(blocks["property_id.offsets"], blocks["property_id.data"])
+        return property_ids, vectors
+
+    def load_records(self):
+        names = []
+        for column in STRING_COLUMNS + LIST_COLUMNS:
+            names += [f"{column}.offsets", f"{column}.data"]
+        names += [f"{column}.items" for column in LIST_COLUMNS]
+        manifest, blocks = self._read(names)
+        if not blocks:
+            return []
+        columns = {
+            column: decode_strings(blocks[f"{column}.offsets"], blocks[f"{column}.data"])
+            for column in STRING_COLUMNS + LIST_COLUMNS
+        }
+        for column in LIST_COLUMNS:
+            items, bounds = columns[column], blocks[f"{column}.items"]
+            columns[column] = [items[bounds[i]:bounds[i + 1]] for i in range(manifest["count"])]
+        return [
+            {column: columns[column][i] for column in STRING_COLUMNS + LIST_COLUMNS}
+            for i in range(manifest["count"])
+        ]
+
+    def _write(self, records, vectors, version, projection=None):
+        """
+        Rewrite the whole file atomically, so readers always see either the old or the
+        new contents.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        count = len(records)
+        dim = int(vectors.shape[1]) if vectors.ndim == 2 and count else 0
+        arrays = [("vectors", vectors.reshape(-1))]
+        projection_info = None
+        if projection is not None:
+            arrays.append(("projection", projection.components.reshape(-1)))
+            projection_info = {
+                "input_dim": projection.input_dim,
+                "output_dim": projection.output_dim,
+                "explained": projection.explained,
+            }
+        for column in STRING_COLUMNS:
+            offsets, data = encode_strings(r[column] for r in records)
+            arrays += [(f"{column}.offsets", offsets), (f"{column}.data", data)]
+        for column in LIST_COLUMNS:
+            lengths = [len(r[column]) for r in records]
+            bounds = np.zeros(count + 1, dtype=np.int64)
+            bounds[1:] = np.cumsum(lengths, dtype=np.int64)
+            offsets, data = encode_strings(item for r in records for item in r[column])
+            arrays += [
+                (f"{column}.items", bounds),
+                (f"{column}.offsets", offsets),
+                (f"{column}.data", data),
+            ]
+
+        manifest = {
+            "format": COLUMNAR_FORMAT,
+            "version": version,
+            "count": count,
+            "dim": dim,
+            "fields": ["property_id", *METADATA_FIELDS],
+            "projection": projection_info,
+        }
+        with instrumentation.timer("vector_store.write"):
+            write_block_file(self.path, COLUMNAR_MAGIC, manifest, arrays)
+
+    def upsert(self, properties, vectors):
+        new_records = [property_record(p) for p in properties]
+        new_vectors = _as_matrix(vectors, len(new_records))
+        _, old_vectors = self.load_all()
+        records = self.load_records()
+        if records and old_vectors.shape[1] != new_vectors.shape[1]:
+            raise ValueError(
+                f"Vector dimension {new_vectors.shape[1]} does not match the store ({old_vectors.shape[1]})"
+            )
+
+        row = {r["property_id"]: i for i, r in enumerate(records)}
+        vectors = old_vectors if records else np.zeros((0, new_vectors.shape[1]), np.float32)
+        appended = []
+        for record, vec in zip(new_records, new_vectors):
+            i = row.get(record["property_id"])
+            if i is None:
+                row[record["property_id"]] = len(records)
+                records.append(record)
+                appended.append(vec)
+            else:
+                records[i] = record
+                vectors[i] = vec
+        if appended:
+            vectors = np.concatenate([vectors, np.stack(appended)])
+
+        self._write(records, vectors, self.version + 1, self.load_projection())
+        instrumentation.count("vector_store.rows_written", len(new_records))
+        return len(new_records)
+
+    def delete(self, property_ids):
+        doomed = set(property_ids)
+        _, vectors = self.load_all()
+        records = self.load_records()
+        keep = [i for i, r in enumerate(records) if r["property_id"] not in doomed]
+        removed = len(records) - len(keep)
+        if removed:
+            self._write(
+                [records[i] for i in keep], vectors[keep], self.version + 1, self.load_projection()
+            )
+        return removed
+
+    def snapshot(self, path):
+        shutil.copyfile(self.path, path)
+
+    def restore(self, path):
+        snapshot = ColumnarVectorStore(path)
+        version = max(self.version, snapshot.version) + 1
+        property_ids, vectors = snapshot.load_all()
+        self._write(snapshot.load_records(), vectors, version, snapshot.load_projection())
+
+    def load_projection(self):
+        if not os.path.exists(self.path):
+            return None
+        manifest, data_start = self._read_manifest()
+        info = manifest.get("projection")
+        if not info:
+            return None
+        with open(self.path, "rb") as f:
+            components = read_block(f, manifest, data_start, "projection")
+        return LinearProjection(
+            components.reshape(info["output_dim"], info["input_dim"]), info["explained"]
+        )
+
+    def set_projection(self, projection, property_ids, vectors):
+        stored_ids, _ = self.load_all()
+        vectors = _check_covers(stored_ids, property_ids, vectors)
+        # keep the store's row order
+        row = {pid: i for i, pid in enumerate(property_ids)}
+        vectors = vectors[[row[pid] for pid in stored_ids]]
+        self._write(self.load_records(), vectors, self.version + 1, projection)
@@ -0,0 +1,93 @@
+# bench_encode_batching.py
+# Throughput vs. added latency of the micro-batching encode queue.
+# N client threads call embed_to_vector([text]) back to back, first with batching off,
+# then for each (max_batch_size, max_wait_ms) pair.
+#
+# Run:
+#   python scripts/bench_encode_batching.py --clients 16 --seconds 5
+#   python scripts/bench_encode_batching.py --batch-sizes 8 32 --waits 1 5 10
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from recommenders.sbert_recommender import SbertRecommender, load_model
+
+USERS_FILE = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "datasets", "users.json")
+)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def run(recommender, texts, clients, seconds):
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset):
+        local = []
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            recommender.embed_to_vector([texts[i % len(texts)]])
+            local.append(time.perf_counter() - start)
+            i += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / wall, percentile(latencies, 50), percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encode micro-batching")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32, 64])
+    parser.add_argument("--waits", type=float, nargs="+", default=[1.0, 5.0, 10.0])
+    args = parser.parse_args()
+
+    with open(USERS_FILE, "r", encoding="utf-8") as f:
+        users = json.load(f)
+    envs = [u.get("preferred_environment") or [] for u in users]
+    texts = [
+        "preferred_environment: " + (", ".join(e) if isinstance(e, list) else str(e))
+        for e in envs
+    ]
+
+    # no catalog needed: only the encoder is exercised
+    recommender = SbertRecommender([], model=load_model())
+    recommender.embed_to_vector(texts)  # warm up
+
+    print(f"{'config':<24}{'texts/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    throughput, p50, p99 = run(recommender, texts, args.clients, args.seconds)
+    print(f"{'no batching':<24}{throughput:>10.1f}{1000 * p50:>10.2f}{1000 * p99:>10.2f}")
+
+    for size in args.batch_sizes:
+        for wait in args.waits:
+            recommender.enable_batching(max_batch_size=size, max_wait_ms=wait)
+            throughput, p50, p99 = run(recommender, texts, args.clients, args.seconds)
+            label = f"batch={size} wait={wait:g}ms"
+            print(f"{label:<24}{throughput:>10.1f}{1000 * p50:>10.2f}{1000 * p99:>10.2f}")
+    recommender.disable_batching()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# bench_partitioned_index.py
+# Query cost of the region / price-band partitioned index (recommenders/partitioned_index.py)
+# against a full scan: rows touched and time per query, with no constraint, a budget, and a
+# region + budget, plus the top-k agreement with brute force. Uses a synthetic catalog
+# (random vectors clustered by region), so no model is needed.
+#
+# Run:
+#   python scripts/bench_partitioned_index.py --rows 100000 --regions 98 --queries 200
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from recommenders.partitioned_index import PartitionedIndex
+from recommenders.similar_properties import normalize_rows
+
+
+def make_catalog(n, num_regions, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    region_codes = rng.integers(0, num_regions, n)
+    centers = rng.standard_normal((num_regions, dim)).astype(np.float32)
+    vectors = centers[region_codes] + 1.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    prices = np.round(rng.lognormal(5.5, 0.6, n), 0)
+    regions = [f"Region {c}, Country" for c in region_codes]
+    return [f"S{i:07d}" for i in range(n)], regions, prices, normalize_rows(vectors)
+
+
+def brute_force(vectors, prices, regions, query, top_k, budget=None, wanted=None):
+    mask = np.ones(len(vectors), dtype=bool)
+    if budget is not None:
+        mask &= prices <= budget
+    if wanted is not None:
+        mask &= np.isin(regions, wanted)
+    rows = np.flatnonzero(mask)
+    scores = vectors[rows] @ query
+    best = np.argsort(-scores, kind="stable")[:top_k]
+    return rows[best], len(vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the partitioned vector index")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--regions", type=int, default=98)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    ids, regions, prices, vectors = make_catalog(args.rows, args.regions, args.dim)
+    region_array = np.array(regions)
+    start = time.perf_counter()
+    index = PartitionedIndex.build(regions, prices, vectors)
+    print(f"{args.rows} listings, {len(index)} partitions, built in {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(1)
+    queries = normalize_rows(vectors[rng.integers(0, args.rows, args.queries)]
+                             + 0.5 * rng.standard_normal((args.queries, args.dim)).astype(np.float32))
+    budgets = rng.choice([150.0, 250.0, 400.0], args.queries)
+    wanted = [[f"Region {c}, Country" for c in rng.integers(0, args.regions, 3)] for _ in range(args.queries)]
+    cases = [
+        ("no constraint", lambda i: {}),
+        ("budget", lambda i: {"budget": budgets[i]}),
+        ("3 regions + budget", lambda i: {"budget": budgets[i], "regions": wanted[i]}),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.gr8part")
+        index.save(path, ids, prices, vectors)
+        loaded = PartitionedIndex.load(path)
+        id_row = {pid: i for i, pid in enumerate(ids)}
+
+        print(f"{'query':<22}{'full ms':>9}{'rows':>9}{'index ms':>10}{'rows':>9}{'same top-k':>12}")
+        for name, options in cases:
+            full_time = index_time = 0.0
+            full_rows = index_rows = agree = 0
+            for i, query in enumerate(queries):
+                kw = options(i)
+                t = time.perf_counter()
+                expected, touched = brute_force(vectors, prices, region_array, query, args.top_k,
+                                                kw.get("budget"), kw.get("regions"))
+                full_time += time.perf_counter() - t
+                full_rows += touched
+
+                t = time.perf_counter()
+                found = loaded.search(query, args.top_k, **kw)
+                index_time += time.perf_counter() - t
+                # rows of the partitions the bound-ordered scan reached
+                partitions = loaded.plan(kw.get("regions"), kw.get("budget"))
+                bounds = loaded.upper_bounds(query, partitions)
+                kth = found[-1][0] if len(found) >= args.top_k else -np.inf
+                index_rows += int(loaded.counts[partitions[bounds > kth]].sum())
+                agree += [id_row[pid] for _, pid, _ in found] == expected.tolist()
+            n = len(queries)
+            print(f"{name:<22}{full_time / n * 1000:>9.2f}{full_rows // n:>9}"
+                  f"{index_time / n * 1000:>10.2f}{index_rows // n:>9}{agree / n:>12.2%}")
+
+
+if __name__ == "__main__":
+    main()
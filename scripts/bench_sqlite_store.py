@@ -0,0 +1,127 @@
+# bench_sqlite_store.py
+# Write and read timings of the property_embeddings table: the previous access pattern
+# (a new connection per call, default journaling, row-by-row BLOB decoding) against
+# SQLiteVectorStore (shared WAL connection, bulk-load mode, preallocated reads).
+# Uses random vectors, so no model is needed.
+#
+# Run:
+#   python scripts/bench_sqlite_store.py --rows 20000 --upserts 200
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from recommenders.catalog_meta import bump_catalog_version
+from recommenders.vector_store import SQLiteVectorStore
+
+
+def make_properties(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    props = [
+        {
+            "property_id": f"B{i:07d}",
+            "location": f"City {i % 97}, Country - Region",
+            "type": ["Villa", "Cabin", "Apartment"][i % 3],
+            "features": ["WiFi", "Kitchen", "Parking"],
+            "tags": ["family", "nature"],
+        }
+        for i in range(n)
+    ]
+    return props, rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def legacy_upsert(db_file, props, vectors):
+    # the pre-VectorStore add_properties write path
+    conn = sqlite3.connect(db_file)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS property_embeddings (property_id TEXT PRIMARY KEY, "
+        "embedding BLOB, location TEXT, type TEXT, features TEXT, tags TEXT)"
+    )
+    conn.commit()
+    conn.executemany(
+        "INSERT OR REPLACE INTO property_embeddings VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (p["property_id"], v.tobytes(), p["location"], p["type"],
+             ",".join(p["features"]), ",".join(p["tags"]))
+            for p, v in zip(props, vectors)
+        ],
+    )
+    bump_catalog_version(conn)
+    conn.commit()
+    conn.close()
+
+
+def legacy_load(db_file):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute(
+        "SELECT property_id, embedding FROM property_embeddings ORDER BY rowid"
+    ).fetchall()
+    conn.close()
+    return [r[0] for r in rows], np.stack([np.frombuffer(b, dtype=np.float32) for _, b in rows])
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def best_of(results, name):
+    # fastest (legacy, store) seconds across runs
+    return min(r[name][0] for r in results), min(r[name][1] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark property_embeddings writes and reads")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--upserts", type=int, default=200, help="number of single-row upserts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    props, vectors = make_properties(args.rows, args.dim)
+
+    def small_upserts(write):
+        for i in range(args.upserts):
+            write(props[i:i + 1], vectors[i:i + 1])
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_db = os.path.join(tmp, "legacy.sqlite")
+            store = SQLiteVectorStore(os.path.join(tmp, "store.sqlite"))
+            times = {
+                "bulk": (
+                    timed(legacy_upsert, legacy_db, props, vectors)[0],
+                    timed(store.upsert, props, vectors)[0],
+                ),
+                "small": (
+                    timed(small_upserts, lambda p, v: legacy_upsert(legacy_db, p, v))[0],
+                    timed(small_upserts, store.upsert)[0],
+                ),
+                "read": (timed(legacy_load, legacy_db)[0], timed(store.load_all)[0]),
+            }
+            store.manager.close()
+            return times
+
+    results = [run() for _ in range(args.repeat)]
+    legacy_bulk, store_bulk = best_of(results, "bulk")
+    legacy_small, store_small = best_of(results, "small")
+    legacy_read, store_read = best_of(results, "read")
+
+    print(f"{'operation':<32}{'legacy (s)':>12}{'store (s)':>12}{'speedup':>10}")
+    for name, old, new in [
+        (f"bulk load {args.rows} rows", legacy_bulk, store_bulk),
+        (f"{args.upserts} single-row upserts", legacy_small, store_small),
+        ("read all vectors", legacy_read, store_read),
+    ]:
+        print(f"{name:<32}{old:>12.3f}{new:>12.3f}{old / max(new, 1e-9):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
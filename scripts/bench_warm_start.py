@@ -0,0 +1,65 @@
+# bench_warm_start.py
+# Time to a ready SbertRecommender (model load excluded): encoding the whole catalog,
+# reusing the vector store, and mapping a recommender snapshot. Each case runs in a
+# fresh subprocess, like a new worker would.
+#
+# Run:
+#   python scripts/bench_warm_start.py --repeat 3
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+WORKER = """
+import os, sys, time
+sys.path.append({root!r})
+os.chdir({root!r})
+import core
+from recommenders.sbert_recommender import SbertRecommender
+model = core.get_shared_model()
+start = time.perf_counter()
+properties = core.load_properties()
+store = core.vector_store() if {use_store!r} else None
+recommender = SbertRecommender(properties, model=model, store=store, snapshot={snapshot!r})
+print("READY", time.perf_counter() - start)
+"""
+
+
+def time_worker(use_store, snapshot):
+    code = WORKER.format(root=ROOT, use_store=use_store, snapshot=snapshot)
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.split("READY")[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recommender warm start")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (best is kept)")
+    args = parser.parse_args()
+
+    sys.path.append(ROOT)
+    os.chdir(ROOT)
+    import core
+
+    core.ensure_embeddings_db()
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, "bench.gr8snap")
+        time_worker(True, snapshot)  # writes the snapshot
+        cases = [
+            ("encode catalog", False, None),
+            ("reuse vector store", True, None),
+            ("map snapshot", True, snapshot),
+        ]
+        print(f"{'start':<22}{'seconds':>10}")
+        for name, use_store, path in cases:
+            best = min(time_worker(use_store, path) for _ in range(args.repeat))
+            print(f"{name:<22}{best:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# fit_projection.py
+# Fit a linear projection (recommenders/projection.py) on the catalog embeddings, report
+# how closely reduced-dimension rankings agree with full-dimension ones, and optionally
+# store the projection with the vector store so the recommender scores in the reduced space.
+#
+# Agreement is measured on every user's preferred environment (within their budget) and
+# on one query per distinct listing type / tag: overlap of the top-N lists and how often
+# the first result is the same. Scoring time and vector memory are measured too.
+#
+# Run from anywhere:
+#   python scripts/fit_projection.py --dims 64,96,128,192          # report only
+#   python scripts/fit_projection.py --dims 96 --apply 96          # report, then store it
+#   python scripts/fit_projection.py --remove                      # back to full vectors
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+os.chdir(ROOT)  # core uses paths relative to the project root
+
+import core
+from recommenders import similar_properties
+from recommenders.projection import LinearProjection
+from recommenders.sbert_recommender import compose_property_text
+from recommenders.similar_properties import SimilarPropertiesIndex, normalize_rows
+
+
+def full_vectors(store, model):
+    """
+    Full-dimension vectors for every stored property, in store order. A store that
+    already holds reduced vectors is re-encoded from its stored listing text.
+    """
+    property_ids, vectors = store.load_all()
+    if store.load_projection() is None:
+        return property_ids, vectors
+    print("[LOG] Store holds projected vectors; re-encoding the catalog at full dimension.")
+    texts = {r["property_id"]: compose_property_text(r) for r in store.load_records()}
+    encoded = model.encode([texts[pid] for pid in property_ids], convert_to_numpy=True)
+    return property_ids, encoded.astype(np.float32)
+
+
+def evaluation_queries(users, properties):
+    """
+    (text, budget or None) pairs: each user's preferences, then each distinct type / tag.
+    """
+    queries = []
+    for user in users:
+        env = user.get("preferred_environment") or []
+        if isinstance(env, str):
+            env = [env]
+        queries.append(("preferred_environment: " + ", ".join(env), float(user.get("budget") or 0)))
+    terms = sorted({p["type"] for p in properties} | {t for p in properties for t in p.get("tags", [])})
+    queries += [(f"preferred_environment: {term}", None) for term in terms]
+    return queries
+
+
+def top_n(scores, rows, n):
+    n = min(n, len(rows))
+    part = np.argpartition(-scores[rows], n - 1)[:n]
+    return rows[part[np.argsort(-scores[rows][part], kind="stable")]]
+
+
+def agreement(full, reduced, query_full, query_reduced, masks, n):
+    """
+    Mean top-N overlap and top-1 match rate between full and reduced rankings.
+    """
+    overlaps, firsts = [], []
+    for q_full, q_reduced, rows in zip(query_full, query_reduced, masks):
+        if not len(rows):
+            continue
+        a = top_n(full @ q_full, rows, n)
+        b = top_n(reduced @ q_reduced, rows, n)
+        overlaps.append(len(set(a.tolist()) & set(b.tolist())) / len(a))
+        firsts.append(a[0] == b[0])
+    return float(np.mean(overlaps)), float(np.mean(firsts))
+
+
+def scoring_seconds(vectors, queries, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for q in queries:
+            vectors @ q
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries)
+
+
+def rebuild_similar_index(store, property_ids, vectors):
+    # the precomputed neighbors were found in the old vector space
+    index_file = similar_properties.index_file_for(store.path)
+    if os.path.exists(index_file):
+        SimilarPropertiesIndex.build(property_ids, vectors).save(index_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit and evaluate an embedding projection")
+    parser.add_argument("--dims", default="64,96,128,192", help="comma-separated dimensions to report")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs (best is kept)")
+    parser.add_argument("--apply", type=int, help="store a projection of this dimension")
+    parser.add_argument("--remove", action="store_true", help="drop the projection, store full vectors")
+    args = parser.parse_args()
+
+    core.ensure_embeddings_db()
+    store = core.vector_store()
+    model = core.get_shared_model()
+    property_ids, vectors = full_vectors(store, model)
+    full = normalize_rows(vectors)
+
+    if args.remove:
+        store.set_projection(None, property_ids, vectors)
+        rebuild_similar_index(store, property_ids, vectors)
+        print(f"[LOG] Removed the projection; {len(property_ids)} full vectors stored.")
+        return
+
+    by_id = {p["property_id"]: p for p in core.load_properties()}
+    prices = np.array([float(by_id[pid]["price_per_night"]) if pid in by_id else np.inf
+                       for pid in property_ids])
+    queries = evaluation_queries(core.load_users(), list(by_id.values()))
+    query_full = normalize_rows(model.encode([t for t, _ in queries], convert_to_numpy=True))
+    everything = np.arange(len(property_ids))
+    masks = [everything if b is None else np.flatnonzero(prices <= b) for _, b in queries]
+
+    dims = sorted({int(d) for d in args.dims.split(",") if d} | ({args.apply} if args.apply else set()))
+    full_time = scoring_seconds(full, query_full, args.repeat)
+    print(f"{len(property_ids)} listings, {len(queries)} queries, top-{args.top_n}")
+    print(f"{'dim':>5}{'explained':>11}{'overlap':>9}{'top-1':>8}{'score ms':>10}{'speedup':>9}{'MB':>8}")
+    print(f"{full.shape[1]:>5}{1.0:>11.3f}{1.0:>9.3f}{1.0:>8.3f}"
+          f"{full_time * 1000:>10.3f}{1.0:>8.1f}x{full.nbytes / 2**20:>8.1f}")
+    projections = {}
+    for dim in dims:
+        projection = LinearProjection.fit(vectors, dim)
+        reduced = projection.transform(vectors)
+        query_reduced = projection.transform(query_full)
+        overlap, first = agreement(full, reduced, query_full, query_reduced, masks, args.top_n)
+        reduced_time = scoring_seconds(reduced, query_reduced, args.repeat)
+        print(f"{dim:>5}{projection.explained:>11.3f}{overlap:>9.3f}{first:>8.3f}"
+              f"{reduced_time * 1000:>10.3f}{full_time / max(reduced_time, 1e-12):>8.1f}x"
+              f"{reduced.nbytes / 2**20:>8.1f}")
+        projections[dim] = (projection, reduced)
+
+    if args.apply:
+        projection, reduced = projections[args.apply]
+        store.set_projection(projection, property_ids, reduced)
+        rebuild_similar_index(store, property_ids, reduced)
+        print(f"[LOG] Stored a {args.apply}-d projection with {len(property_ids)} vectors in {store.path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# load_test.py
+# Closed-loop load generator for recommendation_server.py.
+# Each client thread keeps one HTTP/1.1 connection open and fires requests back to back.
+#
+# Run (with the server already running):
+#   python scripts/load_test.py --concurrency 16 --requests 2000
+#   python scripts/load_test.py --endpoint similar --concurrency 8 --duration 20
+
+import argparse
+import http.client
+import json
+import os
+import random
+import threading
+import time
+
+BASE_DIR = os.path.dirname(__file__)
+USERS_FILE = os.path.abspath(os.path.join(BASE_DIR, "..", "datasets", "users.json"))
+PROPERTIES_FILE = os.path.abspath(
+    os.path.join(BASE_DIR, "..", "datasets", "property_listings.json")
+)
+
+
+def load_payloads(endpoint, batch_size):
+    """
+    Build request (method, path, body) tuples from the datasets.
+    Passwords are never sent.
+    """
+    if endpoint == "similar":
+        with open(PROPERTIES_FILE, "r", encoding="utf-8") as f:
+            ids = [p["property_id"] for p in json.load(f)["properties"]]
+        return [("GET", f"/similar/{pid}?top_n=5", None) for pid in ids]
+
+    with open(USERS_FILE, "r", encoding="utf-8") as f:
+        users = [
+            {
+                "user_id": u["user_id"],
+                "preferred_environment": u.get("preferred_environment", []),
+                "budget": u.get("budget", 0),
+                "group_size": u.get("group_size", 1),
+            }
+            for u in json.load(f)
+        ]
+    if endpoint == "batch":
+        return [
+            ("POST", "/recommend/batch", json.dumps({"users": random.sample(users, min(batch_size, len(users))), "top_n": 5}))
+            for _ in range(50)
+        ]
+    return [("POST", "/recommend", json.dumps({"user": u, "top_n": 5})) for u in users]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def run_client(host, port, payloads, deadline, remaining, latencies, errors, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    while time.perf_counter() < deadline:
+        with lock:
+            if remaining[0] <= 0:
+                break
+            remaining[0] -= 1
+        method, path, body = random.choice(payloads)
+        headers = {"Content-Type": "application/json"} if body else {}
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the recommendation server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--endpoint", choices=["recommend", "batch", "similar"], default="recommend")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000, help="total requests to send")
+    parser.add_argument("--duration", type=float, default=60.0, help="stop after this many seconds")
+    parser.add_argument("--batch-size", type=int, default=8, help="users per /recommend/batch call")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.endpoint, args.batch_size)
+    latencies, errors, remaining = [], [0], [args.requests]
+    lock = threading.Lock()
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(args.host, args.port, payloads, deadline, remaining, latencies, errors, lock),
+        )
+        for _ in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    done = len(latencies)
+    print(f"Endpoint     : {args.endpoint}")
+    print(f"Concurrency  : {args.concurrency}")
+    print(f"Requests     : {done} ok, {errors[0]} failed in {wall:.2f}s")
+    print(f"Throughput   : {done / wall:.1f} req/s")
+    if done:
+        print(f"Latency mean : {1000 * sum(latencies) / done:.2f} ms")
+        for q in (50, 90, 95, 99, 99.9):
+            print(f"Latency p{q:<4}: {1000 * percentile(latencies, q):.2f} ms")
+        print(f"Latency max  : {1000 * latencies[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
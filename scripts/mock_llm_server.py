@@ -0,0 +1,125 @@
+# mock_llm_server.py
+# Local stand-in for the OpenRouter chat-completions endpoint, for testing and demos
+# without an API key or network access. Supports both plain and streaming (SSE) replies.
+#
+# Run:
+#   python scripts/mock_llm_server.py --port 8766 --latency-ms 300 --token-ms 30
+# Then start the app with:
+#   OPENROUTER_API_URL=http://127.0.0.1:8766/v1/chat/completions OPENROUTER_API_KEY=test python main.py
+
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_reply(payload):
+    """
+    Canned answer that echoes the start of the last user message.
+    """
+    messages = payload.get("messages") or [{}]
+    prompt = str(messages[-1].get("content", ""))
+    snippet = " ".join(prompt.split()[:12])
+    return f"(mock travel agent) You asked about: {snippet}"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    token_delay = 0.0
+    fail_every = 0
+    requests_seen = 0
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_stream(self, payload):
+        """
+        Server-sent events, one word per event, like OpenRouter's stream=true mode.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = make_reply(payload).split(" ")
+        try:
+            self._write_chunk(b": mock keep-alive\n\n")
+            for i, word in enumerate(words):
+                delta = word if i == 0 else " " + word
+                event = {"choices": [{"index": 0, "delta": {"content": delta}}]}
+                self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                time.sleep(type(self).token_delay)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # client cancelled the stream
+            self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        cls = type(self)
+        cls.requests_seen += 1
+        if cls.fail_every and cls.requests_seen % cls.fail_every == 0:
+            # exercise the client's retry path
+            self._send_json(503, {"error": "mock overload"})
+            return
+
+        time.sleep(cls.latency)
+        if payload.get("stream"):
+            self._send_stream(payload)
+            return
+        self._send_json(
+            200,
+            {
+                "id": f"mock-{cls.requests_seen}",
+                "model": payload.get("model", "mock"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": make_reply(payload)}}
+                ],
+            },
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenRouter chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="simulated model latency")
+    parser.add_argument("--token-ms", type=float, default=30.0, help="delay between streamed tokens")
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with 503")
+    args = parser.parse_args()
+
+    MockLLMHandler.latency = args.latency_ms / 1000.0
+    MockLLMHandler.token_delay = args.token_ms / 1000.0
+    MockLLMHandler.fail_every = args.fail_every
+    server = ThreadingHTTPServer((args.host, args.port), MockLLMHandler)
+    print(f"[LOG] Mock LLM listening on http://{args.host}:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# prewarm_descriptions.py
+# Offline job: generate and cache LLM descriptions for the listings users are most
+# likely to see (each user's top recommendations plus their saved properties), so the
+# recommendations screen serves them from the cache instead of waiting on the LLM.
+#
+# Run from anywhere (uses OPENROUTER_API_KEY / OPENROUTER_API_URL like the app):
+#   python scripts/prewarm_descriptions.py --top-k 10 --concurrency 8
+#   python scripts/prewarm_descriptions.py --all
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+os.chdir(ROOT)  # core uses paths relative to the project root
+
+import core
+from property_descriptions import DescriptionCache, DescriptionGenerator
+
+
+def top_listings(top_k):
+    """
+    Listings in any user's top_k recommendations or saved list, most frequent first.
+    """
+    properties = core.load_properties()
+    by_id = {p["property_id"]: p for p in properties}
+    counts = {}
+    for user in core.load_users():
+        ids = [r["property_id"] for r in core.recommend_properties(user, top_k=top_k)]
+        ids += user.get("saved_property") or []
+        for pid in ids:
+            if pid in by_id:
+                counts[pid] = counts.get(pid, 0) + 1
+    ranked = sorted(counts, key=lambda pid: -counts[pid])
+    return [by_id[pid] for pid in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prewarm the property description cache")
+    parser.add_argument("--top-k", type=int, default=10, help="recommendations per user to cover")
+    parser.add_argument("--all", action="store_true", help="describe every listing in the catalog")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    listings = core.load_properties() if args.all else top_listings(args.top_k)
+    generator = DescriptionGenerator(
+        DescriptionCache(core.cache_db_file()),
+        max_concurrency=args.concurrency,
+        version_fn=core.catalog_version,
+    )
+    start = time.perf_counter()
+    described = generator.prewarm(listings, core.catalog_version())
+    elapsed = time.perf_counter() - start
+    print(
+        f"[LOG] {described}/{len(listings)} listing(s) have a cached description "
+        f"({elapsed:.1f}s, concurrency {args.concurrency})."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# verify_sharded_search.py
+# Check that sharded scatter-gather search (recommenders/sharded_search.py) returns the same
+# top-k as a single process holding the whole partitioned index, with and without region /
+# budget constraints, then exercise the failure paths: a stalled shard (SIGSTOP) must yield
+# partial results or a TimeoutError within the timeout, and a killed shard must be restarted.
+#
+# Run (synthetic catalog, no model needed):
+#   python scripts/verify_sharded_search.py --rows 50000 --shards 4
+# or against the catalog's index (python recommenders/partitioned_index.py first):
+#   python scripts/verify_sharded_search.py --index recommenders/property_vector_db_partitions.gr8part
+
+import argparse
+import os
+import signal
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from recommenders.partitioned_index import PartitionedIndex
+from recommenders.sharded_search import ShardedSearch
+from recommenders.similar_properties import normalize_rows
+
+
+def synthetic_index(path, n, num_regions, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    region_codes = rng.integers(0, num_regions, n)
+    centers = rng.standard_normal((num_regions, dim)).astype(np.float32)
+    vectors = normalize_rows(centers[region_codes] + 1.5 * rng.standard_normal((n, dim)).astype(np.float32))
+    prices = np.round(rng.lognormal(5.5, 0.6, n), 0)
+    regions = [f"Region {c}, Country" for c in region_codes]
+    index = PartitionedIndex.build(regions, prices, vectors)
+    index.save(path, [f"S{i:07d}" for i in range(n)], prices, vectors)
+
+
+def same(a, b, tolerance=1e-5):
+    # equal ids, or equal scores where ties may swap ids
+    if [r[1] for r in a] == [r[1] for r in b]:
+        return True
+    return len(a) == len(b) and np.allclose([r[0] for r in a], [r[0] for r in b], atol=tolerance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify sharded search against one process")
+    parser.add_argument("--index", help="saved partitioned index (default: synthetic catalog)")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--regions", type=int, default=98)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.index
+        if path is None:
+            path = os.path.join(tmp, "verify.gr8part")
+            synthetic_index(path, args.rows, args.regions, args.dim)
+
+        single = PartitionedIndex.load(path)
+        dim = single.centroids.shape[1]
+        region_names = sorted(set(single.regions))
+        rng = np.random.default_rng(1)
+        queries = normalize_rows(rng.standard_normal((args.queries, dim)).astype(np.float32))
+        cases = [
+            ("no constraint", lambda i: {}),
+            ("budget", lambda i: {"budget": float(rng.choice([150, 250, 400]))}),
+            ("2 regions + budget", lambda i: {
+                "budget": 400.0,
+                "regions": list(rng.choice(region_names, 2, replace=False)),
+            }),
+        ]
+
+        failures = 0
+        with ShardedSearch(path, num_shards=args.shards, timeout=args.timeout) as sharded:
+            sizes = [int(single.counts[s].sum()) for s in sharded.shards]
+            print(f"{sum(sizes)} listings in {len(single)} partitions; shard sizes {sizes}")
+            print(f"{'query':<22}{'single ms':>10}{'sharded ms':>12}{'shards hit':>12}{'match':>8}")
+            for name, options in cases:
+                single_time = sharded_time = hit = matched = 0
+                for query in queries:
+                    kw = options(None)
+                    t = time.perf_counter()
+                    expected = single.search(query, args.top_k, **kw)
+                    single_time += time.perf_counter() - t
+                    t = time.perf_counter()
+                    results, missing = sharded.search(query, args.top_k, **kw)
+                    sharded_time += time.perf_counter() - t
+                    hit += len(sharded.target_shards(kw.get("regions"), kw.get("budget")))
+                    matched += not missing and same(results, expected)
+                n = len(queries)
+                failures += n - matched
+                print(f"{name:<22}{single_time / n * 1000:>10.2f}{sharded_time / n * 1000:>12.2f}"
+                      f"{hit / n:>12.1f}{matched:>5}/{n}")
+
+            query = queries[0]
+            expected = single.search(query, args.top_k)
+            stalled = sharded.workers[0][0]
+            os.kill(stalled.pid, signal.SIGSTOP)
+            try:
+                t = time.perf_counter()
+                results, missing = sharded.search(query, args.top_k, timeout=0.5)
+                waited = time.perf_counter() - t
+                print(f"stalled shard 0: missing {missing}, {len(results)} results after {waited:.2f}s")
+                failures += missing != [0]
+                try:
+                    sharded.search(query, args.top_k, timeout=0.5, allow_partial=False)
+                    print("stalled shard 0 without partial results: no error (FAIL)")
+                    failures += 1
+                except TimeoutError as e:
+                    print(f"stalled shard 0 without partial results: TimeoutError ({e})")
+            finally:
+                os.kill(stalled.pid, signal.SIGCONT)
+            # the late answers must be discarded, not mistaken for this query's
+            results, missing = sharded.search(queries[1], args.top_k)
+            ok = not missing and same(results, single.search(queries[1], args.top_k))
+            print(f"after resume: complete and correct: {ok}")
+            failures += not ok
+
+            sharded.workers[1][0].kill()
+            sharded.workers[1][0].join()
+            results, missing = sharded.search(query, args.top_k)
+            ok = not missing and same(results, expected)
+            print(f"killed shard 1: restarted, complete and correct: {ok}")
+            failures += not ok
+
+    print("OK" if not failures else f"FAILED ({failures})")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()